@@ -0,0 +1,125 @@
+""" Benchmark of the document update of a build showing many objects
+
+Inserts --objects boxes, spread over --groups groups, into a FreeCAD
+document with Document_Sync, then goes through the updates of the next
+builds:
+    insert      first build, every object is added
+    move        every placement changed, shapes unchanged
+    unchanged   same build again, nothing to do
+    clear       no object shown, every object removed
+each with every change recorded for undo, as before the bulk update, inside
+a single transaction, with undo recording disabled, and with the objects
+merged into compounds (aggregate) and undo recording disabled.
+
+Run it with a python able to import both cadquery and FreeCAD, ie from the
+conda environment of FreeCAD:
+    python benchmarks/bench_document_update.py [--objects 2000] [--groups 20] [--repeat 3] [--freecad-lib $CONDA_PREFIX/lib]
+"""
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import os
+import sys
+import time
+import hashlib
+import argparse
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ('insert', 'move', 'unchanged', 'clear')
+
+
+def build_objects(cq_results, Part, count, groups, offset=0.0):
+    '''Display_Object of count boxes, the payload of a box is shared by its size.'''
+    payloads = {}
+    list_objects = []
+    for i in range(count):
+        size = 1 + i % 7
+        if size not in payloads:
+            payload = Part.makeBox(size, size, size).exportBrepToString().encode('utf-8')
+            payloads[size] = (payload, hashlib.sha1(payload).hexdigest())
+        group = "Group{0}".format(i % groups) if groups else None
+        loc = (1.0, 0.0, 0.0, 10.0 * i + offset,
+               0.0, 1.0, 0.0, 0.0,
+               0.0, 0.0, 1.0, 0.0,
+               0.0, 0.0, 0.0, 1.0)
+        obj = cq_results.Display_Object(None, (204, 204, 204, 0.0), "Box{0}".format(i), group,
+                                        loc, ('show', group, "Box{0}".format(i)))
+        obj.payload, obj.fingerprint = payloads[size]
+        list_objects.append(obj)
+    return list_objects
+
+
+@contextmanager
+def undo_recorded(doc):
+    '''The document as the workbench left it before the bulk update.'''
+    yield
+
+
+def one_transaction(document_sync):
+    return lambda doc: document_sync.bulk_update(doc, undo=True)
+
+
+def undo_disabled(document_sync):
+    return lambda doc: document_sync.bulk_update(doc, undo=False)
+
+
+def run(FreeCAD, document_sync, builds, context, aggregate_above):
+    '''Time the phases in a new document, in seconds.'''
+    doc = FreeCAD.newDocument('bench_document_update')
+    doc.UndoMode = 1
+    sync = document_sync.Document_Sync()
+    times = {}
+    try:
+        for phase, list_objects in zip(PHASES, builds):
+            start = time.perf_counter()
+            with context(doc):
+                touched = sync.update(doc, list_objects, instancing=False,
+                                      aggregate_above=aggregate_above)
+                if touched:
+                    doc.recompute(touched)
+            times[phase] = time.perf_counter() - start
+    finally:
+        FreeCAD.closeDocument(doc.Name)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--objects', type=int, default=2000, help="number of objects shown")
+    parser.add_argument('--groups', type=int, default=20, help="number of groups, 0 for none")
+    parser.add_argument('--repeat', type=int, default=3, help="runs of each mode, the best is kept")
+    parser.add_argument('--freecad-lib', default=None, help="directory of FreeCAD python modules")
+    args = parser.parse_args()
+
+    if args.freecad_lib:
+        sys.path.append(args.freecad_lib)
+    sys.path.insert(0, ROOT)
+
+    import FreeCAD
+    import Part
+    from freecad.cadquery2workbench import cq_results
+    from freecad.cadquery2workbench import document_sync
+
+    first = build_objects(cq_results, Part, args.objects, args.groups)
+    moved = build_objects(cq_results, Part, args.objects, args.groups, offset=5.0)
+    builds = (first, moved, moved, [])
+
+    modes = [('undo recorded', undo_recorded, 0),
+             ('one transaction', one_transaction(document_sync), 0),
+             ('undo disabled', undo_disabled(document_sync), 0),
+             ('disabled + aggregate', undo_disabled(document_sync), 1)]
+
+    print("{0} objects in {1} groups".format(args.objects, args.groups))
+    print("{0:<20}".format('mode') + ''.join("{0:>14}".format(phase) for phase in PHASES))
+    for label, context, aggregate_above in modes:
+        best = {}
+        for i in range(args.repeat):
+            times = run(FreeCAD, document_sync, builds, context, aggregate_above)
+            for phase, elapsed in times.items():
+                best[phase] = min(best.get(phase, elapsed), elapsed)
+        print("{0:<20}".format(label) +
+              ''.join("{0:>12.1f}ms".format(best[phase] * 1000) for phase in PHASES))
+
+
+if __name__ == '__main__':
+    main()
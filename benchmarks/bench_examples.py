@@ -0,0 +1,242 @@
+""" Benchmark and regression suite over the bundled examples
+
+Each example runs in its own python process, so that memory peaks and
+caches don't leak from one example to the next, through the phases:
+    parse       CQ_Model, ie ast parsing and variables discovery
+    build       execution of the script
+    serialize   BREP payload of the displayed shapes
+    transfer    import of the payloads as FreeCAD shapes     (needs FreeCAD)
+    insert      Document_Sync of the objects into a document (needs FreeCAD)
+Phases report the best wall time of --repeat runs. The peak resident memory
+of the process and the topology of the displayed objects (solids, faces,
+edges, volume) are recorded as well.
+
+    python benchmarks/bench_examples.py [--freecad-lib $CONDA_PREFIX/lib] --save-baseline baseline.json
+    python benchmarks/bench_examples.py [--freecad-lib $CONDA_PREFIX/lib] --baseline baseline.json
+
+With --baseline, the exit code is 1 when a phase or the memory peak regresses
+beyond --threshold, or when the geometry of an example changed.
+"""
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import subprocess
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES = os.path.join(ROOT, 'freecad', 'cadquery2workbench', 'examples', 'FreeCAD')
+
+PHASES = ('parse', 'build', 'serialize', 'transfer', 'insert')
+TOPOLOGY = ('objects', 'solids', 'faces', 'edges')
+
+
+def best_time(function, repeat):
+    '''Best wall time of repeat calls in seconds, and the result of the last call.'''
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def peak_memory():
+    '''Peak resident memory of this process in MB.'''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def measure(example, repeat, freecad_lib):
+    '''Run the phases of one example, this runs in the child process.'''
+    if freecad_lib:
+        sys.path.append(freecad_lib)
+    sys.path.insert(0, ROOT)
+
+    from freecad.cadquery2workbench import cadquery_model
+    from freecad.cadquery2workbench import cq_results
+
+    try:
+        import FreeCAD
+        from freecad.cadquery2workbench import shape_transfer
+        from freecad.cadquery2workbench import document_sync
+    except ImportError:
+        FreeCAD = None
+
+    with open(example) as f:
+        source = f.read()
+
+    result = {'example': os.path.basename(example), 'success': False, 'times': {}}
+    times = result['times']
+
+    times['parse'], cqModel = best_time(lambda: cadquery_model.CQ_Model(source), repeat)
+
+    # the examples print, keep stdout for the result
+    with redirect_stdout(sys.stderr):
+        times['build'], build_result = best_time(cqModel.build, repeat)
+    if not build_result.success:
+        result['exception'] = str(build_result.exception)
+        return result
+
+    # topology of the displayed objects
+    list_objects = cq_results.append_assembly_parts(cq_results.list_build_objects(build_result))
+    shapes = [cq_results.to_shape(obj.shape) for obj in list_objects]
+    result['topology'] = {'objects': len(shapes),
+                          'solids': sum(len(s.Solids()) for s in shapes),
+                          'faces': sum(len(s.Faces()) for s in shapes),
+                          'edges': sum(len(s.Edges()) for s in shapes),
+                          'volume': sum(s.Volume() for s in shapes)}
+
+    def serialize():
+        return cq_results.serialize_objects(cq_results.list_build_objects(build_result))
+    times['serialize'], list_objects = best_time(serialize, repeat)
+
+    if FreeCAD is not None:
+        times['transfer'] = best_time(
+                lambda: [shape_transfer.to_freecad(obj) for obj in list_objects], repeat)[0]
+
+        def insert():
+            doc = FreeCAD.newDocument('bench_examples')
+            document_sync.Document_Sync().update(doc, list_objects)
+            doc.recompute()
+            return doc
+        # the document is closed out of the timed part
+        elapsed = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            doc = insert()
+            elapsed.append(time.perf_counter() - start)
+            FreeCAD.closeDocument(doc.Name)
+        times['insert'] = min(elapsed)
+
+    result['memory'] = peak_memory()
+    result['success'] = True
+    return result
+
+
+def run_example(example, args):
+    '''Run one example in a child process.'''
+    command = [sys.executable, os.path.abspath(__file__), '--child', example,
+               '--repeat', str(args.repeat)]
+    if args.freecad_lib:
+        command += ['--freecad-lib', args.freecad_lib]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             universal_newlines=True)
+    try:
+        return json.loads(process.stdout)
+    except ValueError:
+        return {'example': os.path.basename(example), 'success': False, 'times': {},
+                'exception': "benchmark process exited with code {0}".format(process.returncode)}
+
+
+def compare(result, baseline, args):
+    '''
+    Compare an example to its baseline.
+
+    :return: the list of regressions as strings
+    '''
+    regressions = []
+    if baseline is None:
+        return regressions
+    if baseline['success'] and not result['success']:
+        return ["build failed: " + result.get('exception', '')]
+
+    for phase in PHASES:
+        old = baseline['times'].get(phase)
+        new = result['times'].get(phase)
+        # phases too short are only noise
+        if old is None or new is None or max(old, new) < args.min_time:
+            continue
+        if new > old * (1.0 + args.threshold):
+            regressions.append("{0} {1:.1f}ms -> {2:.1f}ms".format(phase, old * 1000, new * 1000))
+
+    old = baseline.get('memory')
+    new = result.get('memory')
+    if old and new and new > old * (1.0 + args.threshold):
+        regressions.append("memory {0:.0f}MB -> {1:.0f}MB".format(old, new))
+
+    if 'topology' in baseline and 'topology' in result:
+        old, new = baseline['topology'], result['topology']
+        for key in TOPOLOGY:
+            if old[key] != new[key]:
+                regressions.append("{0} {1} -> {2}".format(key, old[key], new[key]))
+        if abs(new['volume'] - old['volume']) > args.volume_tolerance * max(1.0, abs(old['volume'])):
+            regressions.append("volume {0:.6g} -> {1:.6g}".format(old['volume'], new['volume']))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help="number of runs of each phase")
+    parser.add_argument('--freecad-lib', default=None, help="directory of FreeCAD python modules")
+    parser.add_argument('--examples', default='*.py', help="glob pattern of the examples to run")
+    parser.add_argument('--baseline', default=None, help="JSON file of the baseline to compare to")
+    parser.add_argument('--save-baseline', default=None, help="save the results as a baseline JSON file")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="relative slowdown of a phase considered as a regression")
+    parser.add_argument('--min-time', type=float, default=0.005,
+                        help="phases shorter than this, in seconds, are not compared")
+    parser.add_argument('--volume-tolerance', type=float, default=1e-6,
+                        help="relative change of volume considered as a geometry change")
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        json.dump(measure(args.child, args.repeat, args.freecad_lib), sys.stdout)
+        return
+
+    baselines = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baselines = json.load(f)['examples']
+
+    examples = sorted(glob.glob(os.path.join(EXAMPLES, args.examples)))
+    results = {}
+    failures = 0
+
+    print("{0:<50}".format('example') + ''.join("{0:>12}".format(p) for p in PHASES) +
+          "{0:>10}{1:>8}{2:>8}".format('memory', 'solids', 'faces'))
+    for example in examples:
+        result = run_example(example, args)
+        results[result['example']] = result
+
+        line = "{0:<50}".format(result['example'])
+        if not result['success']:
+            line += " failed: " + result.get('exception', '')
+        else:
+            for phase in PHASES:
+                t = result['times'].get(phase)
+                line += "{0:>10.1f}ms".format(t * 1000) if t is not None else "{0:>12}".format('-')
+            line += "{0:>8.0f}MB{1:>8}{2:>8}".format(result['memory'] or 0,
+                                                     result['topology']['solids'],
+                                                     result['topology']['faces'])
+        print(line)
+
+        regressions = compare(result, baselines.get(result['example']), args)
+        for regression in regressions:
+            print("    REGRESSION " + regression)
+        failures += len(regressions) > 0
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'repeat': args.repeat, 'python': sys.version.split()[0],
+                       'examples': results}, f, indent=2, sort_keys=True)
+        print("Baseline saved to " + args.save_baseline)
+
+    if args.baseline:
+        print("{0} of {1} examples regressed".format(failures, len(examples)))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+""" Micro-benchmark of the CQ_Model parse, compile and environment cache
+
+Builds a generated script, and the bundled examples, with new parameter
+values at each build:
+    cold    a new CQ_Model for each build, ie parse, variables discovery and
+            compile at each build, as the workbench did before the cache
+    cached  cadquery_model.parse(), parsed and compiled once, the parameter
+            values are given to the compiled script through its globals
+
+The generated script has --statements top-level statements and --parameters
+parameters, it only makes a small box so that the parse and compile times
+show up against the build time.
+
+    python benchmarks/bench_parse_cache.py [--repeat 20] [--statements 2000] [--parameters 50]
+"""
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import os
+import sys
+import glob
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def generated_script(statements, parameters):
+    '''A long script of cheap statements.'''
+    lines = ["p{0} = {1}".format(i, float(i + 1)) for i in range(parameters)]
+    lines.append("total = 0.0")
+    for i in range(statements):
+        lines.append("v{0} = p{1} * {2} + total / {3}".format(i, i % parameters, i, i + 1))
+        lines.append("total = total + v{0} * 1e-6".format(i))
+    lines.append("show_object(cq.Workplane('XY').box(1, 1, 1 + total * 1e-9))")
+    return "\n".join(lines) + "\n"
+
+
+def best_time(function, repeat):
+    '''Best wall time of repeat calls, in seconds, the call index is given to function.'''
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(i)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def first_number(parameters):
+    '''Name of the first number parameter, to change it at each build, or None.'''
+    for name, parameter in parameters.items():
+        if isinstance(parameter.default_value, (int, float)) and \
+                not isinstance(parameter.default_value, bool):
+            return name
+    return None
+
+
+def measure(cadquery_model, source, repeat):
+    '''Best build times, in seconds, of the cold and the cached paths.'''
+    name = first_number(cadquery_model.CQ_Model(source).metadata.parameters)
+
+    def parameters(i):
+        return {name: 1 + i % 3} if name else {}
+
+    def cold(i):
+        result = cadquery_model.CQ_Model(source).build(build_parameters=parameters(i))
+        if not result.success:
+            raise result.exception
+
+    def cached(i):
+        result = cadquery_model.parse(source).build(build_parameters=parameters(i))
+        if not result.success:
+            raise result.exception
+
+    return best_time(cold, repeat), best_time(cached, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20, help="number of builds per script")
+    parser.add_argument('--statements', type=int, default=2000, help="statements of the generated script")
+    parser.add_argument('--parameters', type=int, default=50, help="parameters of the generated script")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from freecad.cadquery2workbench import cadquery_model
+
+    scripts = [("generated ({0} statements)".format(2 * args.statements),
+                generated_script(args.statements, max(1, args.parameters)))]
+    for example in sorted(glob.glob(os.path.join(ROOT, 'freecad', 'cadquery2workbench',
+                                                 'examples', 'FreeCAD', '*.py'))):
+        with open(example) as f:
+            scripts.append((os.path.basename(example), f.read()))
+
+    print("{0:<50}{1:>12}{2:>12}{3:>10}".format('script', 'cold', 'cached', 'saving'))
+    for label, source in scripts:
+        try:
+            cold, cached = measure(cadquery_model, source, args.repeat)
+        except Exception as ex:
+            print("{0:<50} build failed: {1}".format(label, ex))
+            continue
+        saving = 100.0 * (cold - cached) / cold if cold else 0.0
+        print("{0:<50}{1:>10.2f}ms{2:>10.2f}ms{3:>9.1f}%".format(label, cold * 1000, cached * 1000, saving))
+
+
+if __name__ == '__main__':
+    main()
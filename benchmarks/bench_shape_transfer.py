@@ -0,0 +1,77 @@
+""" Micro-benchmark of the cadquery to FreeCAD shape transfer methods
+
+Builds the bundled examples, then transfers each displayed shape to FreeCAD
+with the text BREP file, the binary BREP file and the in-memory BREP methods.
+
+Run it with a python able to import both cadquery and FreeCAD, ie from the
+conda environment of FreeCAD:
+    python benchmarks/bench_shape_transfer.py [--repeat 5] [--freecad-lib $CONDA_PREFIX/lib]
+"""
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import os
+import sys
+import glob
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_time(function, argument, repeat):
+    '''Best wall time of repeat calls, in seconds.'''
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="number of transfers per shape")
+    parser.add_argument('--freecad-lib', default=None, help="directory of FreeCAD python modules")
+    args = parser.parse_args()
+
+    if args.freecad_lib:
+        sys.path.append(args.freecad_lib)
+    sys.path.insert(0, ROOT)
+
+    from freecad.cadquery2workbench import cadquery_model
+    from freecad.cadquery2workbench import cq_results
+    from freecad.cadquery2workbench import shape_transfer
+
+    methods = [('text file', lambda obj: shape_transfer.from_brep_file(cq_results.to_shape(obj.shape))),
+               ('binary file', lambda obj: shape_transfer.from_binary_file(cq_results.to_shape(obj.shape))),
+               ('in-memory', shape_transfer.to_freecad)]
+
+    examples = sorted(glob.glob(os.path.join(ROOT, 'freecad', 'cadquery2workbench',
+                                             'examples', 'FreeCAD', '*.py')))
+    totals = dict((label, 0.0) for label, method in methods)
+
+    print("{0:<50}{1:>8}".format('example', 'shapes') +
+          ''.join("{0:>14}".format(label) for label, method in methods))
+    for example in examples:
+        with open(example) as f:
+            build_result = cadquery_model.CQ_Model(f.read()).build()
+        if not build_result.success:
+            print("{0:<50} build failed: {1}".format(os.path.basename(example), build_result.exception))
+            continue
+
+        list_objects = cq_results.list_build_objects(build_result)
+        list_objects = cq_results.append_assembly_parts(list_objects)
+
+        line = "{0:<50}{1:>8}".format(os.path.basename(example), len(list_objects))
+        for label, method in methods:
+            elapsed = sum(best_time(method, obj, args.repeat) for obj in list_objects)
+            totals[label] += elapsed
+            line += "{0:>12.2f}ms".format(elapsed * 1000)
+        print(line)
+
+    print("{0:<58}".format('total') +
+          ''.join("{0:>12.2f}ms".format(totals[label] * 1000) for label, method in methods))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,11 @@
 # (c) 2014-2018 Jeremy Wright Apache 2.0 License
 import os
 from .version import __version__
-import FreeCAD
+try:
+    import FreeCAD
+except ImportError:
+    # Imported outside FreeCAD, ie by the build worker process
+    FreeCAD = None
 
 # path
 ICONPATH = os.path.join(os.path.dirname(__file__), "resources")
@@ -16,7 +20,8 @@ MODULENAME = 'cadquery2-freecad-workbench'
 
 
 # Set sane defaults for FreeCAD-stored settings if they haven't been set yet
-has_run_before = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("runBefore")
+has_run_before = True if FreeCAD is None else \
+        FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("runBefore")
 
 if not has_run_before:
     print("Set up default cadquery2-freecad-workbench parameters")
@@ -0,0 +1,107 @@
+""" Cache of build results keyed by the script and its parameter values """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+import ast
+import hashlib
+from collections import OrderedDict
+
+# functions of the script whose line names the objects they show, see cq_results.call_site_name()
+OUTPUT_CALLS = ('show_object', 'debug')
+
+
+def cache_key(ast_tree, parameters, show_debug, mesh=None):
+    '''
+    Compute the key of a build.
+
+    The AST dump ignores comments, formatting and line numbers, so only
+    changes of the code itself give a new key. The lines of the show_object()
+    and debug() calls are part of the key though, as the objects shown
+    without a name are named after them, and so is the tessellation of the
+    shapes, so that the coarse objects of a preview aren't shown by a build.
+
+    :param ast_tree: the parsed script, before any parameter is set
+    :param parameters: the build parameters dictionary
+    :param show_debug: if the debug() objects are requested
+    :param mesh: (Deviation, AngularDeflection) the shapes are tessellated with, or None
+    :return: the key as an hexadecimal string
+    '''
+    h = hashlib.sha1()
+    h.update(ast.dump(ast_tree).encode('utf-8'))
+    lines = [node.lineno for node in ast.walk(ast_tree)
+             if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in OUTPUT_CALLS]
+    h.update(repr(lines).encode('utf-8'))
+    for name in sorted(parameters):
+        value = parameters[name]
+        h.update(repr((name, type(value).__name__, value)).encode('utf-8'))
+    h.update(repr(bool(show_debug)).encode('utf-8'))
+    h.update(repr(mesh).encode('utf-8'))
+    return h.hexdigest()
+
+
+def objects_size(list_objects):
+    '''Size in bytes of the BREP payloads of a list of Display_Object, shared payloads counted once.'''
+    payloads = dict((id(obj.payload), obj.payload) for obj in list_objects if obj.payload is not None)
+    return sum(len(payload) for payload in payloads.values())
+
+
+class Build_Cache(object):
+    '''
+    Least recently used cache of the objects displayed by a build.
+
+    Objects are stored with their BREP payload, the cache evicts the least
+    recently used builds when the total size of the payloads exceeds max_bytes.
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()    # key -> (list of Display_Object, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        # not counted as a hit nor a miss
+        return key in self.entries
+
+    def get(self, key):
+        '''
+        Get the objects of a build.
+
+        :param key: the key from cache_key()
+        :return: the list of Display_Object or None
+        '''
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, key, list_objects):
+        '''
+        Store the objects of a build, the objects must have their payload set.
+
+        :param key: the key from cache_key()
+        :param list_objects: the list of Display_Object
+        '''
+        size = objects_size(list_objects)
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+
+        self.entries[key] = (list_objects, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self.bytes -= self.entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        '''One line summary of the cache usage.'''
+        return "{0} hits, {1} misses, {2} builds held, {3:.1f} MB".format(
+                    self.hits, self.misses, len(self.entries), self.bytes / (1024.0 * 1024.0))
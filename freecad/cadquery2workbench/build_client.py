@@ -0,0 +1,231 @@
+""" Run the CQGI builds in a worker process, so FreeCAD GUI keeps responsive """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+import os
+import sys
+import shutil
+import FreeCAD as App
+
+from PySide2.QtCore import QObject, QProcess, QProcessEnvironment, QTimer, Signal
+
+from freecad.cadquery2workbench import MODULENAME
+from freecad.cadquery2workbench import build_worker
+
+
+def worker_python():
+    '''
+    Find the python interpreter to run the worker process.
+
+    Inside FreeCAD sys.executable is usually FreeCAD itself, so look for the
+    python interpreter of the same environment, unless user set one.
+    '''
+    python = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME) \
+                .GetString("workerPython")
+    if python:
+        return python
+
+    if os.path.basename(sys.executable).lower().startswith('python'):
+        return sys.executable
+
+    candidates = [os.path.join(sys.prefix, 'bin', 'python3'),
+                  os.path.join(sys.prefix, 'bin', 'python'),
+                  os.path.join(sys.prefix, 'python.exe'),
+                  os.path.join(os.path.dirname(sys.executable), 'python3'),
+                  os.path.join(os.path.dirname(sys.executable), 'python.exe')]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+
+    return shutil.which('python3') or shutil.which('python')
+
+
+class Build_Client(QObject):
+    '''
+    Send builds to a worker process and get back the objects to display.
+
+    A reply dictionary is emitted by the finished signal, with keys:
+    id, success, objects (list of cq_results.Display_Object), exception, buildTime,
+    incremental (executed and total number of statements or None),
+    lineProfile (line number -> [hits, seconds] or None),
+    operations (rows of operation_timer.Operation_Timer or None),
+    cprofile (cProfile statistics or None),
+    trace (Chrome trace events of the worker, only if requested), rss
+    '''
+
+    finished = Signal(object)
+
+    def __init__(self, parent):
+        QObject.__init__(self, parent)
+        self.parent = parent
+        self.process = None
+        self.buffer = b''
+        self.next_id = 0
+        self.pending = []           # id of the requests sent to the worker, in order
+        self.builds = 0             # number of builds done by the current worker
+
+        # wall-clock timeout of the build being processed by the worker
+        self.timeout_timer = QTimer()
+        self.timeout_timer.setSingleShot(True)
+        self.timeout_timer.timeout.connect(self.on_timeout)
+
+    def param(self):
+        return App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME)
+
+    def is_busy(self):
+        return len(self.pending) > 0
+
+    def start(self):
+        '''Start a new worker process if none is running.'''
+        if self.process is not None:
+            return True
+
+        python = worker_python()
+        if not python:
+            App.Console.PrintError("Unable to find a python interpreter to run the build worker\r\n")
+            return False
+
+        # the worker needs the same modules than FreeCAD
+        env = QProcessEnvironment.systemEnvironment()
+        env.insert("PYTHONPATH", os.pathsep.join([p for p in sys.path if p]))
+
+        self.process = QProcess(self)
+        self.process.setProcessEnvironment(env)
+        self.process.readyReadStandardOutput.connect(self.on_stdout)
+        self.process.readyReadStandardError.connect(self.on_stderr)
+        self.process.finished.connect(self.on_process_finished)
+        self.buffer = b''
+        self.builds = 0
+
+        memory_limit = self.param().GetInt("workerMemoryLimit", 0)
+        self.process.start(python, ['-u', '-m', 'freecad.cadquery2workbench.build_worker',
+                                    str(memory_limit)])
+        if not self.process.waitForStarted(10000):
+            App.Console.PrintError("Unable to start the build worker using " + python + "\r\n")
+            self.process = None
+            return False
+
+        return True
+
+    def stop(self):
+        '''Let the worker process exit once its current build is done.'''
+        if self.process is None:
+            return
+        process = self.process
+        self.process = None
+        process.readyReadStandardOutput.disconnect(self.on_stdout)
+        process.finished.disconnect(self.on_process_finished)
+        process.finished.connect(process.deleteLater)
+        process.closeWriteChannel()
+
+    def kill(self):
+        '''Kill the worker process straight away.'''
+        if self.process is None:
+            return
+        process = self.process
+        self.process = None
+        # on_stdout reads self.process, the output left by the worker is dropped
+        process.readyReadStandardOutput.disconnect(self.on_stdout)
+        process.finished.disconnect(self.on_process_finished)
+        process.kill()
+        process.waitForFinished(1000)
+        process.deleteLater()
+
+    def build(self, source, parameters, show_debug, incremental=False, profile=False,
+              operations=False, cprofile=False, trace=False, mesh=None):
+        '''
+        Send a build to the worker process.
+
+        :param source: the script source as bytes
+        :param parameters: the build parameters dictionary
+        :param show_debug: if True the debug() objects are returned as well
+        :param incremental: if True only the statements changed since previous build are executed
+        :param profile: if True each line of the script is timed
+        :param operations: if True the cadquery operations are timed
+        :param cprofile: if True the build is profiled with cProfile
+        :param trace: if True the spans of the build are returned
+        :param mesh: (Deviation, AngularDeflection) to tessellate the shapes with, or None
+        :return: the id of the request or None if the worker can't be started
+        '''
+        if not self.start():
+            return None
+
+        self.next_id += 1
+        request = {'id': self.next_id,
+                   'source': source,
+                   'parameters': parameters,
+                   'show_debug': show_debug,
+                   'incremental': incremental,
+                   'profile': profile,
+                   'operations': operations,
+                   'cprofile': cprofile,
+                   'trace': trace,
+                   'mesh': mesh,
+                   'meshCacheSize': self.param().GetInt("meshCacheSize", 64) * 1024 * 1024}
+        self.process.write(build_worker.encode_message(request))
+
+        self.pending.append(self.next_id)
+        if len(self.pending) == 1:
+            self.start_timeout()
+
+        return self.next_id
+
+    def cancel(self):
+        '''Cancel all the builds sent to the worker.'''
+        if not self.is_busy():
+            return
+        self.kill()
+        self.timeout_timer.stop()
+        for request_id in self.pending:
+            self.finished.emit({'id': request_id, 'success': False, 'objects': [],
+                                'cancelled': True,
+                                'exception': "Build cancelled by user"})
+        self.pending = []
+
+    def start_timeout(self):
+        timeout = self.param().GetInt("workerTimeout", 300)
+        if timeout > 0:
+            self.timeout_timer.start(timeout * 1000)
+
+    def on_timeout(self):
+        timeout = self.param().GetInt("workerTimeout", 300)
+        App.Console.PrintError("Build timed out after {0} seconds, worker killed\r\n".format(timeout))
+        self.cancel()
+
+    def on_stdout(self):
+        self.buffer += self.process.readAllStandardOutput().data()
+        replies, self.buffer = build_worker.split_messages(self.buffer)
+        for reply in replies:
+            if reply['id'] in self.pending:
+                self.pending.remove(reply['id'])
+            self.timeout_timer.stop()
+            if self.is_busy():
+                self.start_timeout()
+
+            self.builds += 1
+            self.recycle(reply.get('rss', 0))
+            self.finished.emit(reply)
+
+    def on_stderr(self):
+        process = self.sender()
+        text = process.readAllStandardError().data().decode('utf-8', 'replace')
+        App.Console.PrintMessage(text)
+
+    def on_process_finished(self, exitCode, exitStatus):
+        # the worker died while building: OCCT crash or memory exhausted
+        self.process = None
+        self.timeout_timer.stop()
+        for request_id in self.pending:
+            self.finished.emit({'id': request_id, 'success': False, 'objects': [],
+                                'exception': "Build worker exited unexpectedly (exit code {0})" \
+                                    .format(exitCode)})
+        self.pending = []
+
+    def recycle(self, rss):
+        '''Restart the worker after too many builds or when it uses too much memory.'''
+        if self.is_busy():
+            return
+        max_builds = self.param().GetInt("workerMaxBuilds", 50)
+        rss_limit = self.param().GetInt("workerRssLimit", 2048) * 1024 * 1024
+        if (max_builds > 0 and self.builds >= max_builds) or (rss_limit > 0 and rss > rss_limit):
+            self.stop()
@@ -0,0 +1,209 @@
+""" Build in the background the values next to the one of the variable being tuned """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+import os
+import FreeCAD as App
+
+from PySide2.QtCore import QObject, QTimer, Signal
+
+from freecad.cadquery2workbench import MODULENAME
+from freecad.cadquery2workbench import build_client
+from freecad.cadquery2workbench import build_cache
+from freecad.cadquery2workbench import cadquery_loader
+from freecad.cadquery2workbench import parameter_store
+from freecad.cadquery2workbench import script_checks
+
+# time without build nor request before the prefetch starts, in ms
+IDLE_DELAY = 500
+
+
+def neighbour_values(parameter, increment=None):
+    '''
+    Values one step above and below the value of a number parameter.
+
+    The step is the last change made by the user to the value, else the
+    step of the slider of a ranged parameter, else 1.
+
+    :param parameter: a parameter_store.Store_Parameter
+    :param increment: the last change of the value or None
+    :return: list of values, next one first, within the range of a ranged parameter
+    '''
+    value = parameter.value
+    if not increment and parameter.ranged:
+        position = parameter.position_of(value)
+        positions = [p for p in (position + 1, position - 1) if 0 <= p <= parameter.steps()]
+        return [v for v in (parameter.value_at(p) for p in positions) if v != value]
+
+    increment = abs(increment or 1)
+    values = []
+    for v in (value + increment, value - increment):
+        if isinstance(v, float):
+            v = round(v, 10)
+        if parameter.ranged and not parameter.minimum <= v <= parameter.maximum:
+            continue
+        values.append(v)
+    return values
+
+
+class Build_Prefetcher(QObject):
+    '''
+    Speculative builds of the variable the user is tuning: the one selected
+    in the Variables Editor, or the last one changed between two builds.
+
+    Once no build runs nor is requested, the values one step above and
+    below the current one are built by background workers and their objects
+    stored in the build cache, so stepping to them is displayed straight
+    away. At most prefetchWorkers builds run at a time, never more than the
+    number of cores less one, and they are cancelled when the script is
+    edited.
+
+    The built signal is emitted with the cache key of each prefetch done and
+    whether it succeeded.
+    '''
+
+    built = Signal(object, bool)
+
+    def __init__(self, parent):
+        QObject.__init__(self, parent)
+        self.parent = parent        # Script_Commands
+
+        self.workers = []           # build_client.Build_Client
+        self.requests = {}          # (worker, request id) -> cache key of the builds running
+        self.queue = []             # (cache key, parameters, mesh) waiting for a worker
+        self.source = None          # the script of the last build
+        self.parameters = None      # the parameter values of the last build
+        self.show_debug = False
+        self.focus = None           # name of the variable tuned
+        self.increments = {}        # name -> last change of the value of a variable
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.run)
+
+    def param(self):
+        return App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME)
+
+    def budget(self):
+        '''Number of prefetch builds allowed to run at the same time.'''
+        if not self.param().GetBool("useBuildCache", True):
+            return 0
+        workers = self.param().GetInt("prefetchWorkers", 1)
+        return max(0, min(workers, (os.cpu_count() or 1) - 1))
+
+    def note_build(self, source, parameters, show_debug):
+        '''
+        A build is requested by the user, remember the change of value if
+        a single number variable changed.
+        '''
+        if self.parameters is not None and source == self.source:
+            changed = [name for name, value in parameters.items()
+                       if self.parameters.get(name, value) != value]
+            if len(changed) == 1:
+                name = changed[0]
+                old, new = self.parameters[name], parameters[name]
+                if parameter_store.value_kind(new) == parameter_store.NUMBER \
+                        and parameter_store.value_kind(old) == parameter_store.NUMBER:
+                    self.increments[name] = new - old
+                    self.focus = name
+        self.source = source
+        self.parameters = dict(parameters)
+        self.show_debug = show_debug
+
+    def set_focus(self, name):
+        '''A variable is selected in the Variables Editor.'''
+        if name == self.focus:
+            return
+        self.focus = name
+        self.schedule()
+
+    def schedule(self):
+        '''Prefetch once the workbench is idle.'''
+        if self.budget() > 0 and self.focus is not None:
+            self.timer.start(IDLE_DELAY)
+
+    def in_flight(self, key):
+        '''True if a build of this cache key is running, it is removed from the queue otherwise.'''
+        self.queue = [entry for entry in self.queue if entry[0] != key]
+        return key in self.requests.values()
+
+    def cancel(self):
+        '''The script is edited, the builds of the previous script are useless.'''
+        self.timer.stop()
+        self.queue = []
+        self.source = None
+        self.parameters = None
+        for worker in self.workers:
+            worker.cancel()
+
+    def stop(self):
+        '''Kill the workers, FreeCAD is closing.'''
+        self.cancel()
+        for worker in self.workers:
+            worker.kill()
+
+    def run(self):
+        commands = self.parent
+        if self.focus is None or self.source is None:
+            return
+        # idle time only, the builds of the user come first
+        if commands.worker.is_busy() or commands.scheduler.has_pending():
+            self.timer.start(IDLE_DELAY)
+            return
+        # a speculative build doesn't load cadquery in FreeCAD
+        if not cadquery_loader.is_loaded():
+            return
+        if commands.parent.editor.toPlainText().encode('utf-8') != self.source:
+            return
+        check = script_checks.check_script(self.source, undefined=False)
+        if check.syntax_error is not None or not check.outputs:
+            return
+
+        store = commands.parent.cqvarseditor.model.store
+        row = store.rows.get(self.focus)
+        if row is None or store.parameters[row].kind != parameter_store.NUMBER:
+            return
+        parameter = store.parameters[row]
+
+        from freecad.cadquery2workbench import cadquery_model
+        ast_tree = cadquery_model.parse(self.source).ast_tree
+        mesh = commands.mesh_quality()
+        self.queue = []
+        for value in neighbour_values(parameter, self.increments.get(self.focus)):
+            parameters = dict(self.parameters)
+            parameters[self.focus] = value
+            key = build_cache.cache_key(ast_tree, parameters, self.show_debug, mesh)
+            if key in commands.build_cache or key in self.requests.values():
+                continue
+            self.queue.append((key, parameters, mesh))
+        self.dispatch()
+
+    def dispatch(self):
+        '''Send the queued builds to the idle workers.'''
+        budget = self.budget()
+        while len(self.workers) < budget:
+            worker = build_client.Build_Client(self)
+            worker.finished.connect(lambda reply, worker=worker: self.on_finished(worker, reply))
+            self.workers.append(worker)
+
+        for worker in self.workers[:budget]:
+            if not self.queue:
+                return
+            if worker.is_busy():
+                continue
+            key, parameters, mesh = self.queue.pop(0)
+            request_id = worker.build(self.source, parameters, self.show_debug, mesh=mesh)
+            if request_id is None:
+                self.queue = []
+                return
+            self.requests[(worker, request_id)] = key
+
+    def on_finished(self, worker, reply):
+        key = self.requests.pop((worker, reply['id']), None)
+        if key is None:
+            return
+        success = reply['success'] and not reply.get('cancelled')
+        if success:
+            self.parent.build_cache.put(key, reply['objects'])
+        self.built.emit(key, success)
+        self.dispatch()
@@ -0,0 +1,112 @@
+""" Profile a whole build with cProfile, save it as pstats and as a flamegraph """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# Nothing in this module depends on FreeCAD or Qt, so that it can be used
+# as well by the build worker process
+import io
+import os
+import marshal
+import pstats
+
+# deepest stack written to the flamegraph, recursion is cut anyway
+MAX_DEPTH = 100
+# calls shorter than this, in seconds, are left out of the flamegraph
+MIN_TIME = 1e-5
+
+
+def profile_stats(profile):
+    '''
+    Get the statistics of a cProfile.Profile, ready to be pickled.
+
+    :param profile: a disabled cProfile.Profile
+    :return: dictionary (file, line, function) -> (cc, nc, tt, ct, callers) as in pstats
+    '''
+    profile.create_stats()
+    return profile.stats
+
+
+def save_stats(stats, path):
+    '''Save the statistics as a .pstats file, as cProfile.Profile.dump_stats() does.'''
+    with open(path, 'wb') as f:
+        marshal.dump(stats, f)
+
+
+def top_functions(path, count=20):
+    '''
+    The functions with the highest cumulative time.
+
+    :param path: the .pstats file
+    :param count: number of functions
+    :return: the pstats report as a string
+    '''
+    stream = io.StringIO()
+    stats = pstats.Stats(path, stream=stream)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(count)
+    return stream.getvalue()
+
+
+def function_label(function):
+    '''Name of a function in the flamegraph: name (file:line).'''
+    filename, line, name = function
+    if filename == '~':
+        # built-in functions
+        return name
+    return "{0} ({1}:{2})".format(name, os.path.basename(filename), line)
+
+
+def collapsed_stacks(stats):
+    '''
+    Convert the statistics to collapsed stacks, the format of flamegraph.pl and speedscope.
+
+    cProfile only records caller -> callee edges, so the stacks are rebuilt
+    from the roots: the time of a function called from a caller is the one of
+    that edge, shared between the callers of the caller by their share of its
+    cumulative time.
+
+    :param stats: the statistics from profile_stats()
+    :return: dictionary stack string -> self time in microseconds
+    '''
+    callees = {}
+    for function, (cc, nc, tt, ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge))
+
+    stacks = {}
+
+    def walk(function, stack, path, self_time, fraction):
+        # fraction: part of the total time of function spent in this stack
+        stack = stack + [function_label(function)]
+        path = path | {function}
+
+        if self_time > 0:
+            key = ";".join(stack)
+            stacks[key] = stacks.get(key, 0.0) + self_time * 1e6
+
+        if len(stack) >= MAX_DEPTH:
+            return
+        for callee, edge in callees.get(function, []):
+            # recursion is shown once
+            if callee in path:
+                continue
+            edge_tt, edge_ct = edge[2] * fraction, edge[3] * fraction
+            if edge_ct < MIN_TIME:
+                continue
+            callee_ct = stats[callee][3]
+            walk(callee, stack, path, edge_tt, edge_ct / callee_ct if callee_ct else 0.0)
+
+    roots = [function for function, values in stats.items() if not values[4]]
+    for root in roots:
+        walk(root, [], frozenset(), stats[root][2], 1.0)
+    return stacks
+
+
+def save_collapsed(stats, path):
+    '''Save the collapsed stacks, one "frame;frame;frame microseconds" line per stack.'''
+    stacks = collapsed_stacks(stats)
+    with open(path, 'w') as f:
+        for stack in sorted(stacks):
+            weight = int(round(stacks[stack]))
+            if weight > 0:
+                f.write("{0} {1}\n".format(stack, weight))
@@ -0,0 +1,140 @@
+""" Debounce and coalesce the build requests of the CadQuery Editor """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+import time
+import FreeCAD as App
+
+from PySide2.QtCore import QObject, QTimer
+
+from freecad.cadquery2workbench import MODULENAME
+
+
+class Build_Scheduler(QObject):
+    '''
+    Central point where every build is requested: toolbar actions, save,
+    reload of a file changed on the disk, variables edits and typing.
+
+    Requests are debounced, those arriving before the build starts are
+    coalesced into a single build, the most complete action winning.
+    While the worker is building, a new request supersedes the running
+    build: its result is dropped, and the build is cancelled if it already
+    lasted longer than the supersede delay (restarting the worker is
+    cheaper than waiting for it).
+
+    Previews, requested while a variable is dragged, are throttled rather
+    than debounced: one starts at most every previewInterval ms.
+    '''
+
+    # a coalesced request runs the most complete of the actions requested
+    PRIORITY = {'Validate': 0, 'Preview': 1, 'Execute': 2, 'Rebuild': 3}
+
+    def __init__(self, parent):
+        QObject.__init__(self, parent)
+        self.parent = parent        # Script_Commands
+
+        self.pending = None         # action waiting to be built
+        self.typing = False         # True if only requested by typing
+        self.started = None         # time the running worker build started
+        self.last_preview = 0.0     # time the last preview started
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.run)
+
+    def param(self):
+        return App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME)
+
+    def has_pending(self):
+        '''True if a build was requested and not yet started.'''
+        return self.pending is not None
+
+    def request(self, action='Execute', delay=None):
+        '''
+        Request a build, it is started after delay ms without new request.
+
+        :param action: 'Validate', 'Preview', 'Execute' or 'Rebuild'
+        :param delay: debounce delay in ms, by default the buildDebounce setting
+        '''
+        if self.pending is None or self.PRIORITY[action] > self.PRIORITY[self.pending]:
+            self.pending = action
+        self.typing = False
+
+        if delay is None:
+            delay = self.param().GetInt("buildDebounce", 150)
+        self.timer.start(max(0, delay))
+
+    def on_text_changed(self):
+        '''The script is edited, build it once the user stops typing.'''
+        param = self.param()
+        if not param.GetBool("buildWhileTyping", False):
+            return
+        # an explicit request is already waiting, keep its delay
+        if self.pending is not None and not self.typing:
+            return
+
+        self.pending = 'Execute'
+        self.typing = True
+        self.timer.start(max(0, param.GetInt("typingIdleDelay", 1000)))
+
+    def request_preview(self):
+        '''A variable is dragged, build a preview with its new value.'''
+        interval = self.param().GetInt("previewInterval", 250)
+        if interval <= 0:
+            return
+        if self.pending is None:
+            self.pending = 'Preview'
+        self.typing = False
+        # throttle, the timer is not restarted by each new value
+        if not self.timer.isActive():
+            elapsed = (time.monotonic() - self.last_preview) * 1000
+            self.timer.start(max(0, int(interval - elapsed)))
+
+    def cancel(self):
+        '''Forget the build waiting to start.'''
+        self.timer.stop()
+        self.pending = None
+        self.typing = False
+
+    def run(self):
+        if self.pending is None:
+            return
+
+        # a build is running in the worker, it is superseded by this request
+        # Validate doesn't build, it runs straight away
+        worker = self.parent.worker
+        if worker.is_busy() and self.pending != 'Validate':
+            running = time.monotonic() - (self.started or time.monotonic())
+            if running * 1000 >= self.param().GetInt("supersedeCancelDelay", 2000):
+                App.Console.PrintWarning("Build superseded by a newer request, cancelled\r\n")
+                worker.cancel()
+            else:
+                # wait for it, its result is dropped then this build starts
+                return
+
+        action = self.pending
+        typing = self.typing
+        self.cancel()
+
+        # the user is in the middle of a line, nothing to build
+        if typing and not self.is_valid_syntax():
+            return
+
+        if action == 'Preview':
+            self.last_preview = time.monotonic()
+        self.parent.execute(action=action)
+        self.started = time.monotonic() if worker.is_busy() else None
+
+    def on_build_finished(self, reply):
+        '''A worker build is done, start the build waiting for it.'''
+        if not self.parent.worker.is_busy():
+            self.started = None
+            if self.pending is not None and not self.timer.isActive():
+                self.timer.start(0)
+
+    def is_valid_syntax(self):
+        try:
+            compile(self.parent.parent.editor.toPlainText(), '<script>', 'exec')
+        except (SyntaxError, ValueError):
+            return False
+        return True
@@ -0,0 +1,200 @@
+""" Worker process executing CQGI scripts outside of FreeCAD """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# The worker is started by build_client.Build_Client with:
+#   python -m freecad.cadquery2workbench.build_worker [memory limit in MB]
+# Requests and replies are pickled dictionaries, each one preceded by its
+# length, exchanged through stdin and stdout. Anything printed by the scripts
+# goes to stderr which is forwarded to the FreeCAD Report view.
+import os
+import sys
+import cProfile
+import pickle
+import struct
+import traceback
+
+from freecad.cadquery2workbench import tracing
+
+HEADER = struct.Struct('!Q')
+PICKLE_PROTOCOL = 4
+
+
+def encode_message(message):
+    '''
+    Pickle a message preceded by its length.
+
+    :param message: a picklable object
+    :return: the message as bytes
+    '''
+    data = pickle.dumps(message, protocol=PICKLE_PROTOCOL)
+    return HEADER.pack(len(data)) + data
+
+
+def write_message(stream, message):
+    '''
+    Write a message preceded by its length.
+
+    :param stream: a binary stream
+    :param message: a picklable object
+    '''
+    stream.write(encode_message(message))
+    stream.flush()
+
+
+def read_message(stream):
+    '''
+    Read a message written by write_message.
+
+    :param stream: a binary stream
+    :return: the message or None at end of stream
+    '''
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    size = HEADER.unpack(header)[0]
+    data = stream.read(size)
+    if len(data) < size:
+        return None
+    return pickle.loads(data)
+
+
+def split_messages(buffer):
+    '''
+    Split the messages available in a buffer filled by a non-blocking reader.
+
+    :param buffer: bytes received so far
+    :return: (list of messages, remaining bytes)
+    '''
+    messages = []
+    while len(buffer) >= HEADER.size:
+        size = HEADER.unpack(buffer[:HEADER.size])[0]
+        if len(buffer) < HEADER.size + size:
+            break
+        messages.append(pickle.loads(buffer[HEADER.size:HEADER.size + size]))
+        buffer = buffer[HEADER.size + size:]
+    return messages, buffer
+
+
+def current_rss():
+    '''Resident memory of this process in bytes, 0 if unknown.'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+        return rss if sys.platform == 'darwin' else rss * 1024
+    except ImportError:
+        return 0
+
+
+def set_memory_limit(limit_mb):
+    '''Limit the address space of this process, a build exceeding it gets a MemoryError.'''
+    if limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        print("Unable to set the build worker memory limit on this platform", file=sys.stderr)
+
+
+def run_request(request, incremental_state, mesh_cache):
+    '''
+    Build a script and serialize the objects to display.
+
+    :param request: dictionary with keys source, parameters, show_debug, incremental, profile,
+                    operations, cprofile, trace, mesh and meshCacheSize
+    :param incremental_state: the cadquery_model.Incremental_State of the previous builds
+    :param mesh_cache: the shape_mesh.Mesh_Cache of the previous builds
+    :return: the reply dictionary
+    '''
+    from freecad.cadquery2workbench import cadquery_model
+    from freecad.cadquery2workbench import cq_results
+    from freecad.cadquery2workbench import script_profiler
+    from freecad.cadquery2workbench import operation_timer
+
+    reply = {'id': request['id'], 'success': False, 'objects': [], 'exception': None}
+    build_options = {}
+    if request.get('incremental'):
+        build_options['incremental'] = incremental_state
+    else:
+        incremental_state.clear()
+    if request.get('profile'):
+        build_options['profile'] = script_profiler.Line_Profiler()
+    if request.get('operations'):
+        build_options['operations'] = operation_timer.Operation_Timer()
+    if request.get('cprofile'):
+        build_options['cprofile'] = cProfile.Profile()
+
+    with tracing.span('parse'):
+        cqModel = cadquery_model.parse(request['source'])
+    build_result = cqModel.build(build_parameters=request['parameters'],
+                                 build_options=build_options)
+    reply['buildTime'] = build_result.buildTime
+    reply['incremental'] = build_result.incremental
+    reply['lineProfile'] = build_result.line_profile
+    reply['operations'] = build_result.operations
+    reply['cprofile'] = build_result.cprofile
+
+    if build_result.success:
+        try:
+            list_objects = cq_results.list_build_objects(build_result, request['show_debug'])
+            mesh_cache.max_bytes = request.get('meshCacheSize', 0)
+            mesh_cache.evict()
+            reply['objects'] = cq_results.serialize_objects(list_objects, request.get('mesh'),
+                                                            mesh_cache)
+            reply['success'] = True
+        except Exception:
+            reply['exception'] = traceback.format_exc()
+    else:
+        reply['exception'] = str(build_result.exception)
+
+    return reply
+
+
+def main():
+    # keep stdout for the replies, redirect anything else to stderr
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    requests = sys.stdin.buffer
+
+    if len(sys.argv) > 1:
+        set_memory_limit(int(sys.argv[1]))
+
+    # load cadquery and OCCT before the first request
+    import cadquery  # noqa: F401
+    from freecad.cadquery2workbench import cadquery_model
+    from freecad.cadquery2workbench import shape_mesh
+    incremental_state = cadquery_model.Incremental_State()
+    mesh_cache = shape_mesh.Mesh_Cache(0)
+
+    while True:
+        request = read_message(requests)
+        if request is None:
+            break
+        # spans of the build are sent back with the reply
+        tracer = tracing.Tracer() if request.get('trace') else None
+        tracing.active = tracer
+        try:
+            with tracing.span('worker'):
+                reply = run_request(request, incremental_state, mesh_cache)
+        except Exception:
+            reply = {'id': request['id'], 'success': False, 'objects': [],
+                     'exception': traceback.format_exc()}
+        tracing.active = None
+        if tracer is not None:
+            reply['trace'] = tracer.events
+        reply['rss'] = current_rss()
+        write_message(replies, reply)
+
+
+if __name__ == '__main__':
+    main()
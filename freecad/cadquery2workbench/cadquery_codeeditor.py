@@ -5,7 +5,7 @@
 
 import os.path
 import FreeCAD
-from PySide2.QtCore import QSize, QRect, Qt, QRegExp, Slot
+from PySide2.QtCore import QSize, QRect, QRectF, Qt, QRegExp, Slot
 from PySide2.QtGui import QPainter, QTextCharFormat, QColor, QFont, QTextCursor
 from PySide2.QtWidgets import QPlainTextEdit, QTextEdit, QWidget
 
@@ -40,6 +40,10 @@ class CodeEditor(QPlainTextEdit):
         self.setLineWrapMode(QPlainTextEdit.NoWrap)
         self.dirty = False
         
+        # time of each line of the last profiled build, line number -> seconds
+        self.line_profile = None
+        self.blockCountChanged.connect(self.clear_line_profile)
+        
         # Determine if the line number area needs to be shown or not
         lineNumbersCheckedState = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("showLineNumbers")
         if lineNumbersCheckedState:
@@ -81,8 +85,16 @@ class CodeEditor(QPlainTextEdit):
         top = self.blockBoundingGeometry(block).translated(self.contentOffset()).top()
         bottom = top + self.blockBoundingRect(block).height()
 
+        # the slowest line of the profile is painted in red
+        maxTime = max(self.line_profile.values()) if self.line_profile else 0.0
+
         while (block.isValid() and top <= event.rect().bottom()):
             if (block.isValid and bottom >= event.rect().top()):
+                lineTime = self.line_profile.get(blockNumber + 1) if maxTime > 0.0 else None
+                if lineTime:
+                    heat = int(255 * lineTime / maxTime)
+                    painter.fillRect(QRectF(0, top, self.lineNumberArea.width(), bottom - top),
+                                     QColor(255, 255 - heat, 255 - heat))
                 number = str(blockNumber + 1)
                 painter.setPen(Qt.black)
                 painter.drawText(0, top, self.lineNumberArea.width(),
@@ -93,6 +105,21 @@ class CodeEditor(QPlainTextEdit):
             bottom = top + self.blockBoundingRect(block).height()
             blockNumber += 1
 
+    def set_line_profile(self, line_profile):
+        """
+        Show the time of each line as a heat gutter in the line number area.
+        :param line_profile: dictionary line number -> seconds, or None to clear it
+        :return: None
+        """
+        self.line_profile = line_profile
+        self.lineNumberArea.update()
+
+    @Slot(int)
+    def clear_line_profile(self, newBlockCount):
+        # lines were added or removed, the profile doesn't match them anymore
+        if self.line_profile is not None:
+            self.set_line_profile(None)
+
     def lineNumberAreaWidth(self):
         digits = 1
         dMax = max(1, self.blockCount())
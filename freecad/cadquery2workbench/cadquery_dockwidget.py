@@ -7,16 +7,20 @@ import FreeCAD as App
 import FreeCADGui as Gui
 
 from PySide2.QtWidgets import QDockWidget, QMainWindow, QAction, QToolBar
-from PySide2.QtWidgets import QLineEdit, QGridLayout, QWidget, QScrollArea
+from PySide2.QtWidgets import QLineEdit, QWidget
 from PySide2.QtWidgets import QListWidget, QListWidgetItem, QVBoxLayout, QLabel
-from PySide2.QtWidgets import QDialog
-from PySide2.QtCore import Qt, QEvent
+from PySide2.QtWidgets import QDialog, QTableView, QHeaderView, QAbstractItemView
+from PySide2.QtWidgets import QHBoxLayout, QPushButton, QSlider, QSpinBox, QDoubleSpinBox
+from PySide2.QtWidgets import QStyledItemDelegate, QComboBox, QInputDialog
+from PySide2.QtCore import Qt, QEvent, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Signal
 from PySide2.QtGui import QFont, QIcon, QPixmap, QKeySequence
 
 from freecad.cadquery2workbench import cadquery_codeeditor
 from freecad.cadquery2workbench import toolbar_commands
 from freecad.cadquery2workbench import script_commands
 from freecad.cadquery2workbench import freecad_editor_settings
+from freecad.cadquery2workbench import parameter_store
+from freecad.cadquery2workbench import parameter_snapshots
 from freecad.cadquery2workbench import MODULENAME
 from freecad.cadquery2workbench import EXAMPLESPATH
 
@@ -55,12 +59,16 @@ class CadqueryDockWidget(QDockWidget):
         
         # Signal and slot
         self.editor.textChanged.connect(self.ismodifed)
+        self.editor.textChanged.connect(self.cmd.scheduler.on_text_changed)
+        self.editor.textChanged.connect(self.cmd.prefetcher.cancel)
         
         # some variables
         self.filename = ''          # store full path of opened file
         self.view3DMdi = None       # the MDI 3D view in GUI 
         self.view3DApp = None       # the Document 3D view in App
         self.show_debug = False     # Toggle Show/Hide Debug Object when Execute
+        self.profile_script = False # Toggle time each line of the script when Execute
+        self.time_operations = False # Toggle time the cadquery operations when Execute
         
         # At startup Open a New Script
         self.tbcmd.cmd_new_script()
@@ -130,6 +138,16 @@ class CadqueryDockWidget(QDockWidget):
         self.rebuildAct.triggered.connect(self.tbcmd.cmd_rebuild_script)
         toolbar.addAction(self.rebuildAct)
 
+        strKey = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME) \
+                    .GetString("cancelKeybinding", "Shift+F9")
+        self.cancelAct = QAction(QIcon(QPixmap(":/icons/media-playback-stop.svg")),
+                         "Cancel Build (" + strKey + ")", self.mainWin)
+        self.cancelAct.setShortcut(QKeySequence(strKey))
+        self.cancelAct.setStatusTip("Cancels the build running in the worker process")
+        self.cancelAct.setEnabled(False)
+        self.cancelAct.triggered.connect(self.tbcmd.cmd_cancel_build)
+        toolbar.addAction(self.cancelAct)
+
         self.debugAct = QAction(QIcon(QPixmap(":/icons/tree-pre-sel.svg")),
                          "Toggle Debug Script", self.mainWin)
         self.debugAct.setShortcut("")
@@ -139,6 +157,38 @@ class CadqueryDockWidget(QDockWidget):
         self.debugAct.triggered.connect(self.toggle_debug_script)
         toolbar.addAction(self.debugAct)
 
+        self.profileAct = QAction(QIcon(QPixmap(":/icons/Std_ViewStatusBar.svg")),
+                         "Toggle Profile Script", self.mainWin)
+        self.profileAct.setShortcut("")
+        self.profileAct.setStatusTip("Toggle timing each line of the script on Execute")
+        self.profileAct.setCheckable(True)
+        self.profileAct.setChecked(False)
+        self.profileAct.triggered.connect(self.toggle_profile_script)
+        toolbar.addAction(self.profileAct)
+
+        self.cprofileAct = QAction(QIcon(QPixmap(":/icons/Std_ViewScreenShot.svg")),
+                         "Profile Build", self.mainWin)
+        self.cprofileAct.setShortcut("")
+        self.cprofileAct.setStatusTip("Executes the script once under cProfile, the profile is saved next to the script")
+        self.cprofileAct.triggered.connect(self.tbcmd.cmd_profile_build)
+        toolbar.addAction(self.cprofileAct)
+
+        self.operationsAct = QAction(QIcon(QPixmap(":/icons/Std_DlgMacroExecute.svg")),
+                         "Toggle Time Operations", self.mainWin)
+        self.operationsAct.setShortcut("")
+        self.operationsAct.setStatusTip("Toggle timing the CadQuery operations of the script on Execute")
+        self.operationsAct.setCheckable(True)
+        self.operationsAct.setChecked(False)
+        self.operationsAct.triggered.connect(self.toggle_time_operations)
+        toolbar.addAction(self.operationsAct)
+
+        self.sweepAct = QAction(QIcon(QPixmap(":/icons/Std_DlgParameter.svg")),
+                         "Parameter Sweep", self.mainWin)
+        self.sweepAct.setShortcut("")
+        self.sweepAct.setStatusTip("Builds the script for a grid of variables values")
+        self.sweepAct.triggered.connect(self.tbcmd.cmd_parameter_sweep)
+        toolbar.addAction(self.sweepAct)
+
         toolbar.addSeparator()
 
         self.clearAct = QAction(QIcon(QPixmap(":/icons/button_invalid.svg")),
@@ -187,6 +237,9 @@ class CadqueryDockWidget(QDockWidget):
         if self.editor.document().isModified():
             if not self.cmd.aboutSave(title="Application is closing"):
                 return False
+        # Stop the build worker process
+        self.cmd.worker.kill()
+        self.cmd.prefetcher.stop()
         return True
             
     def ismodifed(self):
@@ -202,7 +255,182 @@ class CadqueryDockWidget(QDockWidget):
     def toggle_debug_script(self):
         self.show_debug = self.debugAct.isChecked()
         
+    def toggle_time_operations(self):
+        self.time_operations = self.operationsAct.isChecked()
+        
+    def toggle_profile_script(self):
+        self.profile_script = self.profileAct.isChecked()
+        if not self.profile_script:
+            self.editor.set_line_profile(None)
+        
         
+# ------------------------------------------------------------------------------
+""" The Model of the Variables found on the Script """
+# ------------------------------------------------------------------------------
+class Parameters_Model(QAbstractTableModel):
+    '''
+    Table model over a parameter_store.Parameter_Store: one row per variable,
+    with its name, value and description. Only the rows which changed are
+    updated when the variables of the script change.
+    '''
+    
+    COLUMNS = ('Variable', 'Value', 'Description')
+    
+    # a value was changed by the user
+    valueEdited = Signal()
+    
+    def __init__(self, parent=None):
+        QAbstractTableModel.__init__(self, parent)
+        self.store = parameter_store.Parameter_Store()
+        self.bold = QFont()
+        self.bold.setBold(True)
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+    
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == 1:
+            if self.store.parameters[index.row()].kind == parameter_store.BOOL:
+                flags |= Qt.ItemIsUserCheckable
+            else:
+                flags |= Qt.ItemIsEditable
+        return flags
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        parameter = self.store.parameters[index.row()]
+        column = index.column()
+        if column == 0 and role == Qt.DisplayRole:
+            return parameter.name
+        if column == 2 and role == Qt.DisplayRole:
+            return parameter.description
+        if column == 1:
+            if role == Qt.CheckStateRole and parameter.kind == parameter_store.BOOL:
+                return Qt.Checked if parameter.value else Qt.Unchecked
+            if role in (Qt.DisplayRole, Qt.EditRole):
+                return str(parameter.value)
+            if role == Qt.FontRole and parameter.edited:
+                return self.bold
+            if role == Qt.ToolTipRole:
+                return "Value in the script: " + str(parameter.default)
+        return None
+    
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != 1:
+            return False
+        parameter = self.store.parameters[index.row()]
+        try:
+            if role == Qt.CheckStateRole and parameter.kind == parameter_store.BOOL:
+                self.set_value(index.row(), value == Qt.Checked or value == 2)
+            elif role == Qt.EditRole:
+                self.set_value(index.row(), value)
+            else:
+                return False
+        except ValueError:
+            App.Console.PrintWarning("'" + str(value) + "' is not a valid value for " + parameter.name + "\r\n")
+            return False
+        self.valueEdited.emit()
+        return True
+    
+    def set_value(self, row, value):
+        '''Set a value without requesting a build, ie while a slider is dragged.'''
+        self.store.set_value(row, value)
+        self.dataChanged.emit(self.index(row, 1), self.index(row, 1))
+    
+    def set_parameters(self, parameters):
+        '''
+        Show the variables of the script, the values entered by the user are kept.
+        
+        :param parameters: dictionary name -> cqgi InputParameter
+        '''
+        entries = self.store.entries(parameters)
+        plan = self.store.diff(entries)
+        if plan is None:
+            # variables moved in the script
+            self.beginResetModel()
+            self.store.reset(entries)
+            self.endResetModel()
+            return
+        
+        removed, inserted = plan
+        for first, last in removed:
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self.store.remove(first, last)
+            self.endRemoveRows()
+        for first, last in inserted:
+            self.beginInsertRows(QModelIndex(), first, last)
+            self.store.insert(first, entries[first:last + 1])
+            self.endInsertRows()
+        for row in self.store.merge(entries):
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+    
+    def reset_values(self):
+        '''Go back to the values of the script.'''
+        for row in self.store.reset_values():
+            self.dataChanged.emit(self.index(row, 1), self.index(row, 1))
+    
+    def apply_values(self, values):
+        '''Set the values of a snapshot, return True if a value changed.'''
+        changed = self.store.apply_values(values)
+        for row in changed:
+            self.dataChanged.emit(self.index(row, 1), self.index(row, 1))
+        return len(changed) > 0
+    
+    def clear(self):
+        self.beginResetModel()
+        self.store.clear()
+        self.endResetModel()
+
+
+# ------------------------------------------------------------------------------
+""" Spin Box editing the Variables with a range """
+# ------------------------------------------------------------------------------
+class Parameters_Delegate(QStyledItemDelegate):
+    '''Edit the variables given a min and a max by cqvar() with a spin box.'''
+    
+    def __init__(self, parent):
+        QStyledItemDelegate.__init__(self, parent)
+        self.parent = parent        # CadqueryVariablesDockWidget
+    
+    def createEditor(self, widget, option, index):
+        parameter = self.parent.parameter_at(index)
+        if parameter is None or not parameter.ranged:
+            return QStyledItemDelegate.createEditor(self, widget, option, index)
+        step = (parameter.maximum - parameter.minimum) / float(parameter.steps())
+        if parameter.integer:
+            editor = QSpinBox(widget)
+            editor.setRange(int(parameter.minimum), int(parameter.maximum))
+            editor.setSingleStep(max(1, int(round(step))))
+        else:
+            editor = QDoubleSpinBox(widget)
+            editor.setDecimals(max(2, len(("%g" % step).partition('.')[2])))
+            editor.setRange(parameter.minimum, parameter.maximum)
+            editor.setSingleStep(step)
+        return editor
+    
+    def setEditorData(self, editor, index):
+        if isinstance(editor, (QSpinBox, QDoubleSpinBox)):
+            editor.setValue(self.parent.parameter_at(index).value)
+        else:
+            QStyledItemDelegate.setEditorData(self, editor, index)
+    
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, (QSpinBox, QDoubleSpinBox)):
+            model.setData(index, editor.value(), Qt.EditRole)
+        else:
+            QStyledItemDelegate.setModelData(self, editor, model, index)
+
+
 # ------------------------------------------------------------------------------
 """ The Dock Widget to show the Variables found on the Scipt """
 # ------------------------------------------------------------------------------
@@ -210,64 +438,208 @@ class CadqueryVariablesDockWidget(QDockWidget):
     def __init__(self, name, parent):
         QDockWidget.__init__(self, name)
         self.setObjectName("CadQuery Variables Editor")
-        self.haveParameters = False
         self.parent = parent
         
-        self.populateParameterEditor(parameters={})
-        
-    def populateParameterEditor(self, parameters):
-        gridLayout = QGridLayout()
-        # Create a widget we can put the layout in and add a scrollbar
-        newWidget = QWidget()
-        newWidget.setLayout(gridLayout)
-        
-        line = 1
-        self.haveParameters = False
-        
-        if len(parameters) > 0:
-            self.haveParameters = True
-            # Add controls for all the parameters so that they can be edited from the GUI
-            for pKey, pVal in list(parameters.items()):
-                if type(pVal.default_value) == int or type(pVal.default_value) == float:
-                    label = QLabel(pKey)
-                    
-                    # We want to keep track of this parameter value field so that we can pull its value later when executing
-                    value = QLineEdit()
-                    value.setText(str(pVal.default_value))
-                    value.setObjectName("pcontrol_" + pKey)
-                    value.returnPressed.connect(self.paramReturnPressed)
-
-                    # The description of the parameter
-                    desc = QLabel(pVal.desc)
-                    
-                    # Add the parameter control sets, one set per line
-                    gridLayout.addWidget(label, line, 0)
-                    gridLayout.addWidget(value, line, 1)
-                    gridLayout.addWidget(desc, line, 2)
-                    
-                    line += 1
-            
-        # Add a scroll bar in case there are a lot of variables in the script
-        scrollArea = QScrollArea()
-        scrollArea.setWidget(newWidget)
-
-        # Show it in the central Widget
-        layout =  QVBoxLayout()
-        layout.addWidget(scrollArea)
+        self.model = Parameters_Model(self)
+        self.model.valueEdited.connect(self.paramReturnPressed)
+        
+        # the view only creates the rows which are visible, filter them by name
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterKeyColumn(0)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        
+        self.view = QTableView()
+        self.view.setModel(self.proxy)
+        self.view.verticalHeader().hide()
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(self.view.fontMetrics().height() + 8)
+        self.view.horizontalHeader().setStretchLastSection(True)
+        self.view.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed
+                                  | QAbstractItemView.AnyKeyPressed)
+        self.view.setItemDelegateForColumn(1, Parameters_Delegate(self))
+        
+        # slider of the current variable, when it has a range
+        self.sliderName = None
+        self.sliderLabel = QLabel()
+        self.slider = QSlider(Qt.Horizontal)
+        self.slider.setTracking(True)
+        self.slider.valueChanged.connect(self.slider_moved)
+        self.slider.sliderReleased.connect(self.paramReturnPressed)
+        self.sliderValue = QLabel()
+        self.view.selectionModel().currentRowChanged.connect(self.update_slider)
+        self.view.selectionModel().currentRowChanged.connect(self.focus_changed)
+        self.model.dataChanged.connect(self.update_slider)
+        self.model.modelReset.connect(self.update_slider)
+        self.model.rowsInserted.connect(self.update_slider)
+        self.model.rowsRemoved.connect(self.update_slider)
+        
+        self.filter = QLineEdit()
+        self.filter.setPlaceholderText("Filter variables")
+        self.filter.setClearButtonEnabled(True)
+        self.filter.textChanged.connect(self.proxy.setFilterFixedString)
+        
+        self.resetButton = QPushButton("Reset Values")
+        self.resetButton.setToolTip("Go back to the values of the script")
+        self.resetButton.clicked.connect(self.model.reset_values)
+        
+        # switch between snapshots of the values and the values built lately
+        self.snapshotCombo = QComboBox()
+        self.snapshotCombo.setToolTip("Switch to the values of a snapshot or of a recent build")
+        self.snapshotCombo.activated.connect(self.snapshot_activated)
+        
+        self.saveSnapshotButton = QPushButton("Save Snapshot")
+        self.saveSnapshotButton.setToolTip("Save the values under a name, next to the script")
+        self.saveSnapshotButton.clicked.connect(self.save_snapshot)
+        
+        self.deleteSnapshotButton = QPushButton("Delete Snapshot")
+        self.deleteSnapshotButton.clicked.connect(self.delete_snapshot)
+        
+        hbox = QHBoxLayout()
+        hbox.addWidget(self.filter)
+        hbox.addWidget(self.resetButton)
+        snapshotBox = QHBoxLayout()
+        snapshotBox.addWidget(self.snapshotCombo, 1)
+        snapshotBox.addWidget(self.saveSnapshotButton)
+        snapshotBox.addWidget(self.deleteSnapshotButton)
+        sliderBox = QHBoxLayout()
+        sliderBox.addWidget(self.sliderLabel)
+        sliderBox.addWidget(self.slider, 1)
+        sliderBox.addWidget(self.sliderValue)
+        self.sliderWidget = QWidget()
+        self.sliderWidget.setLayout(sliderBox)
+        self.sliderWidget.setVisible(False)
+        
+        layout = QVBoxLayout()
+        layout.addLayout(hbox)
+        layout.addLayout(snapshotBox)
+        layout.addWidget(self.view)
+        layout.addWidget(self.sliderWidget)
         
         paramwidget = QWidget()
         paramwidget.setLayout(layout)
         self.setWidget(paramwidget)
-        
+        self.refresh_snapshots()
+    
+    @property
+    def haveParameters(self):
+        return len(self.model.store) > 0
+    
+    def populateParameterEditor(self, parameters):
+        self.model.set_parameters(parameters)
+    
+    def build_parameters(self):
+        '''The typed values of the variables, name -> value.'''
+        return self.model.store.build_parameters()
+    
+    def parameter_at(self, index):
+        '''The Store_Parameter of an index of the view, or None.'''
+        source = self.proxy.mapToSource(index)
+        if not source.isValid():
+            return None
+        return self.model.store.parameters[source.row()]
+    
+    def focus_changed(self, current, previous):
+        # the values next to the one of the selected variable are prefetched
+        parameter = self.parameter_at(current)
+        self.parent.cmd.prefetcher.set_focus(parameter.name if parameter is not None else None)
+    
+    def update_slider(self, *args):
+        # show the slider of the current variable if it has a range
+        parameter = self.parameter_at(self.view.currentIndex())
+        if parameter is None or not parameter.ranged:
+            self.sliderName = None
+            self.sliderWidget.setVisible(False)
+            return
+        self.sliderName = parameter.name
+        # the slider is dragged, it knows its position
+        if self.slider.isSliderDown():
+            return
+        self.slider.blockSignals(True)
+        self.slider.setRange(0, parameter.steps())
+        self.slider.setPageStep(max(1, parameter.steps() // 10))
+        self.slider.setValue(parameter.position_of(parameter.value))
+        self.slider.blockSignals(False)
+        self.sliderLabel.setText(parameter.name)
+        self.sliderValue.setText(str(parameter.value))
+        self.sliderWidget.setVisible(True)
+    
+    def slider_moved(self, position):
+        row = self.model.store.rows.get(self.sliderName)
+        if row is None:
+            return
+        parameter = self.model.store.parameters[row]
+        value = parameter.value_at(position)
+        self.sliderValue.setText(str(value))
+        if value == parameter.value:
+            return
+        self.model.set_value(row, value)
+        # preview while dragging, the full build once released
+        if self.slider.isSliderDown():
+            self.parent.cmd.scheduler.request_preview()
+        else:
+            self.paramReturnPressed()
+    
     def paramReturnPressed(self):
         # Rerun the model
         self.parent.tbcmd.cmd_execute_script()
+    
+    def refresh_snapshots(self):
+        '''List the snapshots then the history in the combo box.'''
+        snapshots = self.parent.cmd.snapshots
+        self.snapshotCombo.blockSignals(True)
+        self.snapshotCombo.clear()
+        self.snapshotCombo.addItem("Snapshots and History", None)
+        for name, values in snapshots.snapshots.items():
+            self.snapshotCombo.addItem(name, ['snapshot', name])
+            self.snapshotCombo.setItemData(self.snapshotCombo.count() - 1,
+                                           parameter_snapshots.describe(values, 500), Qt.ToolTipRole)
+        if snapshots.history:
+            self.snapshotCombo.insertSeparator(self.snapshotCombo.count())
+            for i, values in enumerate(snapshots.history):
+                self.snapshotCombo.addItem("History: " + parameter_snapshots.describe(values), ['history', i])
+                self.snapshotCombo.setItemData(self.snapshotCombo.count() - 1,
+                                               parameter_snapshots.describe(values, 500), Qt.ToolTipRole)
+        self.snapshotCombo.blockSignals(False)
+        self.deleteSnapshotButton.setEnabled(len(snapshots.snapshots) > 0)
+    
+    def snapshot_activated(self, index):
+        # the objects of the snapshot are usually cached, no delay
+        data = self.snapshotCombo.itemData(index)
+        self.snapshotCombo.setCurrentIndex(0)
+        if not data:
+            return
+        kind, key = data
+        snapshots = self.parent.cmd.snapshots
+        if kind == 'snapshot':
+            values = snapshots.snapshots.get(key)
+        else:
+            values = snapshots.history[key] if key < len(snapshots.history) else None
+        if values is None:
+            return
+        self.model.apply_values(values)
+        self.parent.cmd.scheduler.request(action='Execute', delay=0)
+    
+    def save_snapshot(self):
+        if not self.haveParameters:
+            App.Console.PrintWarning("The script has no variable to save in a snapshot\r\n")
+            return
+        default = "Variant {0}".format(len(self.parent.cmd.snapshots.snapshots) + 1)
+        name, ok = QInputDialog.getText(self, "Save Snapshot", "Snapshot name:", QLineEdit.Normal, default)
+        name = name.strip()
+        if ok and name:
+            self.parent.cmd.add_snapshot(name)
+    
+    def delete_snapshot(self):
+        names = list(self.parent.cmd.snapshots.snapshots)
+        if not names:
+            return
+        name, ok = QInputDialog.getItem(self, "Delete Snapshot", "Snapshot:", names, 0, False)
+        if ok and name:
+            self.parent.cmd.remove_snapshot(name)
         
     def clearParameters(self):
-        for le in self.findChildren(QLineEdit):
-            le.setParent(None)
-            le.deleteLater()
-        self.populateParameterEditor(parameters={})
+        self.model.clear()
         
 
 # ------------------------------------------------------------------------------
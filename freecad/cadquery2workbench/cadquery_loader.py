@@ -0,0 +1,94 @@
+""" Import cadquery on demand, and warm it up in the background """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# Nothing in this module depends on FreeCAD or Qt. Importing cadquery and OCP
+# takes seconds, so the modules loaded at FreeCAD startup must not import them,
+# they are loaded by load() at the first build or by a warm-up thread.
+import sys
+import time
+import threading
+
+_lock = threading.Lock()
+_thread = None      # the warm-up thread
+
+# seconds spent by each loading phase, 'import' and 'warm-up'
+timings = {}
+
+
+def version():
+    '''Version of cadquery, read from its metadata without importing it.'''
+    if 'cadquery' in sys.modules:
+        return sys.modules['cadquery'].__version__
+    try:
+        from importlib.metadata import version as package_version
+        return package_version('cadquery')
+    except Exception:
+        return ''
+
+
+def is_loaded():
+    return 'import' in timings
+
+
+def is_warming_up():
+    return _thread is not None and _thread.is_alive()
+
+
+def load():
+    '''
+    Import cadquery, OCP and the workbench modules building the scripts.
+
+    Only the first call imports them, the next ones wait for it if it is in
+    progress in another thread.
+
+    :return: the cadquery module
+    '''
+    with _lock:
+        if 'import' not in timings:
+            start = time.perf_counter()
+            import cadquery  # noqa: F401
+            from freecad.cadquery2workbench import cadquery_model  # noqa: F401
+            from freecad.cadquery2workbench import cq_results  # noqa: F401
+            timings['import'] = time.perf_counter() - start
+    return sys.modules['cadquery']
+
+
+def warm_up():
+    '''Load cadquery and build a box, so that the OCCT libraries are loaded as well.'''
+    cq = load()
+    with _lock:
+        if 'warm-up' not in timings:
+            from freecad.cadquery2workbench import cq_results
+            start = time.perf_counter()
+            box = cq.Workplane('XY').box(1, 1, 1).edges().fillet(0.1)
+            cq_results.brep_payload(box)
+            timings['warm-up'] = time.perf_counter() - start
+
+
+def start_warm_up(callback=None):
+    '''
+    Warm up cadquery in a background thread.
+
+    :param callback: called from the thread once done, with the exception raised or None
+    :return: the thread
+    '''
+    def run():
+        error = None
+        try:
+            warm_up()
+        except Exception as ex:
+            error = ex
+        if callback is not None:
+            callback(error)
+
+    global _thread
+    _thread = threading.Thread(target=run, name='cadquery warm-up', daemon=True)
+    _thread.start()
+    return _thread
+
+
+def format_timings():
+    '''Loading times as a one line string.'''
+    return ", ".join("{0} {1:.2f} s".format(phase, seconds) for phase, seconds in timings.items())
@@ -3,14 +3,93 @@
 # Fork of freecad-cadquery-module made for cadquery1.0 by
 # (c) 2014-2018 Jeremy Wright Apache 2.0 License
 import ast
+import sys
+import copy
+import hashlib
 import traceback
 import time
-from cadquery.cqgi import CQSCRIPT, CQModel, ScriptCallback, BuildResult
+from collections import OrderedDict
+from difflib import SequenceMatcher
+import cadquery as cq
+from cadquery.cqgi import CQSCRIPT, CQModel, ScriptCallback, BuildResult, InvalidParameterError
 from cadquery.cqgi import EnvironmentBuilder, ShapeResult, InputParameter
 from cadquery.cqgi import ConstantAssignmentFinder
 from cadquery.cqgi import BooleanParameterType, StringParameterType
 from cadquery.cqgi import NumberParameterType, NumberParameterType
 
+from freecad.cadquery2workbench import tracing
+from freecad.cadquery2workbench import build_profile
+
+# name of the parameter values in the globals of a script
+PARAMETERS = '__cqgi_parameters__'
+
+# number of parsed scripts kept by parse()
+PARSE_CACHE_SIZE = 16
+
+_parse_cache = OrderedDict()     # hash of the source -> CQ_Model
+_base_environment = None
+
+
+def parse(script_source):
+    '''
+    Get the CQ_Model of a script, parsed only once for the same source.
+
+    The model is shared by the builds of the script, the parameter values of
+    a build are given to build() and don't modify it.
+
+    :param script_source: a python script, as str or bytes
+    :return: a CQ_Model
+    '''
+    source = script_source.encode('utf-8') if isinstance(script_source, str) else script_source
+    key = hashlib.sha1(source).hexdigest()
+    model = _parse_cache.pop(key, None)
+    if model is None:
+        model = CQ_Model(script_source)
+    _parse_cache[key] = model
+    while len(_parse_cache) > PARSE_CACHE_SIZE:
+        _parse_cache.popitem(last=False)
+    return model
+
+
+def base_environment():
+    '''
+    The globals shared by every script, real builtins and cadquery objects.
+
+    Built once, each build gets a copy of it.
+    '''
+    global _base_environment
+    if _base_environment is None:
+        _base_environment = (
+            EnvironmentBuilder()
+            .with_real_builtins()
+            .with_cadquery_objects()
+            .add_entry("__name__", "__cqgi__")
+            .build()
+        )
+    return _base_environment
+
+
+class Parameter_Injector(ast.NodeTransformer):
+    '''
+    Replace the values of the parameters in the script by a lookup in the globals.
+
+        length = 10  ->  length = __cqgi_parameters__.get('length', 10)
+
+    so that the script is compiled once and built with any parameter values.
+    '''
+
+    def __init__(self, nodes):
+        self.nodes = nodes          # id of a parameter value node -> parameter name
+
+    def generic_visit(self, node):
+        name = self.nodes.get(id(node))
+        if name is None:
+            return ast.NodeTransformer.generic_visit(self, node)
+        lookup = ast.Call(func=ast.Attribute(value=ast.Name(id=PARAMETERS, ctx=ast.Load()),
+                                             attr='get', ctx=ast.Load()),
+                          args=[ast.Constant(value=name), node], keywords=[])
+        return ast.copy_location(lookup, node)
+
 
 class CQ_Model(CQModel):
     '''extend Cadquery cqgi.CQModel class.'''
@@ -22,6 +101,64 @@ class CQ_Model(CQModel):
         :param script_source: a python script to parse
         '''
         CQModel.__init__(self, script_source)
+        self.code = None            # the script compiled by Parameter_Injector
+        
+    def compiled(self):
+        '''The script compiled once, its parameter values taken from the globals.'''
+        if self.code is None:
+            memo = {}
+            tree = copy.deepcopy(self.ast_tree, memo)
+            nodes = dict((id(memo[id(p.ast_node)]), name)
+                         for name, p in self.metadata.parameters.items() if id(p.ast_node) in memo)
+            tree = ast.fix_missing_locations(Parameter_Injector(nodes).visit(tree))
+            self.code = compile(tree, CQSCRIPT, "exec")
+        return self.code
+    
+    def parameter_values(self, build_parameters):
+        '''
+        Convert the build parameters as cqgi would set them in the script.
+
+        :param build_parameters: dictionary name -> value
+        :return: dictionary name -> converted value
+        :raises: InvalidParameterError if a name is not a parameter or a value is invalid
+        '''
+        values = {}
+        for name, value in build_parameters.items():
+            if name not in self.metadata.parameters:
+                raise InvalidParameterError(
+                    "Cannot set value '%s': not a parameter of the model." % name)
+            # set_value() updates the AST node, give it a copy
+            parameter = self.metadata.parameters[name]
+            original = parameter.ast_node
+            parameter.ast_node = copy.copy(original)
+            try:
+                parameter.set_value(value)
+                values[name] = ast.literal_eval(parameter.ast_node)
+            finally:
+                parameter.ast_node = original
+        return values
+    
+    def parameter_tree(self, build_parameters):
+        '''
+        A copy of the script AST with the parameter values set.
+
+        :param build_parameters: dictionary name -> value
+        :return: the AST
+        '''
+        memo = {}
+        tree = copy.deepcopy(self.ast_tree, memo)
+        for name, value in build_parameters.items():
+            if name not in self.metadata.parameters:
+                raise InvalidParameterError(
+                    "Cannot set value '%s': not a parameter of the model." % name)
+            parameter = self.metadata.parameters[name]
+            original = parameter.ast_node
+            parameter.ast_node = memo[id(original)]
+            try:
+                parameter.set_value(value)
+            finally:
+                parameter.ast_node = original
+        return tree
         
     def _find_vars(self):
         '''
@@ -51,6 +188,10 @@ class CQ_Model(CQModel):
         assignable to the underlying variable type. These variables override default values in the script
         :param build_options: build options for how to build the model. Build options include things like
         timeouts, tessellation tolerances, etc
+        'incremental': an Incremental_State to re-execute only the statements changed since previous build
+        'profile': a script_profiler.Line_Profiler to time each line of the script
+        'operations': an operation_timer.Operation_Timer to time the cadquery operations
+        'cprofile': a cProfile.Profile to profile the script and cadquery
         
         :raises: Nothing. If there is an exception, it will be on the exception property of the result.
         This is the interface so that we can return other information on the result, such as the build time
@@ -61,32 +202,67 @@ class CQ_Model(CQModel):
 
         if not build_parameters:
             build_parameters = {}
+        if not build_options:
+            build_options = {}
+        
+        # Incremental_State of the previous builds, to re-execute only the changed statements
+        state = build_options.get('incremental')
+        profiler = build_options.get('profile')
+        operations = build_options.get('operations')
+        cprofile = build_options.get('cprofile')
         
         start = time.perf_counter()
         result = BuildResult()
+        result.incremental = None
+        result.line_profile = None
+        result.operations = None
+        result.cprofile = None
 
         try:
-            self.set_param_values(build_parameters)
+            # the model is not modified, parameter values are given to the script
+            if state is not None:
+                tree = self.parameter_tree(build_parameters)
+            else:
+                code = self.compiled()
+                values = self.parameter_values(build_parameters)
             collector = Script_Callback()                                       # Updated line
-            env = (
-                EnvironmentBuilder()
-                .with_real_builtins()
-                .with_cadquery_objects()
-                .add_entry("__name__", "__cqgi__")
-                .add_entry("show_object", collector.show_object)
-                .add_entry("debug", collector.debug)
-                .add_entry("describe_parameter", collector.describe_parameter)
-                .build()
-            )
-
-            c = compile(self.ast_tree, CQSCRIPT, "exec")
-            exec(c, env)
+            env = dict(base_environment())
+            env["show_object"] = collector.show_object
+            env["debug"] = collector.debug
+            env["describe_parameter"] = collector.describe_parameter
+
+            if operations is not None:
+                operations.install()
+            if profiler is not None:
+                profiler.start()
+            if cprofile is not None:
+                cprofile.enable()
+            try:
+                with tracing.span('script', incremental=state is not None):
+                    if state is not None:
+                        executed = state.execute(tree, env, collector)
+                        result.incremental = (executed, len(tree.body))
+                    else:
+                        env[PARAMETERS] = values
+                        exec(code, env)
+            finally:
+                if cprofile is not None:
+                    cprofile.disable()
+                    result.cprofile = build_profile.profile_stats(cprofile)
+                if profiler is not None:
+                    profiler.stop()
+                    result.line_profile = profiler.lines
+                if operations is not None:
+                    operations.uninstall()
+                    result.operations = operations.rows()
             result.set_debug(collector.debugObjects)
             result.set_success_result(collector.outputObjects)
             result.env = env
             
         except Exception as ex:
             result.set_failure_result(ex)
+            if state is not None:
+                state.clear()
             
         end = time.perf_counter()
         result.buildTime = end - start
@@ -121,6 +297,7 @@ class Script_Callback(ScriptCallback):
         o = ShapeResult()
         o.options = options
         o.shape = shape
+        o.lineno = self.call_site()
         self.outputObjects.append(o)
     
     def debug(self, shape, options=None, **kwargs):
@@ -138,7 +315,21 @@ class Script_Callback(ScriptCallback):
         s = ShapeResult()
         s.options = options
         s.shape = shape
+        s.lineno = self.call_site()
         self.debugObjects.append(s)
+    
+    def call_site(self):
+        '''
+        Find the line of the script calling show_object() or debug().
+        
+        :return: the line number or None if not called from the script
+        '''
+        frame = sys._getframe(2)
+        while frame is not None:
+            if frame.f_code.co_filename == CQSCRIPT:
+                return frame.f_lineno
+            frame = frame.f_back
+        return None
         
     def describe_parameter(self, varname, desc):
         '''
@@ -157,6 +348,9 @@ class Constant_Assignment_Finder(ast.NodeTransformer):
     Update to parse the variables setting using cqvar(value, description) method
     """
 
+    # arguments of cq_variables.cqvar()
+    CQVAR_ARGUMENTS = ('value', 'description', 'min', 'max', 'step')
+
     def __init__(self, cq_model):
         self.cqModel = cq_model
 
@@ -227,6 +421,28 @@ class Constant_Assignment_Finder(ast.NodeTransformer):
             print("Unable to handle assignment for variable '%s'" % var_name)
             pass
 
+    def cqvar_arguments(self, call):
+        '''Nodes of the arguments of a cqvar() call, by name of the argument.'''
+        nodes = dict(zip(self.CQVAR_ARGUMENTS, call.args))
+        nodes.update((keyword.arg, keyword.value) for keyword in call.keywords)
+        return nodes
+
+    def set_range(self, var_name, nodes):
+        '''Set the min, max and step given to cqvar() on the parameter, as minimum, maximum and step.'''
+        parameter = self.cqModel.parameters.get(var_name)
+        if parameter is None:
+            return
+        for argument, attribute in (('min', 'minimum'), ('max', 'maximum'), ('step', 'step')):
+            value = None
+            if argument in nodes:
+                try:
+                    value = ast.literal_eval(nodes[argument])
+                except ValueError:
+                    print("Unable to read '%s' of variable '%s', it must be a number" % (argument, var_name))
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    value = None
+            setattr(parameter, attribute, value)
+
     def visit_Assign(self, node):
 
         try:
@@ -255,8 +471,11 @@ class Constant_Assignment_Finder(ast.NodeTransformer):
             elif type(node.value) == ast.Call:
                 try:
                     if node.value.func.id == "cqvar":
-                        self.handle_assignment(left_side.id, node.value.args[0],
-                                                node.value.args[1].s)
+                        nodes = self.cqvar_arguments(node.value)
+                        description = nodes.get('description')
+                        self.handle_assignment(left_side.id, nodes['value'],
+                                                ast.literal_eval(description) if description else None)
+                        self.set_range(left_side.id, nodes)
                 except:
                     pass
             
@@ -265,3 +484,329 @@ class Constant_Assignment_Finder(ast.NodeTransformer):
             print("Unable to handle assignment for node '%s'" % ast.dump(left_side))
 
         return node
+
+
+class Statement_Names(ast.NodeVisitor):
+    """
+    Visits a top-level statement of a script to find the names it defines and uses.
+
+    pure is set to False when the statement may have effects which can't be
+    tracked by the names it defines: global declarations, attribute or item
+    assignments, method calls whose result is dropped, star imports, use of
+    builtins like exec or open...
+
+    A name given to a function of the script may be modified in place by it,
+    so the names passed to these functions are taken as redefined by the
+    statement. Functions of cadquery or of the standard library like len() are
+    not expected to modify their arguments. The names a method is called on are
+    kept in call_roots, their value may be modified in place by the method.
+    """
+
+    OUTPUT_FUNCTIONS = ('show_object', 'debug', 'describe_parameter')
+    IMPURE_BUILTINS = ('open', 'exec', 'eval', 'compile', 'input', '__import__',
+                       'globals', 'locals', 'vars', 'setattr', 'delattr')
+
+    def __init__(self, functions=()):
+        self.functions = functions  # names of the functions and classes defined by the script
+        self.defs = set()
+        self.uses = set()
+        self.call_roots = set()     # names used as root of a method call or passed to a script function
+        self.pure = True
+        self.refresh = False        # defines functions or classes bound to the globals
+        self.depth = 0              # depth inside function or class definitions
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.uses.add(node.id)
+            if node.id in self.IMPURE_BUILTINS:
+                self.pure = False
+        elif self.depth == 0:
+            self.defs.add(node.id)
+
+    def visit_AugAssign(self, node):
+        # h += 5 uses h as well as it defines it
+        if isinstance(node.target, ast.Name):
+            self.uses.add(node.target.id)
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node):
+        if not isinstance(node.ctx, ast.Load) and self.depth == 0:
+            self.pure = False
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node):
+        if not isinstance(node.ctx, ast.Load) and self.depth == 0:
+            self.pure = False
+        self.generic_visit(node)
+
+    def visit_Delete(self, node):
+        self.pure = False
+        self.generic_visit(node)
+
+    def visit_Global(self, node):
+        self.pure = False
+
+    def visit_Nonlocal(self, node):
+        self.pure = False
+
+    def visit_Call(self, node):
+        root = node.func
+        while isinstance(root, (ast.Attribute, ast.Call, ast.Subscript)):
+            root = root.func if isinstance(root, ast.Call) else root.value
+        if isinstance(root, ast.Name) and isinstance(node.func, ast.Attribute):
+            self.call_roots.add(root.id)
+        script_function = isinstance(node.func, ast.Name) and node.func.id in self.functions
+        if self.depth == 0 and script_function:
+            args = [arg.value if isinstance(arg, ast.Starred) else arg for arg in node.args]
+            args.extend(keyword.value for keyword in node.keywords)
+            for arg in args:
+                if isinstance(arg, ast.Name):
+                    self.defs.add(arg.id)
+                    self.call_roots.add(arg.id)
+        self.generic_visit(node)
+
+    def visit_Expr(self, node):
+        # a method call whose result is dropped is made for its side effect
+        if self.depth == 0 and isinstance(node.value, ast.Call):
+            func = node.value.func
+            if not (isinstance(func, ast.Name) and func.id in self.OUTPUT_FUNCTIONS):
+                if isinstance(func, ast.Attribute):
+                    self.pure = False
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.defs.add(alias.asname or alias.name.split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == '*':
+                self.pure = False
+            else:
+                self.defs.add(alias.asname or alias.name)
+
+    def visit_FunctionDef(self, node):
+        if self.depth == 0:
+            self.defs.add(node.name)
+        self.refresh = True
+        self.depth += 1
+        self.generic_visit(node)
+        self.depth -= 1
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        self.refresh = True
+        self.depth += 1
+        self.generic_visit(node)
+        self.depth -= 1
+
+
+class Statement_Record(object):
+    '''A top-level statement of a script, and what its execution produced.'''
+
+    def __init__(self, node, functions=()):
+        self.node = node
+        self.key = ast.dump(node)
+        names = Statement_Names(functions)
+        names.visit(node)
+        self.defs = names.defs
+        self.uses = names.uses
+        self.call_roots = names.call_roots
+        self.pure = names.pure
+        self.refresh = names.refresh
+        self.reaching = {}          # used name -> index of the statement defining it, or None
+        self.values = {}            # defined name -> value after the statement
+        self.outputs = []           # show_object() results of the statement
+        self.debugs = []            # debug() results of the statement
+        self.contexts = {}          # Workplane contexts after the statement
+
+
+class Incremental_State(object):
+    '''
+    Keep the statements executed by the previous build of a script, to re-execute
+    only the statements downstream of what changed on the next build.
+
+    The namespace after each statement is kept as the values of the names it
+    defines. As the contexts of cadquery Workplanes (pending wires, tags...) are
+    modified by the operations made on them, they are saved after each statement
+    as well and restored before a statement is re-executed.
+
+    Scripts with effects that can't be tracked by the top-level names, or that
+    modify lists, dictionaries, Sketch or Assembly objects in place, always
+    get a full run.
+    '''
+
+    MUTABLE_TYPES = (list, dict, set, bytearray, cq.Sketch, cq.Assembly) \
+                        if hasattr(cq, 'Sketch') else (list, dict, set, bytearray, cq.Assembly)
+
+    def __init__(self):
+        self.records = []
+
+    def clear(self):
+        self.records = []
+
+    def execute(self, ast_tree, env, collector):
+        '''
+        Execute the script, re-using the previous build where nothing changed.
+
+        :param ast_tree: the script AST, with the parameter values set
+        :param env: the environment to execute the script in
+        :param collector: the Script_Callback of the environment
+        :return: the number of statements executed
+        '''
+        functions = self._script_functions(ast_tree)
+        records = [Statement_Record(node, functions) for node in ast_tree.body]
+        self._add_function_globals(records, functions)
+
+        # Names used before being defined by a statement come from the environment
+        definers = {}
+        for i, record in enumerate(records):
+            record.reaching = dict((name, definers.get(name)) for name in record.uses)
+            for name in record.defs:
+                definers[name] = i
+
+        # Match the unchanged statements with the previous build
+        matches = {}
+        if all(record.pure for record in records):
+            old_keys = [record.key for record in self.records]
+            new_keys = [record.key for record in records]
+            matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+            for block in matcher.get_matching_blocks():
+                for k in range(block.size):
+                    matches[block.b + k] = block.a + k
+
+        # the statements kept may have moved, and the lines of their outputs with them
+        shifts = []
+        for i, j in matches.items():
+            old_node = self.records[j].node
+            last = getattr(old_node, 'end_lineno', None) or old_node.lineno
+            shifts.append((old_node.lineno, last, records[i].node.lineno - old_node.lineno))
+
+        dirty_names = set()
+        executed = 0
+        previous = None
+        for i, record in enumerate(records):
+            old = self.records[matches[i]] if i in matches else None
+            clean = old is not None and not (record.uses & dirty_names)
+            if clean:
+                # the used names must be defined by the same statements than before
+                for name, definer in record.reaching.items():
+                    old_definer = matches.get(definer) if definer is not None else None
+                    if old.reaching.get(name) != old_definer:
+                        clean = False
+                        break
+
+            if clean and not record.refresh:
+                # restore what the statement produced in the previous build
+                env.update(old.values)
+                record.values = old.values
+                record.outputs = self._moved(old.outputs, shifts)
+                record.debugs = self._moved(old.debugs, shifts)
+                collector.outputObjects.extend(record.outputs)
+                collector.debugObjects.extend(record.debugs)
+                record.contexts = old.contexts
+                dirty_names -= record.defs
+            else:
+                if previous is not None:
+                    self._restore_contexts(previous.contexts)
+                self._execute(record, env, collector)
+                executed += 1
+                if clean:
+                    dirty_names -= record.defs
+                else:
+                    dirty_names |= record.defs
+            previous = record
+
+        # in place modifications can't be restored, next build will be a full run
+        for record in records:
+            for name in record.call_roots:
+                if isinstance(env.get(name), self.MUTABLE_TYPES):
+                    records = []
+                    break
+            if not records:
+                break
+
+        self.records = records
+        return executed
+
+    def _script_functions(self, ast_tree):
+        '''Names of the functions and classes defined at the top level of the script.'''
+        functions = set()
+        for node in ast_tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                functions.add(node.name)
+            elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Lambda):
+                functions.update(target.id for target in node.targets if isinstance(target, ast.Name))
+        return functions
+
+    def _add_function_globals(self, records, functions):
+        '''
+        A call to a function of the script reads the globals used by its body,
+        add them to the names used by the statements using the function.
+        '''
+        bodies = {}
+        for record in records:
+            for name in record.defs & functions:
+                bodies[name] = record.uses - {name}
+        changed = True
+        while changed:
+            changed = False
+            for record in records:
+                for name in record.uses & functions:
+                    if not bodies.get(name, set()) <= record.uses:
+                        record.uses |= bodies[name]
+                        changed = True
+            for record in records:
+                for name in record.defs & functions:
+                    bodies[name] = record.uses - {name}
+
+    def _moved(self, results, shifts):
+        '''
+        The results of the previous build, copied at the lines their statements moved to.
+
+        :param results: ShapeResult objects of the previous build
+        :param shifts: (first line, last line, shift) of the statements kept
+        '''
+        moved = []
+        for result in results:
+            lineno = getattr(result, 'lineno', None)
+            for first, last, shift in shifts:
+                if shift and lineno is not None and first <= lineno <= last:
+                    result = copy.copy(result)
+                    result.lineno = lineno + shift
+                    break
+            moved.append(result)
+        return moved
+
+    def _execute(self, record, env, collector):
+        nb_outputs = len(collector.outputObjects)
+        nb_debugs = len(collector.debugObjects)
+
+        c = compile(ast.Module(body=[record.node], type_ignores=[]), CQSCRIPT, "exec")
+        exec(c, env)
+
+        record.values = dict((name, env[name]) for name in record.defs if name in env)
+        record.outputs = collector.outputObjects[nb_outputs:]
+        record.debugs = collector.debugObjects[nb_debugs:]
+        record.contexts = self._save_contexts(env)
+
+    def _save_contexts(self, env):
+        contexts = {}
+        for value in list(env.values()):
+            if isinstance(value, cq.Workplane) and id(value.ctx) not in contexts:
+                contexts[id(value.ctx)] = (value.ctx, self._copy_context(value.ctx.__dict__))
+        return contexts
+
+    def _restore_contexts(self, contexts):
+        for ctx, saved in contexts.values():
+            ctx.__dict__.update(self._copy_context(saved))
+
+    def _copy_context(self, attributes):
+        copy = {}
+        for name, value in attributes.items():
+            if isinstance(value, (list, dict, set)):
+                value = type(value)(value)
+            copy[name] = value
+        return copy
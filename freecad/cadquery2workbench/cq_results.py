@@ -0,0 +1,402 @@
+""" Convert CQGI build results into objects to be displayed in FreeCAD """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# Nothing in this module depends on FreeCAD or Qt, so that it can be used
+# as well by the build worker process
+import uuid
+import hashlib
+from io import BytesIO
+from collections import OrderedDict
+from random import random
+
+import cadquery as cq
+
+from freecad.cadquery2workbench import shape_mesh
+from freecad.cadquery2workbench import tracing
+
+# number of placements of Assembly nodes kept by assembly_parts() from one build to the next
+PLACEMENT_CACHE_SIZE = 20000
+
+IDENTITY = (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+
+_placement_cache = OrderedDict()    # (path, parent matrix, id of the node Location) -> (Location, placement, matrix)
+
+
+class Display_Object(object):
+    '''
+    An object to display in FreeCAD, with the options parsed from show_object() or debug().
+
+    The shape is either a cadquery object (build made inside FreeCAD)
+    or a BREP payload (build made by the worker process).
+    '''
+
+    def __init__(self, shape, rgba, name, group, loc=None, key=None, groups=()):
+        self.shape = shape          # cadquery object
+        self.payload = None         # BREP of the shape as bytes, when shape is None
+        self.fingerprint = None     # hash of the payload
+        self.rgba = rgba            # (red, green, blue, alpha) red, green, blue in [0-255], alpha in [0.0-1.0]
+        self.name = name            # name of the object in FreeCAD
+        self.group = group          # group of the object in FreeCAD or None
+        self.loc = loc              # 4x4 placement matrix as a 16-tuple or None
+        self.key = key              # identity of the object from one build to the next
+        self.groups = groups        # names of the nested groups inside group, ie the assembly levels
+
+
+def color_to_rgba(color):
+    '''
+    Convert a cadquery Color to a rgba tuple.
+
+    :param color: a cadquery Color
+    :return: (red, green, blue, alpha) red, green, blue in [0-255], alpha in [0.0-1.0]
+    '''
+    r, g, b, a = color.toTuple()
+    r *= 255
+    g *= 255
+    b *= 255
+    a = 1 - a
+    return (r, g, b, a)
+
+
+def parse_rgba(options):
+    '''
+    Get the rgba of an object from the options given to show_object().
+
+    :param options: the options dictionary
+    :return: (red, green, blue, alpha) red, green, blue in [0-255], alpha in [0.0-1.0]
+    '''
+    # if rgba is defined it superseed any colors or alpha options
+    if 'rgba' in options:
+        rgba = options['rgba']
+        # rgba provided as a String '#RRGGBB'or '#RRGGBBAA'
+        if type(rgba) == str:
+            rgba = rgba[1:] # remove first char '#'
+            red = int(rgba[0]+rgba[1], 16)
+            green = int(rgba[2]+rgba[3], 16)
+            blue = int(rgba[4]+rgba[5], 16)
+            if len(rgba) > 6:
+                alpha = int(rgba[6]+rgba[7], 16) / 255.0
+            else:
+                alpha = 0.0
+            rgba = (red, green, blue, alpha)
+        # rgba defined as CadQuery Color class
+        elif type(rgba) == cq.Color:
+            rgba = color_to_rgba(rgba)
+        else:
+            # rgba is supposed to be a list (red, green, blue, alpha)
+            pass
+    else:
+        # rgba is not defined check for color and alpha
+        color = options['color'] if 'color' in options else (204, 204, 204)
+        alpha = options['alpha'] if 'alpha' in options else 0.0
+        rgba = (color[0], color[1], color[2], alpha)
+
+    return rgba
+
+
+def call_site_name(prefix, result, sites):
+    '''
+    Default name of an object, from the line of the script showing it.
+
+    :param prefix: 'Shape' or 'Debug'
+    :param result: a cqgi ShapeResult
+    :param sites: dictionary counting the objects shown by each line
+    :return: the name, stable from one build to the next
+    '''
+    lineno = getattr(result, 'lineno', None)
+    if lineno is None:
+        return prefix + "_" + str(random())
+
+    # the same line may show several objects, ie in a loop
+    site = prefix + "_L" + str(lineno)
+    count = sites.get(site, 0)
+    sites[site] = count + 1
+    return site if count == 0 else site + "_" + str(count)
+
+
+def unique_key(key, keys):
+    '''
+    Make the key of an object unique in the build, objects may be shown with the same name.
+
+    :param key: the key of the object
+    :param keys: set of the keys already given
+    :return: the unique key
+    '''
+    unique = key
+    count = 1
+    while unique in keys:
+        unique = key + (count,)
+        count += 1
+    keys.add(unique)
+    return unique
+
+
+def list_build_objects(build_result, show_debug=False):
+    '''
+    List the objects to display from a successful build result.
+
+    Each object gets a key, from its name and group options or from the line
+    of the script showing it, which identifies it from one build to the next.
+
+    :param build_result: a cqgi BuildResult
+    :param show_debug: if True the debug() objects are listed as well
+    :return: a list of Display_Object
+    '''
+    list_objects = []
+    sites = {}
+    keys = set()
+
+    # Display all the results that the user requested
+    for result in build_result.results:
+        # Apply options to the show function if any were provided
+        name = call_site_name("Shape", result, sites)
+        group = None
+        rgba = (204, 204, 204, 0.0)
+        if result.options:
+            # parse the options
+            # object name
+            name = result.options['name'] if 'name' in result.options else name
+            # object group
+            group = result.options['group'] if 'group' in result.options else group
+            # object color
+            rgba = parse_rgba(result.options)
+
+        # append object to the list of objects
+        key = unique_key(('show', group, name), keys)
+        list_objects.append(Display_Object(result.shape, rgba, name, group, key=key))
+
+    # if user choose to show render objects
+    if show_debug:
+        for debugObj in build_result.debugObjects:
+            # force color for Debug object
+            rgba = (255, 0, 0, 0.60)
+            # Apply options to the show function if any were provided
+            if debugObj.options and 'name' in debugObj.options:
+                # object name, Mark this as a debug object
+                name = "Debug_" + debugObj.options['name']
+            else:
+                name = call_site_name("Debug", debugObj, sites)
+            # object group
+            group = debugObj.options['group'] \
+                        if debugObj.options and 'group' in debugObj.options else None
+
+            # append object to the list of objects
+            key = unique_key(('debug', group, name), keys)
+            list_objects.append(Display_Object(debugObj.shape, rgba, name, group, key=key))
+
+    return list_objects
+
+
+def location_matrix(loc):
+    '''
+    Convert a cadquery Location to a 4x4 matrix.
+
+    :param loc: a cadquery Location
+    :return: the matrix as a 16-tuple, row by row, as expected by FreeCAD Matrix
+    '''
+    trsf = loc.wrapped.Transformation()
+    matrix = []
+    for row in range(1, 4):
+        for col in range(1, 5):
+            matrix.append(trsf.Value(row, col))
+    matrix.extend((0.0, 0.0, 0.0, 1.0))
+    return tuple(matrix)
+
+
+def assembly_name(assy, default):
+    '''Name of an Assembly node, default if cadquery named it with a random uuid.'''
+    try:
+        uuid.UUID(str(assy.name))
+    except ValueError:
+        return assy.name
+    return default
+
+
+def node_placement(path, parent, parent_matrix, loc):
+    '''
+    Placement of an Assembly node, composed with the one of its parent.
+
+    The placements are kept from one build to the next, keyed by the path of
+    the node, the placement of its parent and its Location object: reading
+    the values of a Location costs as much as composing it. An incremental
+    build keeps the Assemblies of the statements it doesn't execute again,
+    so their Locations are the same objects. An entry holds the Location of
+    its key, so that its id isn't given to another object.
+
+    :param path: names from the top level to the node
+    :param parent: placement of the parent as a cadquery Location
+    :param parent_matrix: placement of the parent as a 16-tuple
+    :param loc: Location of the node relative to its parent, or None
+    :return: (Location, 16-tuple) placement of the node
+    '''
+    if not loc:
+        return parent, parent_matrix
+    key = (path, parent_matrix, id(loc))
+    entry = _placement_cache.pop(key, None)
+    if entry is None:
+        placement = parent * loc
+        entry = (loc, placement, location_matrix(placement))
+    _placement_cache[key] = entry
+    while len(_placement_cache) > PLACEMENT_CACHE_SIZE:
+        _placement_cache.popitem(last=False)
+    return entry[1], entry[2]
+
+
+def assembly_parts(assy, root_name):
+    '''
+    List the parts of an Assembly and of its sub-assemblies, at any depth.
+
+    The tree is walked without recursion, the placement of each node is
+    composed once with the one of its parent and shared by its children,
+    a node without color gets the one of its parent.
+
+    :param assy: a cadquery Assembly
+    :param root_name: name of the top level if the Assembly is not named
+    :return: list of (path, node, matrix, rgba) of the nodes having a shape,
+             path being the names from the top level to the node and matrix
+             its placement as a 16-tuple
+    '''
+    parts = []
+    path = (assembly_name(assy, root_name),)
+    loc, matrix = node_placement(path, cq.Location(), IDENTITY, assy.loc)
+    stack = [(path, assy, loc, matrix, assy.color)]
+    while stack:
+        path, node, loc, matrix, color = stack.pop()
+        if node.obj is not None:
+            rgba = color_to_rgba(color) if color else (204, 204, 204, 0.0)
+            parts.append((path, node, matrix, rgba))
+        # reversed so that the children are listed in their order
+        for index in reversed(range(len(node.children))):
+            child = node.children[index]
+            child_path = path + (assembly_name(child, "Part" + str(index + 1)),)
+            child_loc, child_matrix = node_placement(child_path, loc, matrix, child.loc)
+            stack.append((child_path, child, child_loc, child_matrix, child.color or color))
+    return parts
+
+
+def append_assembly_parts(list_objects):
+    '''
+    Replace the cadquery Assemblies in the list by their parts.
+
+    Each level of the Assembly having sub-levels is a nested group, parts
+    are placed relative to the top level.
+
+    :param list_objects: a list of Display_Object
+    :return: the list of Display_Object without Assembly
+    '''
+    flat_objects = []
+    for obj in list_objects:
+        # Not an Assembly, keep it
+        if type(obj.shape) != cq.Assembly:
+            flat_objects.append(obj)
+            continue
+
+        for path, node, matrix, rgba in assembly_parts(obj.shape, obj.name):
+            # a node with children is a group, its own shape goes in it
+            groups = path if node.children else path[:-1]
+            flat_objects.append(Display_Object(node.obj, rgba, path[-1], obj.group,
+                                               matrix, (obj.key or ()) + path, groups))
+
+    return flat_objects
+
+
+def to_shape(cqObject):
+    '''
+    Get the cadquery Shape to render from a cadquery object.
+
+    :param cqObject: a cadquery Workplane, Shape or Assembly
+    :return: a cadquery Shape, a Compound of the parts for an Assembly and
+             of all the shapes of a Workplane holding several
+    '''
+    if isinstance(cqObject, cq.Shape):
+        return cqObject
+    if isinstance(cqObject, cq.Assembly):
+        return cqObject.toCompound()
+    shapes = [val for val in cqObject.vals() if isinstance(val, cq.Shape)] \
+                if hasattr(cqObject, 'vals') else []
+    if len(shapes) > 1:
+        return cq.Compound.makeCompound(shapes)
+    return shapes[0] if shapes else cqObject.val()
+
+
+def placed_shape(obj):
+    '''
+    Get the cadquery Shape of a Display_Object at its placement.
+
+    :param obj: a Display_Object holding a cadquery object, ie a part of an Assembly
+    :return: a cadquery Shape moved by the loc of the object
+    '''
+    shape = to_shape(obj.shape)
+    if obj.loc:
+        shape = cq.Shape.cast(shape_mesh.located(shape.wrapped, obj.loc))
+    return shape
+
+
+def brep_payload(cqObject):
+    '''
+    Serialize a cadquery object to BREP.
+
+    :param cqObject: a cadquery Workplane or Shape
+    :return: the BREP as bytes
+    '''
+    stream = BytesIO()
+    to_shape(cqObject).exportBrep(stream)
+    return stream.getvalue()
+
+
+def serialize_objects(list_objects, mesh=None, mesh_cache=None):
+    '''
+    Replace the shapes of the objects by their BREP payload.
+
+    Assemblies are split first, as their parts are serialized one by one.
+    A cadquery object shown several times, ie a part placed many times in
+    an Assembly, is serialized once and its objects share the same payload.
+
+    The fingerprint is the hash of the BREP without triangulation, so that
+    it doesn't depend on the tessellation.
+
+    :param list_objects: a list of Display_Object
+    :param mesh: (Deviation, AngularDeflection) of the 3D view to tessellate the shapes
+                 with, or None to leave the tessellation to FreeCAD
+    :param mesh_cache: a shape_mesh.Mesh_Cache of the tessellated payloads or None
+    :return: the list of Display_Object with their payload set
+    '''
+    with tracing.span('serialize', objects=len(list_objects)):
+        list_objects = append_assembly_parts(list_objects)
+        payloads = {}   # id of a cadquery object -> (payload, fingerprint)
+        for obj in list_objects:
+            shared = payloads.get(id(obj.shape))
+            if shared is None:
+                payload = brep_payload(obj.shape)
+                shared = payloads[id(obj.shape)] = (payload, hashlib.sha1(payload).hexdigest())
+            obj.payload, obj.fingerprint = shared
+        if mesh is not None:
+            tessellate_objects(list_objects, mesh, mesh_cache)
+        # the shapes are dropped once all are serialized, so their ids stay unique
+        for obj in list_objects:
+            obj.shape = None
+    return list_objects
+
+
+def tessellate_objects(list_objects, mesh, mesh_cache=None):
+    '''
+    Replace the payloads of the objects by BREP holding their triangulation.
+
+    :param list_objects: a list of Display_Object with their payload and fingerprint set,
+                         the objects showing the same shape sharing it
+    :param mesh: (Deviation, AngularDeflection) of the 3D view
+    :param mesh_cache: a shape_mesh.Mesh_Cache or None
+    '''
+    occurrences = OrderedDict()     # id of a cadquery object -> objects showing it
+    for obj in list_objects:
+        occurrences.setdefault(id(obj.shape), []).append(obj)
+    deviation, angular = mesh
+    with tracing.span('tessellate', shapes=len(occurrences)):
+        for objects in occurrences.values():
+            first = objects[0]
+            payload = shape_mesh.tessellated_payload(first.payload, first.fingerprint,
+                                                     [obj.loc for obj in objects],
+                                                     deviation, angular, mesh_cache)
+            for obj in objects:
+                obj.payload = payload
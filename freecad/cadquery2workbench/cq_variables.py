@@ -3,13 +3,18 @@
 # Fork of freecad-cadquery-module made for cadquery1.0 by
 # (c) 2014-2018 Jeremy Wright Apache 2.0 License
 
-def cqvar(value, description):
+def cqvar(value, description, min=None, max=None, step=None):
     """
     Set cadquery variables value and descritpion.
     
     :param value: the value to be used when executing the script.
     :param description: description of the variable is read when parsing the script
         and returned into the build_parameters of the cqModel.build method.
+    :param min: lowest value of a number variable, with max the variable gets a slider
+    :param max: highest value of a number variable
+    :param step: step of the slider, by default 1/100 of the range
+    
+    The arguments must be constants, they are read from the script without executing it.
     """
     return value
     
@@ -0,0 +1,463 @@
+""" Update the 3D view document with the objects of a new build """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+import bisect
+import hashlib
+from collections import Counter, OrderedDict
+
+import FreeCAD as App
+import Part
+
+from freecad.cadquery2workbench import shape_transfer
+from freecad.cadquery2workbench import tracing
+
+# tessellation of the objects of a preview, FreeCAD defaults are 0.5 % and 28.5 degrees
+PREVIEW_DEVIATION = 2.0
+PREVIEW_ANGULAR_DEFLECTION = 45.0
+
+
+def view_quality(preview=False):
+    '''
+    Tessellation of the objects added to the 3D view, from the preferences of
+    the Part workbench, or the coarse one of a preview.
+
+    :return: (Deviation, AngularDeflection)
+    '''
+    if preview:
+        return (PREVIEW_DEVIATION, PREVIEW_ANGULAR_DEFLECTION)
+    param = App.ParamGet("User parameter:BaseApp/Preferences/Mod/Part")
+    return (param.GetFloat("MeshDeviation", 0.5), param.GetFloat("MeshAngularDeflection", 28.5))
+
+
+def group_name(group):
+    '''Replace any troublesome characters not supported in FreeCAD object names.'''
+    if group:
+        for ch in ['&', '#', '.', '$', '%', ',', ' ']:
+            if ch in group:
+                group = group.replace(ch, "_")
+    return group
+
+
+def group_path(obj):
+    '''
+    Names of the nested groups of an object, outermost first.
+
+    :param obj: a cq_results.Display_Object
+    :return: tuple of group names, empty if the object is not in a group
+    '''
+    path = ((obj.group,) if obj.group else ()) + tuple(obj.groups)
+    return tuple(group_name(name) for name in path)
+
+
+class bulk_update(object):
+    '''
+    Context of an update of many objects of a document.
+
+    With undo, the whole update is a single transaction, undone in one
+    step. Without undo, the default, undo recording is disabled: generated
+    objects are not meant to be undone and FreeCAD doesn't copy every object
+    added, changed or removed. FreeCAD records nothing with UndoMode 0, a
+    transaction can't be opened then, so the two are exclusive.
+
+        with document_sync.bulk_update(doc, undo=False):
+            ...
+    '''
+
+    TRANSACTION = "CadQuery build"
+
+    def __init__(self, doc, undo=False):
+        self.doc = doc
+        self.undo = undo
+        self.undo_mode = None
+
+    def __enter__(self):
+        self.undo_mode = self.doc.UndoMode
+        if self.undo:
+            self.doc.openTransaction(self.TRANSACTION)
+        else:
+            self.doc.UndoMode = 0
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.undo:
+            self.doc.UndoMode = self.undo_mode
+        elif exc_type is None:
+            self.doc.commitTransaction()
+        else:
+            self.doc.abortTransaction()
+        return False
+
+
+def part_name(feature, face_index):
+    '''
+    Name of the object merged in a compound feature owning a face.
+
+    :param feature: a compound feature made by Document_Sync.aggregate()
+    :param face_index: index of the face, 0 for Face1
+    :return: the name or None if the feature is not a compound of objects
+    '''
+    if not hasattr(feature, 'PartNames') or not feature.PartFaces:
+        return None
+    index = bisect.bisect_right(feature.PartFaces, face_index) - 1
+    return feature.PartNames[max(0, index)]
+
+
+class Aggregate_Object(object):
+    '''
+    Objects of a group merged into a single compound feature, each face
+    gets the color of its object.
+
+    Behaves as a cq_results.Display_Object for Document_Sync, its
+    fingerprint changes when a shape, placement, color or name changes.
+    '''
+
+    def __init__(self, objects):
+        first = objects[0]
+        path = group_path(first)
+        self.objects = objects
+        self.name = (path[-1] if path else "Objects") + "_Compound"
+        self.group = first.group
+        self.groups = first.groups
+        self.key = ('aggregate',) + path
+        self.loc = None
+        self.rgba = None            # each face has the color of its object
+        self.fingerprint = None
+        if all(obj.fingerprint is not None for obj in objects):
+            h = hashlib.sha1()
+            for obj in objects:
+                h.update(repr((obj.fingerprint, obj.loc, obj.rgba, obj.name)).encode('utf-8'))
+            self.fingerprint = h.hexdigest()
+
+
+class Synced_Object(object):
+    '''What was set on a document object by the previous build.'''
+
+    def __init__(self, name, fingerprint, rgba, loc, group, quality=None, base=None, linked=False):
+        self.name = name                # Name of the document object
+        self.fingerprint = fingerprint  # fingerprint of the shape
+        self.rgba = rgba
+        self.loc = loc
+        self.group = group              # Name of the innermost group object or None
+        self.quality = quality          # (Deviation, AngularDeflection) to restore after a preview or None
+        self.base = base                # Placement of the shape itself, before loc
+        self.linked = linked            # True for an App::Link to a shared shape
+
+
+class Document_Sync(object):
+    '''
+    Reconcile the 3D view document with the objects of a build.
+
+    Objects are identified from one build to the next by their key. Only the
+    shapes which changed are transferred again, colors and placements are
+    updated in place and the objects no longer shown are removed.
+
+    Groups are nested, ie one per level of an assembly, and identified by
+    their path of names. Objects are moved in and out of the groups once
+    per group, so that thousands of parts don't update a group each.
+
+    With instancing, a shape shown several times (same fingerprint, ie the
+    same part placed many times in an assembly) is transferred and
+    tessellated once into a hidden source Part::Feature, each occurrence is
+    an App::Link to it with its own placement and color.
+
+    Above aggregate_above objects, the other objects of a group are merged
+    into one compound feature, so that a script showing thousands of
+    objects doesn't add thousands of document objects and tree items.
+
+    The objects of a preview, built while a variable is dragged, get a
+    coarse tessellation, the full one is restored by the next build.
+    '''
+
+    def __init__(self):
+        self.documents = {}     # document Name -> {key: Synced_Object}
+        self.groups = {}        # document Name -> {group path: Name of the group object}
+        self.sources = {}       # document Name -> {fingerprint: Synced_Object of a shared shape}
+        self.new_groups = []    # Name of the top level groups created by the last update
+
+    def forget(self, doc):
+        '''Forget the objects of a document, ie when it is created again.'''
+        self.documents.pop(doc.Name, None)
+        self.groups.pop(doc.Name, None)
+        self.sources.pop(doc.Name, None)
+
+    def update(self, doc, list_objects, preview=False, instancing=False, aggregate_above=0):
+        '''
+        Update the document with the objects of a build.
+
+        :param doc: the FreeCAD document of the 3D view
+        :param list_objects: the list of cq_results.Display_Object, assemblies already split
+        :param preview: if True the objects get a coarse tessellation
+        :param instancing: if True the shapes shown several times are App::Link to a shared shape
+        :param aggregate_above: number of objects above which the objects of a group are
+                                merged into a compound, 0 to never merge
+        :return: the list of document objects added or whose shape changed
+        '''
+        self.new_groups = []
+        synced = self.documents.get(doc.Name, {})
+        shared = self.shared_fingerprints(list_objects) if instancing else set()
+        if aggregate_above > 0 and len(list_objects) > aggregate_above:
+            list_objects = self.aggregate(list_objects, shared)
+        linked = dict((obj.key, obj.fingerprint in shared) for obj in list_objects)
+
+        # keep only the objects still shown, and of the same type, so that new objects get their exact name
+        synced = dict((key, s) for key, s in synced.items()
+                      if linked.get(key) == s.linked and doc.getObject(s.name) is not None)
+        sources = dict((fingerprint, s) for fingerprint, s in self.sources.get(doc.Name, {}).items()
+                       if fingerprint in shared and doc.getObject(s.name) is not None)
+        self.remove_objects(doc, list(synced.values()) + list(sources.values()))
+
+        # Name of the group objects of the previous build and of this one, by group path
+        groups = self.groups.get(doc.Name, {})
+        used = {}
+
+        new_synced = {}
+        touched = []
+        moved_out = {}          # Name of a group -> objects to remove from it
+        moved_in = {}           # Name of a group -> objects to add to it
+        sources = self.update_sources(doc, list_objects, shared, sources, preview, touched)
+        for obj in list_objects:
+            previous = synced.get(obj.key)
+            if previous is None:
+                feature = doc.addObject("App::Link" if linked[obj.key] else "Part::Feature", obj.name)
+            else:
+                feature = doc.getObject(previous.name)
+
+            # case group was passed in the options, or part of an assembly
+            group = self.get_group(doc, group_path(obj), groups, used)
+            old_group = previous.group if previous is not None else None
+            if group != old_group:
+                if old_group and doc.getObject(old_group) is not None:
+                    moved_out.setdefault(old_group, []).append(feature)
+                if group:
+                    moved_in.setdefault(group, []).append(feature)
+
+            # shape changed or new object
+            shape_changed = previous is None or obj.fingerprint is None \
+                                or previous.fingerprint != obj.fingerprint
+            quality = None
+            if linked[obj.key]:
+                # the tessellation is the one of the source
+                source = sources[obj.fingerprint]
+                base = source.base
+                if shape_changed:
+                    feature.LinkedObject = doc.getObject(source.name)
+                    touched.append(feature)
+            else:
+                # tessellation set before the shape, so that it is made once
+                quality = self.set_quality(feature, preview,
+                                           previous.quality if previous is not None else None)
+                if shape_changed:
+                    with tracing.span('transfer', object=feature.Name):
+                        if isinstance(obj, Aggregate_Object):
+                            self.set_compound(feature, obj)
+                        else:
+                            feature.Shape = shape_transfer.to_freecad(obj)
+                    base = feature.Shape.Placement
+                    touched.append(feature)
+                else:
+                    base = previous.base
+
+            if shape_changed or previous.loc != obj.loc:
+                self.set_placement(feature, obj.loc, base)
+
+            if obj.rgba is not None and (previous is None or previous.rgba != obj.rgba):
+                if linked[obj.key]:
+                    self.set_link_color(feature, obj.rgba)
+                else:
+                    self.set_color(feature, obj.rgba)
+
+            new_synced[obj.key] = Synced_Object(feature.Name, obj.fingerprint, obj.rgba, obj.loc,
+                                                group, quality, base, linked[obj.key])
+
+        for name, features in moved_out.items():
+            doc.getObject(name).removeObjects(features)
+        for name, features in moved_in.items():
+            doc.getObject(name).addObjects(features)
+
+        self.remove_empty_groups(doc, used)
+        self.documents[doc.Name] = new_synced
+        self.groups[doc.Name] = used
+        self.sources[doc.Name] = sources
+        return touched
+
+    def shared_fingerprints(self, list_objects):
+        '''Fingerprints of the shapes shown more than once.'''
+        counts = Counter(obj.fingerprint for obj in list_objects if obj.fingerprint is not None)
+        return set(fingerprint for fingerprint, count in counts.items() if count > 1)
+
+    def aggregate(self, list_objects, shared):
+        '''
+        Merge the objects of each group into an Aggregate_Object, the shapes
+        shown several times are left out to be linked.
+
+        :param shared: the fingerprints of the shapes shown several times
+        :return: the new list of objects
+        '''
+        kept = []
+        groups = OrderedDict()      # group path -> objects
+        for obj in list_objects:
+            if obj.fingerprint in shared:
+                kept.append(obj)
+            else:
+                groups.setdefault(group_path(obj), []).append(obj)
+        for objects in groups.values():
+            kept.append(objects[0] if len(objects) == 1 else Aggregate_Object(objects))
+        return kept
+
+    def set_compound(self, feature, aggregate):
+        '''Set the compound of the objects of an Aggregate_Object, with the color of each face.'''
+        shapes = []
+        colors = []
+        names = []
+        faces = []
+        for obj in aggregate.objects:
+            shape = shape_transfer.to_freecad(obj)
+            if obj.loc:
+                shape.Placement = App.Placement(App.Matrix(*obj.loc)).multiply(shape.Placement)
+            names.append(obj.name)
+            faces.append(len(colors))
+            color = (obj.rgba[0] / 255.0, obj.rgba[1] / 255.0, obj.rgba[2] / 255.0, float(obj.rgba[3]))
+            colors.extend([color] * len(shape.Faces))
+            shapes.append(shape)
+        feature.Shape = Part.makeCompound(shapes)
+
+        # the object of a face is found by part_name()
+        if not hasattr(feature, 'PartNames'):
+            feature.addProperty('App::PropertyStringList', 'PartNames', 'CadQuery',
+                                'Names of the objects merged in the compound')
+            feature.addProperty('App::PropertyIntegerList', 'PartFaces', 'CadQuery',
+                                'Index of the first face of each object merged')
+        feature.PartNames = names
+        feature.PartFaces = faces
+        if feature.ViewObject is not None:
+            feature.ViewObject.DiffuseColor = colors
+
+    def update_sources(self, doc, list_objects, shared, sources, preview, touched):
+        '''
+        Transfer once each shape shown several times, into a hidden Part::Feature.
+
+        :param shared: the fingerprints of the shapes shown several times
+        :param sources: the sources of the previous build still shared, by fingerprint
+        :param touched: the list of document objects added, updated
+        :return: the sources of this build, by fingerprint
+        '''
+        new_sources = {}
+        for obj in list_objects:
+            if obj.fingerprint not in shared or obj.fingerprint in new_sources:
+                continue
+            previous = sources.get(obj.fingerprint)
+            if previous is None:
+                feature = doc.addObject("Part::Feature", obj.name + "_Shape")
+            else:
+                feature = doc.getObject(previous.name)
+            quality = self.set_quality(feature, preview,
+                                       previous.quality if previous is not None else None)
+            if previous is None:
+                with tracing.span('transfer', object=feature.Name):
+                    feature.Shape = shape_transfer.to_freecad(obj)
+                feature.Visibility = False
+                touched.append(feature)
+            new_sources[obj.fingerprint] = Synced_Object(feature.Name, obj.fingerprint, None, None,
+                                                         None, quality, feature.Shape.Placement)
+        return new_sources
+
+    def get_group(self, doc, path, groups, used):
+        '''
+        Name of the group object of a group path, the group and its parents
+        are created if not yet in the document.
+
+        :param path: tuple of group names, outermost first
+        :param groups: Name of the group objects of the previous build, by path
+        :param used: Name of the group objects of this build, by path, updated
+        :return: the Name of the group object or None for an empty path
+        '''
+        if not path:
+            return None
+        if path in used:
+            return used[path]
+        parent = self.get_group(doc, path[:-1], groups, used)
+
+        groupObj = doc.getObject(groups[path]) if path in groups else None
+        if groupObj is None and parent is None:
+            # a top level group of the same name
+            groupObj = doc.getObject(path[-1])
+        if groupObj is None or type(groupObj) != App.DocumentObjectGroup:
+            groupObj = doc.addObject('App::DocumentObjectGroup', path[-1])
+            doc.Tip = groupObj
+            if parent is None:
+                self.new_groups.append(groupObj.Name)
+        if parent is not None and not doc.getObject(parent).hasObject(groupObj):
+            doc.getObject(parent).addObject(groupObj)
+        used[path] = groupObj.Name
+        return groupObj.Name
+
+    def set_placement(self, feature, loc, base):
+        # Placement of the shape itself, then the one of the assembly part
+        placement = base
+        if loc:
+            placement = App.Placement(App.Matrix(*loc)).multiply(placement)
+        feature.Placement = placement
+
+    def set_color(self, feature, rgba):
+        # FreeCAD without GUI, ie the benchmarks
+        if feature.ViewObject is None:
+            return
+
+        #Convert our rgba values
+        r = rgba[0] / 255.0
+        g = rgba[1] / 255.0
+        b = rgba[2] / 255.0
+        a = int(rgba[3] * 100.0)
+
+        #Change our shape's properties accordingly
+        feature.ViewObject.ShapeColor = (r, g, b)
+        feature.ViewObject.Transparency = a
+
+    def set_link_color(self, link, rgba):
+        # a link shows the shape of its source with its own material
+        if link.ViewObject is None:
+            return
+        material = App.Material()
+        material.DiffuseColor = (rgba[0] / 255.0, rgba[1] / 255.0, rgba[2] / 255.0)
+        material.Transparency = float(rgba[3])
+        link.ViewObject.OverrideMaterial = True
+        link.ViewObject.ShapeMaterial = material
+
+    def set_quality(self, feature, preview, quality):
+        '''
+        Set a coarse tessellation for a preview, restore the full one after.
+
+        :param quality: the (Deviation, AngularDeflection) saved by a previous preview or None
+        :return: the (Deviation, AngularDeflection) to restore or None
+        '''
+        view = feature.ViewObject
+        if view is None or not hasattr(view, 'Deviation'):
+            return None
+        if preview and quality is None:
+            quality = (view.Deviation, view.AngularDeflection)
+            view.Deviation = PREVIEW_DEVIATION
+            view.AngularDeflection = PREVIEW_ANGULAR_DEFLECTION
+        elif not preview and quality is not None:
+            view.Deviation, view.AngularDeflection = quality
+            quality = None
+        return quality
+
+    def remove_objects(self, doc, synced):
+        '''Remove the document objects not in the list of Synced_Object, groups are kept until remove_empty_groups().'''
+        keep = set(s.name for s in synced)
+        removed = [o.Name for o in doc.Objects
+                   if o.Name not in keep and type(o) != App.DocumentObjectGroup]
+        for name in removed:
+            doc.removeObject(name)
+
+    def remove_empty_groups(self, doc, groups):
+        # a parent group is empty once its empty sub-groups are removed
+        used = set(groups.values())
+        while True:
+            removed = [o.Name for o in doc.Objects
+                       if type(o) == App.DocumentObjectGroup and (o.Name not in used or not o.Group)]
+            if not removed:
+                return
+            for name in removed:
+                doc.removeObject(name)
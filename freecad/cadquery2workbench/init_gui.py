@@ -3,13 +3,17 @@
 # Fork of freecad-cadquery-module made for cadquery1.0 by
 # (c) 2014-2018 Jeremy Wright Apache 2.0 License
 import os
+import time
 import FreeCAD as App
 import FreeCADGui as Gui
-import cadquery as cq
 from PySide2.QtCore import Qt
 from PySide2.QtWidgets import QApplication, QDockWidget
 from freecad.cadquery2workbench import ICONPATH
-from freecad.cadquery2workbench import cadquery_dockwidget
+from freecad.cadquery2workbench import cadquery_loader
+
+# This module is loaded at every FreeCAD start, cadquery and the workbench
+# modules are imported only once the workbench is activated
+registration_start = time.perf_counter()
 
 
 class CadQuery2_Workbench(Gui.Workbench):
@@ -32,7 +36,7 @@ class CadQuery2_Workbench(Gui.Workbench):
         App.Console.PrintMessage("Switching to CadQuery Workbench\n")
         msg = QApplication.translate(
                 "cqCodeWidget",
-                "CadQuery " + cq.__version__ + "\r\n"
+                "CadQuery " + cadquery_loader.version() + "\r\n"
                 "          A python parametric CAD scripting framework based on OCCT\r\n"
                 "          Author: Originally written by David Cowden (v1)\r\n"
                 "                  OCCT implementation by Adam Arbanczyk (v2)\r\n"
@@ -59,8 +63,14 @@ class CadQuery2_Workbench(Gui.Workbench):
                 widget.setVisible(True)
         
         if not cqDockWidget_isopened:
+            start = time.perf_counter()
+            from freecad.cadquery2workbench import cadquery_dockwidget
             cqDockWidget = cadquery_dockwidget.CadqueryDockWidget()
             mw.addDockWidget(Qt.RightDockWidgetArea, cqDockWidget)
+            App.Console.PrintMessage("CadQuery editor loaded in {0:.0f} ms\r\n" \
+                                        .format((time.perf_counter() - start) * 1000.0))
+            # import cadquery in the background while the user opens a script
+            cqDockWidget.cmd.warm_up()
 
     def Deactivated(self):
         '''
@@ -70,4 +80,6 @@ class CadQuery2_Workbench(Gui.Workbench):
 
 
 Gui.addWorkbench(CadQuery2_Workbench())
+App.Console.PrintLog("CadQuery workbench registered in {0:.1f} ms\n" \
+                        .format((time.perf_counter() - registration_start) * 1000.0))
 
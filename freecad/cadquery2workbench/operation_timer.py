@@ -0,0 +1,114 @@
+""" Time the cadquery operations called by a CQGI script """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# Nothing in this module depends on FreeCAD or Qt, so that it can be used
+# as well by the build worker process
+import sys
+import time
+import inspect
+import functools
+
+import cadquery as cq
+from cadquery.cqgi import CQSCRIPT
+
+
+def timed_classes():
+    '''The cadquery classes whose methods are timed.'''
+    from cadquery.occ_impl import shapes
+    classes = [cq.Workplane, cq.Shape, shapes.Mixin1D, shapes.Mixin3D,
+               cq.Vertex, cq.Edge, cq.Wire, cq.Face, cq.Shell, cq.Solid, cq.Compound]
+    if hasattr(cq, 'Sketch'):
+        classes.append(cq.Sketch)
+    return classes
+
+
+def script_line():
+    '''Line of the script calling the operation, None if not called from the script.'''
+    frame = sys._getframe(3)
+    while frame is not None:
+        if frame.f_code.co_filename == CQSCRIPT:
+            return frame.f_lineno
+        frame = frame.f_back
+    return None
+
+
+class Operation_Timer(object):
+    '''
+    Count and time the calls of the cadquery Workplane, Sketch and Shape methods.
+
+    The public methods of the classes are replaced by timed ones between
+    install() and uninstall(). An operation calls others, ie extrude() calls
+    Solid.extrudeLinear(), so both the total time and the self time, without
+    the timed operations it calls, are recorded. The line of an operation is
+    the line of the script starting the outermost call.
+    '''
+
+    def __init__(self):
+        self.stats = {}         # (operation, line) -> [calls, total seconds, self seconds]
+        self.stack = []         # time spent in nested timed calls, per call in progress
+        self.lineno = None      # script line of the outermost call in progress
+        self.originals = []     # (class, name, attribute) replaced by install()
+        self.clock = time.perf_counter
+
+    def install(self):
+        self.stats.clear()
+        for cls in timed_classes():
+            for name, attribute in list(vars(cls).items()):
+                if name.startswith('_'):
+                    continue
+                label = cls.__name__ + "." + name
+                # the shapes are mostly made by class methods, ie Solid.extrudeLinear()
+                if isinstance(attribute, (classmethod, staticmethod)):
+                    timed = type(attribute)(self.wrap(label, attribute.__func__))
+                # functions, and the multimethods which aren't, ie Shape.dprism()
+                elif callable(attribute) and not inspect.isclass(attribute):
+                    timed = self.wrap(label, attribute)
+                else:
+                    continue
+                self.originals.append((cls, name, attribute))
+                setattr(cls, name, timed)
+
+    def uninstall(self):
+        for cls, name, attribute in reversed(self.originals):
+            setattr(cls, name, attribute)
+        self.originals = []
+        self.stack = []
+
+    def wrap(self, label, function):
+        timer = self
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            return timer.call(label, function, args, kwargs)
+        return timed
+
+    def call(self, label, function, args, kwargs):
+        if not self.stack:
+            self.lineno = script_line()
+        lineno = self.lineno
+
+        self.stack.append(0.0)
+        start = self.clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = self.clock() - start
+            nested = self.stack.pop()
+            if self.stack:
+                self.stack[-1] += elapsed
+            stat = self.stats.setdefault((label, lineno), [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += elapsed
+            stat[2] += elapsed - nested
+
+    def rows(self):
+        '''
+        The timed operations, the slowest first.
+
+        :return: list of dictionaries with keys operation, line, calls, total and self
+        '''
+        rows = [{'operation': label, 'line': lineno, 'calls': calls, 'total': total, 'self': own}
+                for (label, lineno), (calls, total, own) in self.stats.items()]
+        return sorted(rows, key=lambda row: row['total'], reverse=True)
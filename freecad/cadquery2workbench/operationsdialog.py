@@ -0,0 +1,63 @@
+""" the CadQuery Operations timing Dialog of cadquery2-freecad-workbench """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+from PySide2.QtCore import Qt
+from PySide2.QtWidgets import QDialog, QLabel, QVBoxLayout, QDialogButtonBox
+from PySide2.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView
+
+
+class OperationsDialog(QDialog):
+    '''Sortable table of the cadquery operations timed during the last build.'''
+
+    COLUMNS = [('Operation', 'operation'), ('Line', 'line'), ('Calls', 'calls'),
+               ('Total (ms)', 'total'), ('Self (ms)', 'self')]
+
+    def __init__(self, parent=None):
+        super(OperationsDialog, self).__init__(parent)
+        self.resize(600, 400)
+        self.setWindowTitle('CadQuery Operations')
+        self.initUI()
+
+    def initUI(self):
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels([label for label, key in self.COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.status = QLabel('')
+
+        self.buttons = QDialogButtonBox()
+        self.buttons.setOrientation(Qt.Horizontal)
+        self.buttons.addButton(QDialogButtonBox.Close)
+        self.buttons.rejected.connect(self.reject)
+
+        vbox = QVBoxLayout()
+        vbox.addWidget(self.table)
+        vbox.addWidget(self.status)
+        vbox.addWidget(self.buttons)
+        self.setLayout(vbox)
+
+    def set_rows(self, rows, build_time):
+        '''
+        Fill the table with the operations of a build.
+
+        :param rows: the rows of operation_timer.Operation_Timer
+        :param build_time: the build time in seconds
+        '''
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(rows))
+        for line, row in enumerate(rows):
+            for col, (label, key) in enumerate(self.COLUMNS):
+                value = row[key]
+                if key in ('total', 'self'):
+                    value = round(value * 1000.0, 3)
+                item = QTableWidgetItem()
+                # numbers are set as data so that they are sorted as numbers
+                item.setData(Qt.DisplayRole, value if value is not None else '')
+                self.table.setItem(line, col, item)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(3, Qt.DescendingOrder)
+
+        timed = sum(row['self'] for row in rows)
+        self.status.setText("{0} operations, {1:.3f} s in cadquery operations, build time {2:.3f} s" \
+                                .format(sum(row['calls'] for row in rows), timed, build_time or 0.0))
@@ -0,0 +1,104 @@
+""" Named snapshots and history of the values of the script variables """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# Nothing in this module depends on FreeCAD or Qt, the snapshots are saved
+# next to the script in a JSON file, the history only lives in memory.
+import os
+import json
+from collections import OrderedDict
+
+HISTORY_SIZE = 20
+SIDECAR_SUFFIX = '.snapshots.json'
+
+
+def sidecar_path(script_path):
+    '''The snapshots file of a script: script.py -> script.snapshots.json'''
+    return os.path.splitext(script_path)[0] + SIDECAR_SUFFIX
+
+
+def describe(values, max_length=60):
+    '''One line summary of a set of values, ie "width=20, height=5.5".'''
+    text = ", ".join("{0}={1!r}".format(name, value) for name, value in sorted(values.items()))
+    if len(text) > max_length:
+        text = text[:max_length - 3] + "..."
+    return text
+
+
+def same_values(a, b):
+    '''Equal sets of values, of the same types: 1, 1.0 and True differ.'''
+    if a.keys() != b.keys():
+        return False
+    return all(type(a[name]) == type(b[name]) and a[name] == b[name] for name in a)
+
+
+class Parameter_Snapshots(object):
+    '''
+    Sets of variable values to switch between design variants.
+
+    Snapshots are named by the user and saved with the script, the history
+    holds the last HISTORY_SIZE sets of values built, most recent first.
+    Values are kept as typed: int, float, bool or str.
+    '''
+
+    def __init__(self):
+        self.path = None                    # the sidecar file, None for an unsaved script
+        self.snapshots = OrderedDict()      # name -> values, name -> value
+        self.history = []                   # values, most recent first
+
+    def load(self, script_path):
+        '''
+        Read the snapshots of a script, the history is cleared.
+
+        :param script_path: the script file, or None for an unsaved script
+        :raises: OSError or ValueError if the sidecar file can't be read
+        '''
+        self.path = sidecar_path(script_path) if script_path else None
+        self.snapshots = OrderedDict()
+        self.history = []
+        if self.path is None or not os.path.isfile(self.path):
+            return
+        with open(self.path) as f:
+            data = json.load(f, object_pairs_hook=OrderedDict)
+        snapshots = data.get('snapshots', {}) if isinstance(data, dict) else None
+        if not isinstance(snapshots, dict):
+            raise ValueError("no snapshots in " + self.path)
+        for name, values in snapshots.items():
+            if isinstance(values, dict):
+                self.snapshots[name] = dict(values)
+
+    def save(self):
+        '''
+        Write the snapshots next to the script, the file is removed when
+        there is no snapshot left.
+
+        :raises: OSError if the file can't be written
+        '''
+        if self.path is None:
+            return
+        if not self.snapshots:
+            if os.path.isfile(self.path):
+                os.remove(self.path)
+            return
+        with open(self.path, 'w') as f:
+            json.dump({'snapshots': self.snapshots}, f, indent=2)
+            f.write('\n')
+
+    def add(self, name, values):
+        '''Add or replace a snapshot.'''
+        self.snapshots[name] = dict(values)
+
+    def remove(self, name):
+        self.snapshots.pop(name, None)
+
+    def record(self, values):
+        '''Put a set of values built at the top of the history.'''
+        values = dict(values)
+        self.history = [v for v in self.history if not same_values(v, values)]
+        self.history.insert(0, values)
+        del self.history[HISTORY_SIZE:]
+
+    def is_snapshot(self, values):
+        '''True if a snapshot has exactly these values.'''
+        return any(same_values(v, values) for v in self.snapshots.values())
@@ -0,0 +1,278 @@
+""" Typed store of the script variables shown by the Variables Editor """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# Nothing in this module depends on FreeCAD or Qt, the Qt model of the
+# Variables Editor applies the changes computed here to its rows.
+
+NUMBER = 'number'
+BOOL = 'bool'
+STRING = 'string'
+
+
+def value_kind(value):
+    '''Kind of a parameter from its default value, None if not editable.'''
+    # bool first, a bool is an int as well
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, (int, float)):
+        return NUMBER
+    if isinstance(value, str):
+        return STRING
+    return None
+
+
+def parse_value(kind, value):
+    '''
+    Convert a value entered by the user to the type of a parameter.
+
+    Numbers stay int when they are written as int, a script may need it.
+
+    :param kind: NUMBER, BOOL or STRING
+    :param value: the value, usually the text entered
+    :return: the typed value
+    :raises: ValueError if the value can't be converted
+    '''
+    if kind == NUMBER:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        text = str(value).strip()
+        try:
+            return int(text)
+        except ValueError:
+            return float(text)
+    if kind == BOOL:
+        if isinstance(value, str):
+            if value.strip().lower() in ('1', 'true', 'yes', 'on'):
+                return True
+            if value.strip().lower() in ('0', 'false', 'no', 'off'):
+                return False
+            raise ValueError("not a boolean: " + value)
+        return bool(value)
+    return str(value)
+
+
+class Store_Parameter(object):
+    '''
+    A variable of the script, with the value entered by the user.
+
+    A number variable given a min and a max by cqvar() is ranged, it is
+    edited with a slider of steps() positions.
+    '''
+
+    def __init__(self, name, kind, default, description=None, minimum=None, maximum=None, step=None):
+        self.name = name
+        self.kind = kind
+        self.default = default
+        self.value = default
+        self.description = description or ''
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+
+    @property
+    def edited(self):
+        return self.value != self.default or type(self.value) != type(self.default)
+
+    @property
+    def ranged(self):
+        return self.kind == NUMBER and self.minimum is not None and self.maximum is not None \
+                    and self.maximum > self.minimum
+
+    @property
+    def integer(self):
+        '''True if the values of the slider are int.'''
+        return all(isinstance(v, int) for v in (self.default, self.minimum, self.step or 1))
+
+    def steps(self):
+        '''Number of steps of the slider.'''
+        if self.step and self.step > 0:
+            step = self.step
+        elif self.integer:
+            step = max(1, int(round((self.maximum - self.minimum) / 100.0)))
+        else:
+            step = (self.maximum - self.minimum) / 100.0
+        return max(1, int(round((self.maximum - self.minimum) / step)))
+
+    def value_at(self, position):
+        '''Value of a slider position.'''
+        value = self.minimum + position * (self.maximum - self.minimum) / float(self.steps())
+        value = min(self.maximum, value)
+        return int(round(value)) if self.integer else round(value, 10)
+
+    def position_of(self, value):
+        '''Slider position of a value, clamped to the range.'''
+        position = (value - self.minimum) * self.steps() / float(self.maximum - self.minimum)
+        return min(self.steps(), max(0, int(round(position))))
+
+
+def runs(indexes):
+    '''Group sorted indexes into (first, last) runs of consecutive indexes.'''
+    result = []
+    for index in indexes:
+        if result and result[-1][1] == index - 1:
+            result[-1] = (result[-1][0], index)
+        else:
+            result.append((index, index))
+    return result
+
+
+class Parameter_Store(object):
+    '''
+    The variables of the script in the order of the script.
+
+    A new list of parameters is applied by primitive steps computed by diff():
+    remove(), insert() and merge(), so that a Qt model can wrap each of them
+    with its begin/end notifications and the view only updates the rows
+    which changed.
+    '''
+
+    def __init__(self):
+        self.parameters = []        # Store_Parameter in the order of the script
+        self.rows = {}              # name -> row
+
+    def __len__(self):
+        return len(self.parameters)
+
+    def _index(self):
+        self.rows = dict((p.name, row) for row, p in enumerate(self.parameters))
+
+    def clear(self):
+        self.parameters = []
+        self.rows = {}
+
+    def entries(self, parameters):
+        '''
+        Convert the cqgi parameters of a script.
+
+        :param parameters: dictionary name -> cqgi InputParameter, in the order of the script
+        :return: list of Store_Parameter, parameters of unknown type left out
+        '''
+        entries = []
+        for name, parameter in parameters.items():
+            kind = value_kind(parameter.default_value)
+            if kind is not None:
+                entries.append(Store_Parameter(name, kind, parameter.default_value,
+                                               getattr(parameter, 'desc', None),
+                                               getattr(parameter, 'minimum', None),
+                                               getattr(parameter, 'maximum', None),
+                                               getattr(parameter, 'step', None)))
+        return entries
+
+    def diff(self, entries):
+        '''
+        Rows to remove and to insert to go to a new list of parameters.
+
+        :param entries: the new list of Store_Parameter
+        :return: (removed runs, inserted runs) as (first, last) rows, removed
+                 runs in descending order, or None if the kept parameters
+                 changed order
+        '''
+        new_names = [entry.name for entry in entries]
+        new_set = set(new_names)
+        old_names = [p.name for p in self.parameters]
+        old_set = set(old_names)
+        if [n for n in old_names if n in new_set] != [n for n in new_names if n in old_set]:
+            return None
+        removed = runs([row for row, name in enumerate(old_names) if name not in new_set])
+        inserted = runs([row for row, name in enumerate(new_names) if name not in old_set])
+        return list(reversed(removed)), inserted
+
+    def remove(self, first, last):
+        del self.parameters[first:last + 1]
+        self._index()
+
+    def insert(self, row, entries):
+        self.parameters[row:row] = entries
+        self._index()
+
+    def reset(self, entries):
+        '''Replace all the parameters, the values entered are kept.'''
+        old = dict((p.name, p) for p in self.parameters)
+        self.parameters = []
+        for entry in entries:
+            if entry.name in old:
+                self.parameters.append(old[entry.name])
+                self._merge(old[entry.name], entry)
+            else:
+                self.parameters.append(entry)
+        self._index()
+
+    def merge(self, entries):
+        '''
+        Update the kept parameters from the new ones: default, description,
+        the value entered is kept unless the kind changed.
+
+        :param entries: the new list of Store_Parameter, same names as the store
+        :return: the rows changed
+        '''
+        changed = []
+        for entry in entries:
+            row = self.rows[entry.name]
+            if self._merge(self.parameters[row], entry):
+                changed.append(row)
+        return changed
+
+    def _merge(self, parameter, entry):
+        if parameter is entry:
+            return False
+        if parameter.kind != entry.kind:
+            parameter.kind = entry.kind
+            parameter.value = entry.value
+        elif not parameter.edited:
+            parameter.value = entry.default
+        changed = (parameter.default, parameter.description, parameter.minimum, parameter.maximum,
+                   parameter.step) != (entry.default, entry.description, entry.minimum,
+                                       entry.maximum, entry.step)
+        parameter.default = entry.default
+        parameter.description = entry.description
+        parameter.minimum = entry.minimum
+        parameter.maximum = entry.maximum
+        parameter.step = entry.step
+        return changed
+
+    def set_value(self, row, value):
+        '''
+        Set the value of a parameter.
+
+        :raises: ValueError if the value doesn't fit the kind of the parameter
+        '''
+        parameter = self.parameters[row]
+        parameter.value = parse_value(parameter.kind, value)
+
+    def apply_values(self, values):
+        '''
+        Set the values of a snapshot, names not in the store and values
+        which don't fit the kind of their parameter are left out.
+
+        :param values: dictionary name -> value
+        :return: the rows changed
+        '''
+        changed = []
+        for name, value in values.items():
+            row = self.rows.get(name)
+            if row is None:
+                continue
+            parameter = self.parameters[row]
+            try:
+                value = parse_value(parameter.kind, value)
+            except ValueError:
+                continue
+            if value != parameter.value or type(value) != type(parameter.value):
+                parameter.value = value
+                changed.append(row)
+        return changed
+
+    def reset_values(self):
+        '''Go back to the values of the script, return the rows changed.'''
+        changed = []
+        for row, parameter in enumerate(self.parameters):
+            if parameter.edited:
+                parameter.value = parameter.default
+                changed.append(row)
+        return changed
+
+    def build_parameters(self):
+        '''The typed values to build the script with, name -> value.'''
+        return dict((p.name, p.value) for p in self.parameters)
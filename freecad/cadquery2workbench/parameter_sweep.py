@@ -0,0 +1,271 @@
+""" Build a script across a grid of parameter values on a process pool """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# Nothing in this module depends on FreeCAD or Qt, the variants are built
+# by spawned python processes which only need to import cadquery
+import os
+import csv
+import itertools
+import multiprocessing
+
+import cadquery as cq
+
+from freecad.cadquery2workbench import cadquery_model
+from freecad.cadquery2workbench import cq_results
+
+
+# columns of the results table, followed by one column per swept parameter
+COLUMNS = ['index', 'success', 'buildTime', 'volume', 'area',
+           'xlen', 'ylen', 'zlen', 'exported', 'exception']
+
+# export type of cq.exporters.export for each export format
+EXPORT_TYPES = {'step': 'STEP', 'stl': 'STL'}
+
+
+def parse_values(text, default_value=None):
+    '''
+    Parse the values of a swept parameter.
+
+    'start:stop:step' is an inclusive range, anything else a comma separated list.
+    Values are converted to the type of the default value of the parameter,
+    except the values of an int parameter which are not integral, ie '0:1:0.25',
+    which are kept float. Repeated values are listed once.
+
+    :param text: the values as entered by the user, ie '2:6:1' or '2, 4, 8'
+    :param default_value: the default value of the parameter in the script
+    :return: the list of values
+    '''
+    text = text.strip()
+    if not text:
+        return []
+
+    convert = type(default_value) if type(default_value) in (int, float, bool) else number
+    if ':' in text:
+        parts = [float(p) for p in text.split(':')]
+        start, stop = parts[0], parts[1]
+        step = parts[2] if len(parts) > 2 else 1.0
+        if step == 0 or (stop - start) / step < 0:
+            raise ValueError("Invalid range: " + text)
+        count = int(round((stop - start) / step + 1e-9)) + 1
+        items = [round(start + i * step, 10) for i in range(count)]
+    else:
+        items = [item.strip() for item in text.split(',')]
+
+    values = []
+    for item in items:
+        if convert == bool:
+            value = item if isinstance(item, float) else item.lower() in ('1', 'true', 'yes')
+            value = bool(value)
+        elif convert == int:
+            value = float(item)
+            value = int(value) if value.is_integer() else value
+        else:
+            value = convert(item)
+        if not any(value == v and type(value) == type(v) for v in values):
+            values.append(value)
+    return values
+
+
+def number(text):
+    '''Keep the type of a value given as text: int, float or str.'''
+    if isinstance(text, float):
+        return int(text) if text.is_integer() else text
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        try:
+            return float(text)
+        except (TypeError, ValueError):
+            return text
+
+
+def combinations(ranges):
+    '''
+    Every combination of the swept parameters values.
+
+    :param ranges: dictionary parameter name -> list of values
+    :return: a list of build parameters dictionaries
+    '''
+    names = list(ranges)
+    return [dict(zip(names, values)) for values in itertools.product(*[ranges[n] for n in names])]
+
+
+def variant_shape(list_objects):
+    '''
+    Compound of all the shapes displayed by a build.
+
+    :param list_objects: a list of cq_results.Display_Object
+    :return: a cadquery Compound or None if nothing is displayed
+    '''
+    shapes = [cq_results.to_shape(obj.shape) for obj in list_objects]
+    if not shapes:
+        return None
+    return cq.Compound.makeCompound(shapes)
+
+
+def shape_metrics(shape):
+    '''
+    Volume, area and bounding box size of a shape.
+
+    :param shape: a cadquery Shape
+    :return: dictionary with volume, area, xlen, ylen and zlen
+    '''
+    bb = shape.BoundingBox()
+    return {'volume': shape.Volume(), 'area': shape.Area(),
+            'xlen': bb.xlen, 'ylen': bb.ylen, 'zlen': bb.zlen}
+
+
+def variant_name(script_name, index, parameters):
+    '''File name of an exported variant, without extension.'''
+    name = script_name + "_" + str(index)
+    for key, value in parameters.items():
+        name += "_{0}={1}".format(key, value)
+    return "".join(ch if ch.isalnum() or ch in '_-=.' else '_' for ch in name)
+
+
+def build_variant(task):
+    '''
+    Build one variant, this runs in the pool processes.
+
+    :param task: (index, source, parameters, export_dir, script_name, formats)
+    :return: a row of the results table as a dictionary
+    '''
+    index, source, parameters, export_dir, script_name, formats = task
+    row = dict(parameters)
+    row.update({'index': index, 'success': False, 'buildTime': None, 'volume': None,
+                'area': None, 'xlen': None, 'ylen': None, 'zlen': None,
+                'exported': '', 'exception': ''})
+    try:
+        build_result = cadquery_model.parse(source).build(build_parameters=parameters)
+        row['buildTime'] = build_result.buildTime
+        if not build_result.success:
+            row['exception'] = str(build_result.exception)
+            return row
+
+        shape = variant_shape(cq_results.list_build_objects(build_result))
+        if shape is not None:
+            row.update(shape_metrics(shape))
+
+            exported = []
+            # the exporters fail silently when the directory doesn't exist
+            if formats:
+                os.makedirs(export_dir, exist_ok=True)
+            for fmt in formats:
+                path = os.path.join(export_dir, variant_name(script_name, index, parameters) + "." + fmt)
+                cq.exporters.export(shape, path, exportType=EXPORT_TYPES[fmt])
+                exported.append(os.path.basename(path))
+            row['exported'] = " ".join(exported)
+        row['success'] = True
+
+    except Exception as ex:
+        row['exception'] = str(ex)
+    return row
+
+
+class Sweep(object):
+    '''
+    Build a script for each combination of parameter values on a process pool.
+
+    The processes are spawned, so that no FreeCAD state is inherited,
+    using python, which must be able to import cadquery.
+    Rows are written to the CSV file as soon as their variant is built.
+    '''
+
+    def __init__(self, source, ranges, csv_path, export_dir=None, formats=(),
+                 processes=None, python=None):
+        '''
+        :param source: the script source
+        :param ranges: dictionary parameter name -> list of values
+        :param csv_path: path of the results table
+        :param export_dir: directory of the exported variants, by default the one of the CSV file
+        :param formats: extensions of the export formats, ie ('step', 'stl')
+        :param processes: number of processes, by default the number of cores
+        :param python: interpreter of the pool processes, by default sys.executable
+        '''
+        self.source = source
+        self.tasks = []
+        self.names = list(ranges)
+        self.csv_path = csv_path
+        self.rows = []
+
+        export_dir = export_dir or os.path.dirname(os.path.abspath(csv_path))
+        script_name = os.path.splitext(os.path.basename(csv_path))[0]
+        for index, parameters in enumerate(combinations(ranges)):
+            self.tasks.append((index, source, parameters, export_dir, script_name,
+                               tuple(formats)))
+
+        self.processes = min(processes or os.cpu_count() or 1, max(1, len(self.tasks)))
+        self.python = python
+        self.pool = None
+        self.file = None
+        self.writer = None
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def start(self):
+        '''Start the pool, rows are returned by next_row() as the variants are built.'''
+        context = multiprocessing.get_context('spawn')
+        if self.python:
+            context.set_executable(self.python)
+
+        self.file = open(self.csv_path, 'w', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=COLUMNS[:1] + self.names + COLUMNS[1:])
+        self.writer.writeheader()
+
+        self.pool = context.Pool(self.processes)
+        # one variant at a time per process, builds last long enough
+        self.results = self.pool.imap_unordered(build_variant, self.tasks, chunksize=1)
+        self.pool.close()
+
+    def next_row(self, timeout=None):
+        '''
+        Wait for the next variant to be built.
+
+        :param timeout: seconds to wait, None to wait until it is built
+        :return: the row, or None if the sweep is done
+        :raises: multiprocessing.TimeoutError if no variant was built within timeout
+        '''
+        try:
+            row = self.results.next(timeout)
+        except StopIteration:
+            self.finish()
+            return None
+        self.rows.append(row)
+        self.writer.writerow(row)
+        self.file.flush()
+        return row
+
+    def run(self):
+        '''Run the whole sweep, blocking.'''
+        self.start()
+        while self.next_row() is not None:
+            pass
+        return sorted(self.rows, key=lambda row: row['index'])
+
+    def finish(self):
+        if self.pool is not None:
+            self.pool.join()
+            self.pool = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def terminate(self):
+        '''Stop the sweep, the variants not yet built are dropped.'''
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.finish()
+
+
+def run_sweep(source, ranges, csv_path, **kwargs):
+    '''
+    Build a script for each combination of parameter values, see Sweep.
+
+    :return: the rows of the results table, ordered by index
+    '''
+    return Sweep(source, ranges, csv_path, **kwargs).run()
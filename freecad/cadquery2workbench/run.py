@@ -0,0 +1,194 @@
+""" Build a CQGI script from the command line, outside FreeCAD
+
+    python -m freecad.cadquery2workbench.run script.py --param w=10 --out part.step
+
+The objects shown by the script are exported to BREP, STEP or STL, by
+extension of --out. A path containing {name} exports one file per object,
+otherwise all the objects are exported together as a compound.
+A JSON summary of the build, timings and shape metrics is printed on stdout.
+"""
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+import os
+import sys
+import json
+import time
+import argparse
+from contextlib import redirect_stdout
+
+import cadquery as cq
+
+from freecad.cadquery2workbench import cadquery_model
+from freecad.cadquery2workbench import cq_results
+from freecad.cadquery2workbench import parameter_sweep
+
+EXPORT_FORMATS = ('brep', 'step', 'stp', 'stl')
+
+# export type of cq.exporters.export, which doesn't know the .stp extension
+EXPORT_TYPES = {'step': 'STEP', 'stp': 'STEP', 'stl': 'STL'}
+
+
+def parse_parameters(items, script_parameters):
+    '''
+    Parse the --param NAME=VALUE arguments.
+
+    Values are converted to the type of the default value in the script.
+
+    :param items: list of 'NAME=VALUE' strings
+    :param script_parameters: the parameters found in the script, name -> InputParameter
+    :return: the build parameters dictionary
+    :raises: ValueError if an argument isn't NAME=VALUE or the name isn't a script variable
+    '''
+    build_parameters = {}
+    for item in items:
+        if '=' not in item:
+            raise ValueError("Parameter must be given as NAME=VALUE: " + item)
+        name, text = item.split('=', 1)
+        name = name.strip()
+        if name not in script_parameters:
+            raise ValueError("Unknown script variable: {0}, variables are: {1}" \
+                                .format(name, ", ".join(script_parameters) or "none"))
+        values = parameter_sweep.parse_values(text, script_parameters[name].default_value)
+        if len(values) != 1:
+            raise ValueError("A single value is expected for " + name)
+        build_parameters[name] = values[0]
+    return build_parameters
+
+
+def export_shape(shape, path):
+    '''
+    Export a cadquery Shape, the format is given by the extension of path.
+
+    :param shape: a cadquery Shape
+    :param path: the file path, ie part.step
+    '''
+    ext = os.path.splitext(path)[1][1:].lower()
+    if ext not in EXPORT_FORMATS:
+        raise ValueError("Unsupported export format: " + path)
+    # the exporters fail silently when the directory doesn't exist
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if ext == 'brep':
+        shape.exportBrep(path)
+    else:
+        cq.exporters.export(shape, path, exportType=EXPORT_TYPES[ext])
+
+
+def export_objects(list_objects, paths):
+    '''
+    Export the objects of a build.
+
+    :param list_objects: a list of cq_results.Display_Object
+    :param paths: output paths, a path containing {name} gives one file per object,
+                  an Assembly giving one file per part
+    :return: the list of files written
+    '''
+    written = []
+    for path in paths:
+        if '{name}' in path:
+            names = set()
+            for obj in cq_results.append_assembly_parts(list_objects):
+                name = "".join(ch if ch.isalnum() or ch in '_-.' else '_' for ch in str(obj.name))
+                # parts of different sub-assemblies may have the same name
+                unique, count = name, 1
+                while unique in names:
+                    count += 1
+                    unique = "{0}_{1}".format(name, count)
+                names.add(unique)
+                filename = path.format(name=unique)
+                export_shape(cq_results.placed_shape(obj), filename)
+                written.append(filename)
+        else:
+            export_shape(parameter_sweep.variant_shape(list_objects), path)
+            written.append(path)
+    return written
+
+
+def object_summary(obj):
+    '''Name, group, color and metrics of an object of the build.'''
+    summary = {'name': obj.name, 'group': obj.group, 'rgba': list(obj.rgba)}
+    summary.update(parameter_sweep.shape_metrics(cq_results.to_shape(obj.shape)))
+    return summary
+
+
+def run(script, parameters=(), outputs=(), show_debug=False):
+    '''
+    Build a script and export its objects.
+
+    :param script: path of the CQGI script
+    :param parameters: list of 'NAME=VALUE' strings
+    :param outputs: list of output paths
+    :param show_debug: if True the debug() objects are exported as well
+    :return: the summary dictionary
+    '''
+    start = time.perf_counter()
+    summary = {'script': os.path.abspath(script), 'success': False, 'exception': None,
+               'parameters': {}, 'objects': [], 'outputs': [], 'times': {}}
+    times = summary['times']
+
+    with open(script) as f:
+        source = f.read()
+
+    # parse
+    t = time.perf_counter()
+    cqModel = cadquery_model.CQ_Model(source)
+    build_parameters = parse_parameters(parameters, cqModel.metadata.parameters)
+    summary['parameters'] = build_parameters
+    times['parse'] = time.perf_counter() - t
+
+    # build, anything printed by the script goes to stderr to keep stdout for the summary
+    t = time.perf_counter()
+    with redirect_stdout(sys.stderr):
+        build_result = cqModel.build(build_parameters=build_parameters)
+    times['build'] = time.perf_counter() - t
+
+    if not build_result.success:
+        summary['exception'] = str(build_result.exception)
+        times['total'] = time.perf_counter() - start
+        return summary
+
+    list_objects = cq_results.list_build_objects(build_result, show_debug)
+
+    # export
+    t = time.perf_counter()
+    if outputs:
+        summary['outputs'] = export_objects(list_objects, outputs)
+    times['export'] = time.perf_counter() - t
+
+    summary['objects'] = [object_summary(obj) for obj in list_objects]
+    summary['success'] = True
+    times['total'] = time.perf_counter() - start
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m freecad.cadquery2workbench.run",
+                                     description="Build a CQGI script outside FreeCAD and export its objects.")
+    parser.add_argument('script', help="the CQGI script")
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE',
+                        help="override a script variable, may be repeated")
+    parser.add_argument('--out', action='append', default=[], metavar='PATH',
+                        help="export to .brep, .step or .stl, {name} in the path gives one file per object, may be repeated")
+    parser.add_argument('--debug', action='store_true', help="export the debug() objects as well")
+    args = parser.parse_args()
+
+    for path in args.out:
+        if os.path.splitext(path)[1][1:].lower() not in EXPORT_FORMATS:
+            parser.error("unsupported export format: " + path)
+
+    try:
+        summary = run(args.script, args.param, args.out, args.debug)
+    except (OSError, ValueError, SyntaxError) as ex:
+        parser.exit(2, "error: {0}\n".format(ex))
+
+    json.dump(summary, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+    if not summary['success']:
+        sys.stderr.write("Error executing CQGI-compliant script. " + summary['exception'] + "\n")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+""" Static checks of a CQGI script, made without executing it """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# Nothing in this module depends on FreeCAD, Qt or cadquery, the checks take
+# milliseconds whatever the time the script takes to build.
+import ast
+import builtins
+import symtable
+
+# functions given to the scripts by the CQGI environment
+OUTPUT_FUNCTIONS = ('show_object', 'debug')
+CQGI_NAMES = ('cq', 'cadquery', 'show_object', 'debug', 'describe_parameter',
+              '__name__', '__builtins__')
+
+
+class Script_Check(object):
+    '''
+    Result of check_script().
+
+    syntax_error is the SyntaxError of a script that doesn't compile, the
+    other attributes are then empty.
+    '''
+
+    def __init__(self):
+        self.syntax_error = None    # SyntaxError or None
+        self.tree = None            # the script AST
+        self.outputs = []           # line numbers of the show_object() and debug() calls
+        self.undefined = []         # (line number, name) of the names never defined
+
+
+def output_calls(tree):
+    '''
+    Find the calls of show_object() and debug().
+
+    :param tree: the script AST
+    :return: the sorted line numbers of the calls
+    '''
+    lines = [node.lineno for node in ast.walk(tree)
+             if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+             and node.func.id in OUTPUT_FUNCTIONS]
+    return sorted(lines)
+
+
+def may_have_parameters(tree):
+    '''
+    If a script may have variables: an assignment of a constant, a tuple or a
+    cqvar() call. Only cqgi finds them, and it needs cadquery.
+
+    :param tree: the script AST
+    '''
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Assign):
+            continue
+        value = node.value
+        if isinstance(value, (ast.Constant, ast.Tuple)):
+            return True
+        if isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id == 'cqvar':
+            return True
+    return False
+
+
+def undefined_names(source, tree, known=CQGI_NAMES):
+    '''
+    Find the global names used by a script and defined nowhere: not assigned,
+    imported or declared at the top level, nor by a function, not builtin.
+
+    A name defined after its use is not reported, the order of execution is
+    not followed. Nothing is reported for a script with a star import.
+
+    :param source: the script source
+    :param tree: the script AST
+    :param known: names defined by the environment
+    :return: list of (line number, name) sorted by line
+    '''
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and any(alias.name == '*' for alias in node.names):
+            return []
+
+    defined = set(known) | set(dir(builtins))
+    used = set()
+
+    def visit(table, top):
+        for symbol in table.get_symbols():
+            name = symbol.get_name()
+            if top:
+                if symbol.is_assigned() or symbol.is_imported() or symbol.is_namespace():
+                    defined.add(name)
+                if symbol.is_referenced():
+                    used.add(name)
+            else:
+                # global statement in a function
+                if symbol.is_declared_global() and symbol.is_assigned():
+                    defined.add(name)
+                if symbol.is_global() and symbol.is_referenced():
+                    used.add(name)
+        for child in table.get_children():
+            visit(child, False)
+
+    visit(symtable.symtable(source, '<script>', 'exec'), True)
+    undefined = used - defined
+    if not undefined:
+        return []
+
+    # first use of each name
+    first = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in undefined and isinstance(node.ctx, ast.Load):
+            if node.id not in first or node.lineno < first[node.id]:
+                first[node.id] = node.lineno
+    return sorted((lineno, name) for name, lineno in first.items())
+
+
+def check_script(source, undefined=True):
+    '''
+    Check a script: syntax, output calls and optionally undefined names.
+
+    :param source: the script source, as str or bytes
+    :param undefined: if True the undefined names are looked for
+    :return: a Script_Check
+    '''
+    if isinstance(source, bytes):
+        source = source.decode('utf-8')
+    check = Script_Check()
+    try:
+        check.tree = ast.parse(source)
+        # some errors are only raised by the compiler, ie 'return' outside function
+        compile(check.tree, '<script>', 'exec')
+        if undefined:
+            check.undefined = undefined_names(source, check.tree)
+    except (SyntaxError, ValueError) as ex:
+        check.syntax_error = ex if isinstance(ex, SyntaxError) else SyntaxError(str(ex))
+        check.tree = None
+        check.undefined = []
+        return check
+    check.outputs = output_calls(check.tree)
+    return check
+
+
+def format_syntax_error(error):
+    '''One line description of a SyntaxError.'''
+    if error.lineno:
+        return "Syntax error line {0}: {1}".format(error.lineno, error.msg)
+    return "Syntax error: {0}".format(error.msg or error)
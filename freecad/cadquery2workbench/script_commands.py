@@ -3,24 +3,51 @@
 # Fork of freecad-cadquery-module made for cadquery1.0 by
 # (c) 2014-2018 Jeremy Wright Apache 2.0 License
 import os
-import pathlib
+import time
+import cProfile
+import tempfile
 import math as m
-from random import random
 
 import FreeCAD as App
 import FreeCADGui as Gui
-import Part
 
-from PySide2.QtCore import QFileInfo, QTimer, QObject
-from PySide2.QtWidgets import QMessageBox, QFileDialog, QLineEdit
+from PySide2.QtCore import QFileInfo, QTimer, QObject, Signal
+from PySide2.QtWidgets import QMessageBox, QFileDialog
 
 from freecad.cadquery2workbench import MODULENAME
 from freecad.cadquery2workbench import shared
-from freecad.cadquery2workbench import cadquery_model
+from freecad.cadquery2workbench import cadquery_loader
+from freecad.cadquery2workbench import build_client
+from freecad.cadquery2workbench import document_sync
+from freecad.cadquery2workbench import build_cache
+from freecad.cadquery2workbench import build_scheduler
+from freecad.cadquery2workbench import build_prefetcher
+from freecad.cadquery2workbench import parameter_snapshots
+from freecad.cadquery2workbench import tracing
+from freecad.cadquery2workbench import operationsdialog
+from freecad.cadquery2workbench import build_profile
+from freecad.cadquery2workbench import script_checks
+
+
+NO_OUTPUT_MESSAGE = "Script did not call show_object or debug, no output available. Script must be CQGI compliant to get build output, variable editing and validation.\r\n"
+
+
+class Part_Name_Observer(object):
+    '''Print the name of the object merged in a compound when one of its faces is selected.'''
+    
+    def addSelection(self, doc, obj, sub, pnt):
+        if not sub.startswith('Face') or not sub[4:].isdigit():
+            return
+        feature = App.getDocument(doc).getObject(obj)
+        name = document_sync.part_name(feature, int(sub[4:]) - 1)
+        if name is not None:
+            App.Console.PrintMessage("{0} of {1}: {2}\r\n".format(sub, feature.Label, name))
 
-import cadquery as cq
 
 class Script_Commands(QObject):
+    # emitted by the warm-up thread, with the exception raised or None
+    warmed_up = Signal(object)
+    
     def __init__(self, parent):
         QObject.__init__(self, parent)
         self.parent = parent
@@ -33,6 +60,48 @@ class Script_Commands(QObject):
         self.activity_timer = QTimer()
         self.activity_timer.timeout.connect(self.changed_on_disk)
         
+        # Worker process running the builds
+        self.worker = build_client.Build_Client(self)
+        self.worker.finished.connect(self.on_build_finished)
+        self.build_actions = {}     # (action, cache key, source) of each build sent to the worker
+        self.traces = {}            # tracing.Tracer of each traced build sent to the worker
+        self.operations_dialog = None
+        self.cprofile_next = False  # profile the next build with cProfile
+        
+        # Every build is requested through the scheduler
+        self.scheduler = build_scheduler.Build_Scheduler(self)
+        self.worker.finished.connect(self.scheduler.on_build_finished)
+        
+        # Statements executed by the previous in-process build
+        self.incremental_state = None
+        
+        # Tessellated shapes of the previous in-process builds, created once cadquery is loaded
+        self.mesh_cache = None
+        
+        # cadquery is imported at the first build, or by the warm-up
+        self.warmed_up.connect(self.report_warm_up)
+        self.cadquery_reported = False
+        self.pending_validation = None  # (source, Script_Check, start) of a validation waiting for cadquery
+        
+        # Objects of the previous builds
+        self.build_cache = build_cache.Build_Cache(256 * 1024 * 1024)
+        
+        # Named sets of variable values saved with the script, and the values built lately
+        # the builds of the snapshots are retained in their own cache
+        self.snapshots = parameter_snapshots.Parameter_Snapshots()
+        self.variant_keys = set()   # cache keys of the builds of the snapshots
+        self.variant_cache = build_cache.Build_Cache(128 * 1024 * 1024)
+        
+        # Neighbouring values of the variable being tuned, built in the background
+        self.prefetcher = build_prefetcher.Build_Prefetcher(self)
+        self.prefetcher.built.connect(self.on_prefetched)
+        self.awaited = None         # (cache key, action) of a build left to the prefetcher
+        
+        # Objects of the 3D view, updated in place from one build to the next
+        self.document_sync = document_sync.Document_Sync()
+        self.part_name_observer = Part_Name_Observer()
+        Gui.Selection.addObserver(self.part_name_observer)
+        
     # open a file
     def open_file(self, filename=None):
         # Before open, check if file exist
@@ -40,6 +109,7 @@ class Script_Commands(QObject):
             # OK so we can open the File
             with open(filename) as f: self.file_contents = f.read()
             self.parent.editor.setPlainText(self.file_contents)
+            self.load_snapshots(filename)
             
             # Watch the file we've opened
             fi = QFileInfo(filename)
@@ -92,7 +162,7 @@ class Script_Commands(QObject):
                     # Execute the script if the user has asked for it
                     if App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME) \
                                 .GetBool("executeOnSave"):
-                        self.execute(action='Rebuild')
+                        self.scheduler.request(action='Rebuild')
                     return
                     
             else:
@@ -100,7 +170,7 @@ class Script_Commands(QObject):
                 # Execute the script if the user has asked for it
                 if App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME) \
                             .GetBool("executeOnSave"):
-                    self.execute(action='Rebuild')
+                    self.scheduler.request(action='Rebuild')
                 return
                 
         self.activity_timer.setSingleShot(True)
@@ -131,9 +201,7 @@ class Script_Commands(QObject):
             filename = self.parent.filename
             
         # If the code pane doesn't have a filename, we need to present the save as dialog
-        if len(filename) == 0 \
-                or os.path.basename(filename) == 'script_template.py' \
-                or os.path.split(filename)[0].endswith('FreeCAD'):
+        if not self.is_writable(filename):
             App.Console.PrintWarning("You cannot save over a blank file, example file or template file.\r\n")
             return self.saveAs()
             
@@ -153,6 +221,12 @@ class Script_Commands(QObject):
         self.parent.ismodifed()
         return filename
         
+    # The templates and the examples are not saved over
+    def is_writable(self, filename):
+        return len(filename) > 0 \
+                and os.path.basename(filename) != 'script_template.py' \
+                and not os.path.split(filename)[0].endswith('FreeCAD')
+    
     # Save As method
     def saveAs(self):
         fileDlg = QFileDialog.getSaveFileName(self.parent.mw,
@@ -186,337 +260,489 @@ class Script_Commands(QObject):
                 self.parent.editor.document().setModified(False)
                 self.parent.ismodifed()
                 self.parent.setWindowTitle(self.parent.objectName() + " - " + os.path.basename(filename))
+                
+                # the snapshots follow the script
+                self.snapshots.path = parameter_snapshots.sidecar_path(filename)
+                if self.snapshots.snapshots:
+                    self.save_snapshots()
                 return filename
             
         return False
     
+    # Read the snapshots saved with a script
+    def load_snapshots(self, filename):
+        self.variant_keys.clear()
+        self.variant_cache.clear()
+        try:
+            self.snapshots.load(filename if self.is_writable(filename) else None)
+        except (OSError, ValueError) as ex:
+            # don't write over a file which couldn't be read
+            self.snapshots.path = None
+            App.Console.PrintWarning("Unable to read the snapshots of the script: " + str(ex) + "\r\n")
+        self.parent.cqvarseditor.refresh_snapshots()
+    
+    # Write the snapshots next to the script
+    def save_snapshots(self):
+        if self.snapshots.path is None:
+            App.Console.PrintWarning("Save the script under a new name to keep its snapshots\r\n")
+            return
+        try:
+            self.snapshots.save()
+        except OSError as ex:
+            App.Console.PrintError("Unable to save the snapshots: " + str(ex) + "\r\n")
+    
+    # Save the values of the Variables Editor as a snapshot
+    def add_snapshot(self, name):
+        values = self.parent.cqvarseditor.build_parameters()
+        self.snapshots.add(name, values)
+        self.save_snapshots()
+        self.parent.cqvarseditor.refresh_snapshots()
+        
+        # keep the objects displayed, if built with these values
+        if not cadquery_loader.is_loaded():
+            return
+        from freecad.cadquery2workbench import cadquery_model
+        try:
+            cqModel = cadquery_model.parse(self.parent.editor.toPlainText().encode('utf-8'))
+        except (SyntaxError, ValueError):
+            return
+        cache_key = build_cache.cache_key(cqModel.ast_tree, values, self.parent.show_debug,
+                                          self.mesh_quality())
+        self.variant_keys.add(cache_key)
+        if cache_key in self.build_cache:
+            self.variant_cache.put(cache_key, self.build_cache.get(cache_key))
+    
+    def remove_snapshot(self, name):
+        self.snapshots.remove(name)
+        self.save_snapshots()
+        self.parent.cqvarseditor.refresh_snapshots()
+    
     # command to validate or execute or rebuild a script file
     def execute(self, action='Execute'):
+        # a newer request, the build awaited from the prefetcher is outdated
+        self.awaited = None
+        
+        # Validate doesn't build the script
+        if action == 'Validate':
+            self.validate()
+            return
+        
+        # time the phases of the build
+        param = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME)
+        tracer = tracing.Tracer() if param.GetBool("traceBuilds", False) else None
+        tracing.active = tracer
+        try:
+            with tracing.span('execute', action=action):
+                request_id = self.build(action)
+        finally:
+            tracing.active = None
+        
+        if tracer is not None:
+            # the build goes on in the worker, the trace is reported by on_build_finished
+            if request_id is not None:
+                self.traces[request_id] = tracer
+            else:
+                self.report_trace(tracer)
+    
+    # check a script without running it, and update the variables editor
+    def validate(self):
+        start = time.perf_counter()
         scriptText = self.parent.editor.toPlainText().encode('utf-8')
+        param = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME)
+        check = script_checks.check_script(scriptText, param.GetBool("checkUndefinedNames", True))
         
-        if (b"show_object(" not in scriptText) and  (b"debug(" not in scriptText):
-            App.Console.PrintError("Script did not call show_object or debug, no output available. Script must be CQGI compliant to get build output, variable editing and validation.\r\n")
+        # clean the 3D view if exist (user may have closed the view3D)
+        self.show_build_objects([], 'Validate')
+        
+        if check.syntax_error is not None:
+            App.Console.PrintError(script_checks.format_syntax_error(check.syntax_error) + "\r\n")
+            return
+        if not check.outputs:
+            App.Console.PrintError(NO_OUTPUT_MESSAGE)
+        for lineno, name in check.undefined:
+            App.Console.PrintWarning("Line {0}: name '{1}' is not defined\r\n".format(lineno, name))
+        
+        # the variables are found by cqgi, cadquery isn't imported by the GUI thread
+        if not script_checks.may_have_parameters(check.tree):
+            self.validate_parameters(None, check, start)
+        elif cadquery_loader.is_loaded():
+            self.validate_parameters(scriptText, check, start)
+        else:
+            self.pending_validation = (scriptText, check, start)
+            self.warm_up(requested=True)
+    
+    # update the variables editor, the values entered by the user are kept
+    def validate_parameters(self, scriptText, check, start):
+        parameters = {}
+        if scriptText is not None:
+            from freecad.cadquery2workbench import cadquery_model
+            parameters = cadquery_model.parse(scriptText).metadata.parameters
+        self.parent.cqvarseditor.populateParameterEditor(parameters)
+        
+        App.Console.PrintMessage("Script validated in {0:.1f} ms: {1} variables, {2} outputs, {3} undefined names\r\n" \
+                                    .format((time.perf_counter() - start) * 1000.0, len(parameters),
+                                            len(check.outputs), len(check.undefined)))
+    
+    # build a script, return the id of the request if the build is sent to the worker
+    def build(self, action):
+        scriptText = self.parent.editor.toPlainText().encode('utf-8')
+        
+        with tracing.span('check'):
+            check = script_checks.check_script(scriptText, undefined=False)
+        if check.syntax_error is not None:
+            App.Console.PrintError(script_checks.format_syntax_error(check.syntax_error) + "\r\n")
+            return
+        if not check.outputs:
+            App.Console.PrintError(NO_OUTPUT_MESSAGE)
             return
         
+        # cadquery is not imported at FreeCAD startup
+        if not cadquery_loader.is_loaded():
+            with tracing.span('import cadquery'):
+                cadquery_loader.load()
+            self.report_cadquery_load()
+        from freecad.cadquery2workbench import cadquery_model
+        from freecad.cadquery2workbench import cq_results
+        from freecad.cadquery2workbench import script_profiler
+        from freecad.cadquery2workbench import operation_timer
+        
         # A repreentation of the CQ script with all the metadata attached
-        cqModel = cadquery_model.CQ_Model(scriptText)       # cqgi.parse(scriptText)
+        with tracing.span('parse'):
+            cqModel = cadquery_model.parse(scriptText)          # cqgi.parse(scriptText)
         
         # Allows us to present parameters to users later that they can alter
         parameters = cqModel.metadata.parameters
         
-        # If paramEditor not yet build or execute with rebuild argument
-        if (not self.parent.cqvarseditor.haveParameters) or action=='Rebuild':
-            self.parent.cqvarseditor.clearParameters()
-            self.parent.cqvarseditor.populateParameterEditor(parameters)
+        # Update the Variables Editor, the values entered by the user are kept
+        self.parent.cqvarseditor.populateParameterEditor(parameters)
         
-        # Build cq object
-        build_parameters = {}
+        # Typed values of the variables from the Variables Editor
+        build_parameters = self.parent.cqvarseditor.build_parameters()
         
-        # Get the variables from the paramEditor
-        dockWidget = self.parent.cqvarseditor
-        valueControls = dockWidget.findChildren(QLineEdit)
-        for valueControl in valueControls:
-            objectName = valueControl.objectName()
-            
-            # We only want text fields that will have parameter values in them
-            if objectName != None and objectName != '' and objectName.find('pcontrol_') >= 0:
-                # when doing Execute or Validate, it doesn't rebuild the cqvarseditor
-                # however user may have remove a variable in the script
-                # so import only variable if they are in the script, ie in parameters
-                if objectName.split('pcontrol_')[1] in parameters:
-                    # Associate the value in the text field with the variable name in the script
-                    # As we pass the parameters through a QLineEdit as a String we loose the type
-                    # Then it is convert to a float
-                    # However sometimes a value must stay as an int for the script to work properly
-                    # Let's try to force the right type
-                    val = valueControl.text()
-                    try:
-                        valtype = int(val)
-                    except:
-                        try:
-                            valtype = float(val)
-                        except:
-                            valtype = val
-                    build_parameters[objectName.replace('pcontrol_', '')] = valtype
-        
-        build_result = cqModel.build(build_parameters=build_parameters)
-        list_objects = []
+        # Same script and parameters already built, reuse its objects
+        # unless the lines of the script or its operations are to be timed
+        param = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME)
+        # previews are built while a variable is dragged, they are not timed
+        preview = action == 'Preview'
+        profile = self.parent.profile_script and not preview
+        operations = self.parent.time_operations and not preview
+        cprofile = self.cprofile_next and not preview
+        if not preview:
+            self.cprofile_next = False
+            self.prefetcher.note_build(scriptText, build_parameters, self.parent.show_debug)
+            if build_parameters:
+                self.snapshots.record(build_parameters)
+                self.parent.cqvarseditor.refresh_snapshots()
+        timed = profile or operations or cprofile
+        cache_key = None
+        if param.GetBool("useBuildCache", True) and not timed:
+            self.build_cache.max_bytes = param.GetInt("buildCacheSize", 256) * 1024 * 1024
+            self.variant_cache.max_bytes = param.GetInt("snapshotCacheSize", 128) * 1024 * 1024
+            cache_key = build_cache.cache_key(cqModel.ast_tree, build_parameters, self.parent.show_debug,
+                                              self.mesh_quality(preview))
+            if self.snapshots.is_snapshot(build_parameters):
+                self.variant_keys.add(cache_key)
+            list_objects = self.build_cache.get(cache_key)
+            if list_objects is None and cache_key in self.variant_cache:
+                list_objects = self.variant_cache.get(cache_key)
+            if list_objects is not None:
+                if cache_key in self.variant_keys:
+                    self.variant_cache.put(cache_key, list_objects)
+                App.Console.PrintMessage("Build cache hit (" + self.build_cache.stats() + ")\r\n")
+                self.show_build_objects(list_objects, action)
+                return
+            # already being built by the prefetcher, shown by on_prefetched
+            if self.prefetcher.in_flight(cache_key):
+                self.awaited = (cache_key, action)
+                return
+        
+        # Re-execute only the statements changed since previous build
+        incremental = param.GetBool("incrementalBuild", False) and not timed
+        
+        # Build in the worker process, the result is displayed by on_build_finished
+        if param.GetBool("useBuildWorker", True):
+            request_id = self.worker.build(scriptText, build_parameters, self.parent.show_debug,
+                                           incremental, profile, operations, cprofile,
+                                           tracing.active is not None, self.mesh_quality(preview))
+            if request_id is not None:
+                self.build_actions[request_id] = (action, cache_key, scriptText)
+                self.parent.cancelAct.setEnabled(True)
+                return request_id
+            App.Console.PrintWarning("Build worker not available, execute the script inside FreeCAD\r\n")
+        
+        build_options = {}
+        if self.incremental_state is None:
+            self.incremental_state = cadquery_model.Incremental_State()
+        if incremental:
+            build_options['incremental'] = self.incremental_state
+        else:
+            self.incremental_state.clear()
+        if profile:
+            build_options['profile'] = script_profiler.Line_Profiler()
+        if operations:
+            build_options['operations'] = operation_timer.Operation_Timer()
+        if cprofile:
+            build_options['cprofile'] = cProfile.Profile()
+        build_result = cqModel.build(build_parameters=build_parameters, build_options=build_options)
+        self.report_incremental(build_result.incremental)
+        self.report_profile(build_result.line_profile, build_result.buildTime, scriptText)
+        self.report_operations(build_result.operations, build_result.buildTime)
+        self.report_cprofile(build_result.cprofile)
 
         # if Settings.report_execute_time:
         #     App.Console.PrintMessage("Script executed in " + str(build_result.buildTime) + " seconds\r\n")
 
         # Make sure that the build was successful
         if build_result.success:
-            # Clean the 3D view if exist (user may have closed the view3D)
-            try:
-                if self.parent.view3DApp != None:
-                    shared.clearActive3DView(self.parent.view3DApp)
-            except:
-                pass
-                
-            # Display all the results that the user requested
-            for result in build_result.results:
-                # Apply options to the show function if any were provided
-                name = "Shape_" + str(random())
-                group = None
-                rgba = (204, 204, 204, 0.0)
-                if result.options :
-                    # parse the options
-                    # object name
-                    name = result.options['name'] \
-                                if 'name' in result.options \
-                                else name
-                    
-                    # object group
-                    group = result.options['group'] \
-                                if 'group' in result.options else group
-                            
-                    # object color
-                    # if rgba is defined it superseed any colors or alpha options
-                    if 'rgba' in result.options:
-                        rgba= result.options['rgba']
-                        # rgba provided as a String '#RRGGBB'or '#RRGGBBAA'
-                        if type(rgba) == str:
-                            rgba = rgba[1:] # remove first char '#'
-                            red = int(rgba[0]+rgba[1], 16)
-                            green = int(rgba[2]+rgba[3], 16)
-                            blue = int(rgba[4]+rgba[5], 16)
-                            if len(rgba) > 6:
-                                alpha = int(rgba[6]+rgba[7], 16) / 255.0
-                            else:
-                                alpha = 0.0
-                            rgba = (red, green, blue, alpha)
-                        # rgba defined as CadQuery Color class
-                        elif type(rgba) == cq.Color:
-                            r, g, b, a = rgba.toTuple()
-                            r *= 255
-                            g *= 255
-                            b *= 255
-                            a = 1 - a
-                            rgba = (r, g, b, a)
-                        else:
-                            # rgba is supposed to be a list (red, green, blue, alpha)
-                            pass
-                    else:
-                        # rgba is not defined check for color and alpha
-                        color = result.options['color'] if 'color' in result.options else (204, 204, 204)
-                        alpha = result.options['alpha'] if 'alpha' in result.options else 0.0
-                        rgba = (color[0], color[1], color[2], alpha)
-                        
-                # append object to the list of objects
-                list_objects.append((result.shape, rgba, name, group))
-                
-            # if user choose to show render objects
-            if self.parent.show_debug:
-                for debugObj in build_result.debugObjects:
-                    # Apply options to the show function if any were provided
-                    if debugObj.options:
-                        # parse the options
-                        # object name, Mark this as a debug object
-                        name = "Debug_" + debugObj.options['name'] \
-                                        if 'name' in debugObj.options \
-                                        else "Debug_" + str(random())
-                        
-                        # object group
-                        group = debugObj.options['group'] \
-                                        if 'group' in debugObj.options else None
-
-                        # force color for Debug object
-                        rgba = (255, 0, 0, 0.60)
-                        name = debugObj.options['name'] if 'name' in debugObj.options else '_'
-                        # Mark this as a debug object
-                        name = "Debug_" + name
-                        
-                    else:
-                        name = "Debug_" + str(random())
-                        group = None
-                        rgba = (255, 0, 0, 0.60)
-                        
-                    # append object to the list of objects
-                    list_objects.append((debugObj.shape, rgba, name, group))
-                    
-            # show list of objects
-            if len(list_objects) > 0 and action != 'Validate':
-                self.showInFreeCAD(list_objects)
+            with tracing.span('list objects'):
+                list_objects = cq_results.list_build_objects(build_result, self.parent.show_debug)
+            if self.mesh_cache is None:
+                from freecad.cadquery2workbench import shape_mesh
+                self.mesh_cache = shape_mesh.Mesh_Cache(0)
+            self.mesh_cache.max_bytes = param.GetInt("meshCacheSize", 64) * 1024 * 1024
+            self.mesh_cache.evict()
+            list_objects = cq_results.serialize_objects(list_objects, self.mesh_quality(preview),
+                                                        self.mesh_cache)
+            self.cache_build_objects(cache_key, list_objects)
+            self.show_build_objects(list_objects, action)
             
         else:
             App.Console.PrintError("Error executing CQGI-compliant script. " + str(build_result.exception) + "\r\n")
     
-    def append_assembly_parts(self, list_objects):
-        assy_obj_toremove=[]
-        for obj in list_objects:
-            cqObject = obj[0]
-            rgba = obj[1]
-            name = obj[2]
-            group = obj[3]
-            if len(obj) > 4:
-                loc = obj[4]
-            else:
-                loc = None
-            
-            # CadQuery Assembly, add each childrens to be rendered to list_objects 
-            if type(cqObject) == cq.assembly.Assembly:
-                assy_obj_toremove.append(obj)
-                # add childrens to list_objects
-                loc_parent = None
-                for assy in list(cqObject.objects.values()):
-                    # color
-                    if assy.color:
-                        r, g, b, a = assy.color.toTuple()
-                        r *= 255
-                        g *= 255
-                        b *= 255
-                        a = 1 - a
-                        rgba = (r, g, b, a)
-                    else:
-                        rgba = (204, 204, 204, 0.0)
-                        
-                    # location
-                    loc_matrix = App.Base.Matrix()
-                    if not loc_parent:
-                        if assy.loc:
-                            loc = assy.loc.toTuple()
-                            loc_parent = loc
-                        else:
-                            loc = ((0, 0, 0), (0, 0, 0))
-                            loc_parent = loc
-                        
-                        trans = loc[0]
-                        rot = loc[1]
-                        ax, ay, az = rot
-                        loc_matrix.rotateX(ax)
-                        loc_matrix.rotateY(ay)
-                        loc_matrix.rotateZ(az)
-                        loc_matrix.move(trans)
-                    else:
-                        # location of child assy are relative to parent one
-                        if assy.loc:
-                            loc = assy.loc.toTuple()
-                            trans = loc[0]
-                            rot = loc[1]
-                            ax, ay, az = rot
-                            loc_matrix.rotateX(ax)
-                            loc_matrix.rotateY(ay)
-                            loc_matrix.rotateZ(az)
-                            loc_matrix.move(trans)
-                            
-                        loc = loc_parent
-                        trans = loc[0]
-                        rot = loc[1]
-                        ax, ay, az = rot
-                        loc_matrix.rotateX(ax)
-                        loc_matrix.rotateY(ay)
-                        loc_matrix.rotateZ(az)
-                        loc_matrix.move(trans)
-                        
-                    # append each part of the Assembly
-                    list_objects.append((assy.obj, rgba, assy.name, group, loc_matrix))
-                
-        # remove Assy from list_objects
-        for obj in assy_obj_toremove:
-            list_objects.pop(list_objects.index(obj))
+    # Result of a build made by the worker process
+    def on_build_finished(self, reply):
+        tracer = self.traces.pop(reply['id'], None)
+        if tracer is None:
+            self.show_build_reply(reply)
+            return
         
-        return list_objects
-
-    def showInFreeCAD(self, list_objects):
+        # add the spans of the worker then time the display of the objects
+        tracer.extend(reply.get('trace'))
+        tracing.active = tracer
+        try:
+            with tracing.span('display', success=reply['success']):
+                self.show_build_reply(reply)
+        finally:
+            tracing.active = None
+        self.report_trace(tracer)
+    
+    def show_build_reply(self, reply):
+        action, cache_key, scriptText = self.build_actions.pop(reply['id'], ('Execute', None, b''))
+        self.parent.cancelAct.setEnabled(self.worker.is_busy())
+        self.report_profile(reply.get('lineProfile'), reply.get('buildTime'), scriptText)
+        self.report_operations(reply.get('operations'), reply.get('buildTime'))
+        self.report_cprofile(reply.get('cprofile'))
+        
+        if reply['success']:
+            self.report_incremental(reply.get('incremental'))
+            self.cache_build_objects(cache_key, reply['objects'])
+        
+        # A newer build was requested, this one is outdated
+        # a preview is still shown while newer previews are on their way
+        if action == 'Preview':
+            outdated = self.scheduler.pending not in (None, 'Preview') \
+                        or any(a[0] != 'Preview' for a in self.build_actions.values())
+        else:
+            outdated = self.worker.is_busy() or self.scheduler.has_pending()
+        if outdated:
+            return
+        
+        if reply['success']:
+            self.show_build_objects(reply['objects'], action)
+        elif reply.get('cancelled'):
+            App.Console.PrintWarning(reply['exception'] + "\r\n")
+        else:
+            App.Console.PrintError("Error executing CQGI-compliant script. " + reply['exception'] + "\r\n")
+    
+    # A build of the prefetcher is done, show it if it is the one awaited
+    def on_prefetched(self, cache_key, success):
+        if self.awaited is None or self.awaited[0] != cache_key:
+            return
+        action = self.awaited[1]
+        self.awaited = None
+        if not success:
+            # build it again to report the error
+            self.scheduler.request(action=action, delay=0)
+            return
+        if self.worker.is_busy() or self.scheduler.has_pending():
+            return
+        App.Console.PrintMessage("Build prefetched (" + self.build_cache.stats() + ")\r\n")
+        self.show_build_objects(self.build_cache.get(cache_key), action)
+    
+    # Print how many statements an incremental build executed
+    def report_incremental(self, incremental):
+        if incremental is None:
+            return
+        executed, total = incremental
+        App.Console.PrintMessage("Incremental build: {0} of {1} statements executed\r\n" \
+                                    .format(executed, total))
+    
+    # Print the slowest lines of the script and show the time of each line in the editor
+    def report_profile(self, line_profile, build_time, scriptText):
+        if line_profile is None:
+            return
+        from freecad.cadquery2workbench import script_profiler
+        App.Console.PrintMessage(script_profiler.format_report(line_profile,
+                                            scriptText.decode('utf-8'), build_time or 0.0))
+        self.parent.editor.set_line_profile(dict((lineno, line[1])
+                                            for lineno, line in line_profile.items()))
+    
+    # Show the table of the cadquery operations timed during the build
+    def report_operations(self, operations, build_time):
+        if operations is None:
+            return
+        if self.operations_dialog is None:
+            self.operations_dialog = operationsdialog.OperationsDialog(self.parent)
+        self.operations_dialog.set_rows(operations, build_time)
+        self.operations_dialog.show()
+    
+    # Load cadquery in the background, so that the first build doesn't wait for it
+    # requested is True when a validation waits for it, whatever the settings
+    def warm_up(self, requested=False):
+        param = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME)
+        if cadquery_loader.is_loaded() or cadquery_loader.is_warming_up():
+            return
+        if not (requested or param.GetBool("warmUpCadQuery", True)):
+            return
+        # the worker process loads cadquery as soon as it starts
+        if param.GetBool("useBuildWorker", True):
+            self.worker.start()
+        cadquery_loader.start_warm_up(self.warmed_up.emit)
+    
+    def report_warm_up(self, error):
+        pending, self.pending_validation = self.pending_validation, None
+        if error is not None:
+            App.Console.PrintWarning("CadQuery warm-up failed: " + str(error) + "\r\n")
+            return
+        self.report_cadquery_load()
+        if pending is not None:
+            self.validate_parameters(*pending)
+    
+    # Print once how long cadquery took to load
+    def report_cadquery_load(self):
+        if self.cadquery_reported:
+            return
+        self.cadquery_reported = True
+        App.Console.PrintMessage("CadQuery " + cadquery_loader.version() + " loaded: " \
+                                    + cadquery_loader.format_timings() + "\r\n")
+    
+    # Build once with cProfile
+    def profile_build(self):
+        self.cprofile_next = True
+        self.scheduler.request(action='Execute')
+    
+    # Save the cProfile statistics next to the script, as pstats and as a flamegraph
+    def report_cprofile(self, stats):
+        if stats is None:
+            return
+        if self.parent.filename:
+            base = os.path.splitext(self.parent.filename)[0]
+        else:
+            base = os.path.join(tempfile.gettempdir(), "cadquery_build")
+        try:
+            build_profile.save_stats(stats, base + ".pstats")
+            build_profile.save_collapsed(stats, base + ".collapsed.txt")
+        except OSError as ex:
+            App.Console.PrintError("Unable to save the build profile: " + str(ex) + "\r\n")
+            return
+        App.Console.PrintMessage(build_profile.top_functions(base + ".pstats", 20) + "\r\n")
+        App.Console.PrintMessage("Build profile saved to {0}.pstats, flamegraph to {0}.collapsed.txt\r\n" \
+                                    .format(base))
+    
+    # Print the time of each phase of a build, and save its spans if the user asked for it
+    def report_trace(self, tracer):
+        App.Console.PrintMessage(tracer.summary() + "\r\n")
+        if not App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME) \
+                    .GetBool("traceExport", False):
+            return
+        if self.parent.filename:
+            path = os.path.splitext(self.parent.filename)[0] + ".trace.json"
+        else:
+            path = os.path.join(tempfile.gettempdir(), "cadquery_build.trace.json")
+        try:
+            tracer.export(path)
+            App.Console.PrintMessage("Build trace saved to " + path + "\r\n")
+        except OSError as ex:
+            App.Console.PrintError("Unable to save the build trace: " + str(ex) + "\r\n")
+    
+    # Tessellation the shapes of a build are meshed with before they are shown,
+    # (Deviation, AngularDeflection) or None to leave the meshing to FreeCAD
+    def mesh_quality(self, preview=False):
+        param = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME)
+        if not param.GetBool("preTessellate", True):
+            return None
+        return document_sync.view_quality(preview)
+    
+    # Keep the objects of a successful build in the cache
+    def cache_build_objects(self, cache_key, list_objects):
+        if cache_key is None:
+            return
+        self.build_cache.put(cache_key, list_objects)
+        if cache_key in self.variant_keys:
+            self.variant_cache.put(cache_key, list_objects)
+        App.Console.PrintMessage("Build cache miss (" + self.build_cache.stats() + ")\r\n")
+    
+    # Cancel the builds running in the worker process
+    def cancel(self):
+        self.awaited = None
+        self.scheduler.cancel()
+        self.worker.cancel()
+    
+    def show_build_objects(self, list_objects, action):
+        # Validate or nothing to show, clean the 3D view if exist (user may have closed the view3D)
+        if len(list_objects) == 0 or action == 'Validate':
+            try:
+                if self.parent.view3DApp != None:
+                    with shared.Bulk_Document_Update(self.parent.view3DApp):
+                        self.document_sync.update(self.parent.view3DApp, [])
+                        self.parent.view3DApp.recompute()
+            except:
+                pass
+            return
+        
+        # show list of objects
+        self.showInFreeCAD(list_objects, preview=action == 'Preview')
+        
+        # the next values of the variable tuned are built while the user looks at this one
+        if action != 'Preview':
+            self.prefetcher.schedule()
+    
+    def showInFreeCAD(self, list_objects, preview=False):
         # get FreeCAD 3D view 
         activeDoc = shared.getActive3DView(self.parent.view3DApp, self.parent, self.parent.filename)
+        if self.parent.firstexecute:
+            # a new 3D view, nothing to reuse
+            self.document_sync.forget(activeDoc)
         
         # first loop to split Assembly parts
-        list_objects = self.append_assembly_parts(list_objects)
-        
-        for obj in list_objects:
-            cqObject = obj[0]
-            rgba = obj[1]
-            name = obj[2]
-            group = obj[3]
-            if len(obj) > 4:
-                loc = obj[4]
-            else:
-                loc = None
-            
-            # CadQuery Assembly
-            if type(cqObject) == cq.assembly.Assembly:
-                App.Console.PrintError("Only one Sub Level of Assembly Parts is supported yet")
-                return
-            
-            # Make sure we replace any troublesome characters not supported in FreeCAD
-            # As we search for existing group below
-            if group:
-                for ch in ['&', '#', '.', '$', '%', ',', ' ']:
-                    if ch in group:
-                        group = group.replace(ch, "_")
-            
-            #Convert our rgba values
-            r = rgba[0] / 255.0
-            g = rgba[1] / 255.0
-            b = rgba[2] / 255.0
-            a = int(rgba[3] * 100.0)
-            
-            # case group was passed in the options
-            if group:
-                # group is already is activeDoc
-                group_exist = False
-                for obj in activeDoc.Objects:
-                    if type(obj) == App.DocumentObjectGroup and obj.Name == group:
-                        group_exist = True
-                        
-                if not group_exist:
-                    # create it
-                    activeDoc.Tip = activeDoc.addObject('App::DocumentObjectGroup', group)
-                    
-                # add newFeature to group
-                newFeature = activeDoc.addObject("Part::Feature", name)
-                activeDoc.getObject(group).addObject(newFeature)
-            
-            else:
-                # add newFeature to activeDoc
-                newFeature = activeDoc.addObject("Part::Feature", name)
+        from freecad.cadquery2workbench import cq_results
+        with tracing.span('assembly parts'):
+            list_objects = cq_results.append_assembly_parts(list_objects)
+        
+        # update only the objects which changed since the previous build
+        param = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME)
+        instancing = param.GetBool("instanceRepeatedShapes", True)
+        aggregate_above = param.GetInt("aggregateAbove", 500)
+        # a single refresh of the tree and no undo data for the whole update
+        with shared.Bulk_Document_Update(activeDoc):
+            with tracing.span('document sync', objects=len(list_objects)):
+                touched = self.document_sync.update(activeDoc, list_objects, preview,
+                                                    instancing, aggregate_above)
             
-            #Change our shape's properties accordingly
-            newFeature.ViewObject.ShapeColor = (r, g, b)
-            newFeature.ViewObject.Transparency = a
-            self.tofreecad(cqObject, newFeature)
-            # Placement
-            if loc:
-                newFeature.Placement = App.Placement(loc).multiply(newFeature.Placement)
-                # newFeature.Placement = newFeature.Placement.multiply(App.Placement(m))
-                
-        # All object are added to FreeCAD, recompute    
-        activeDoc.recompute()
+            # recompute the objects added or modified
+            if touched:
+                with tracing.span('recompute', objects=len(touched)):
+                    activeDoc.recompute(touched)
         
         if self.parent.firstexecute:
             # On the first Execution force the Camera and View settings
             # Then next time keep user view
-            Gui.activeDocument().activeView().setCamera('OrthographicCamera{}')
-            Gui.activeDocument().activeView().viewIsometric()
-            Gui.SendMsgToActiveView("ViewFit")
+            with tracing.span('view fit'):
+                Gui.activeDocument().activeView().setCamera('OrthographicCamera{}')
+                Gui.activeDocument().activeView().viewIsometric()
+                Gui.SendMsgToActiveView("ViewFit")
             self.parent.firstexecute = False
             
-        # Expand Tree View if there are groups
-        # activeDoc = App.ActiveDocument
-        for obj in activeDoc.Objects:
-            if type(obj) == App.DocumentObjectGroup:
-                # Gui.Selection.addSelection(activeDoc.Name,obj.Group[0].Name)
-                Gui.activeDocument(). \
-                    scrollToTreeItem(Gui.activeDocument().getObject(obj.Group[0].Name))
-                # Gui.Selection.clearSelection()
-    
-    def tofreecad(self, cqObject, feature):
-        # Use a temporary BREP file to get the cadquery shape
-        # Use FreeCAD Home directory
-        env = os.environ
-        temppath = env['FREECAD_USER_HOME'] if 'FREECAD_USER_HOME' in env else env['HOME']
-        temppath += '/.FreeCAD/tmp'
-        
-        # if not exist create the tmp directory
-        pathlib.Path(temppath).mkdir(parents=True, exist_ok=True)
-        
-        # convert to FreeCAD Shape using BRep export/import
-        filename = temppath + '/brep'
-        
-        cqObject.val().exportBrep(filename)
-        tmp_shape = Part.Shape()
-        tmp_shape.importBrep(filename)
-        
-        feature.Shape = tmp_shape
+        # Expand Tree View of the groups just created, the others keep the state left by the user
+        with tracing.span('expand tree'):
+            shared.expandGroups(activeDoc, self.document_sync.new_groups)
@@ -0,0 +1,101 @@
+""" Time each line of a CQGI script while it is executed """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# Nothing in this module depends on FreeCAD or Qt, so that it can be used
+# as well by the build worker process
+import sys
+import time
+
+from cadquery.cqgi import CQSCRIPT
+
+
+class Line_Profiler(object):
+    '''
+    Time the lines of the script code, ie compiled with CQSCRIPT as file name.
+
+    Only the frames of the script are traced line by line: top-level
+    statements, lines inside loops and functions defined by the script.
+    The time of a line includes everything it calls, cadquery included,
+    so the lines of a function are counted as well in the line calling it.
+    '''
+
+    def __init__(self):
+        self.lines = {}     # line number -> [hits, seconds]
+        self.last = {}      # frame -> (line number, time of the line start)
+        self.clock = time.perf_counter
+
+    def start(self):
+        self.lines.clear()
+        self.last.clear()
+        sys.settrace(self.trace_call)
+
+    def stop(self):
+        sys.settrace(None)
+        # frames left by an exception
+        now = self.clock()
+        for frame, (lineno, t) in list(self.last.items()):
+            self.add(lineno, now - t)
+        self.last.clear()
+
+    def trace_call(self, frame, event, arg):
+        # trace line by line only the frames of the script
+        if frame.f_code.co_filename != CQSCRIPT:
+            return None
+        return self.trace_line
+
+    def trace_line(self, frame, event, arg):
+        now = self.clock()
+        previous = self.last.pop(frame, None)
+        if previous is not None:
+            self.add(previous[0], now - previous[1])
+
+        if event == 'line':
+            line = self.lines.setdefault(frame.f_lineno, [0, 0.0])
+            line[0] += 1
+            self.last[frame] = (frame.f_lineno, self.clock())
+        elif event != 'return':
+            # ie exception, the line goes on
+            if previous is not None:
+                self.last[frame] = (previous[0], self.clock())
+        return self.trace_line
+
+    def add(self, lineno, seconds):
+        self.lines.setdefault(lineno, [0, 0.0])[1] += seconds
+
+    def times(self):
+        '''Cumulative time of each line, line number -> seconds.'''
+        return dict((lineno, line[1]) for lineno, line in self.lines.items())
+
+
+def top_lines(lines, count=10):
+    '''
+    The slowest lines.
+
+    :param lines: dictionary line number -> [hits, seconds]
+    :param count: number of lines
+    :return: list of (line number, hits, seconds) the slowest first
+    '''
+    ranked = sorted(lines.items(), key=lambda item: item[1][1], reverse=True)
+    return [(lineno, hits, seconds) for lineno, (hits, seconds) in ranked[:count]]
+
+
+def format_report(lines, source, build_time, count=10):
+    '''
+    Text report of the slowest lines, for the Report view.
+
+    :param lines: dictionary line number -> [hits, seconds]
+    :param source: the script source, to quote the lines
+    :param build_time: the total build time in seconds
+    :param count: number of lines
+    :return: the report as a string
+    '''
+    source_lines = source.splitlines()
+    report = "Line profile, build time {0:.3f} s, slowest lines:\r\n".format(build_time)
+    for lineno, hits, seconds in top_lines(lines, count):
+        text = source_lines[lineno - 1].strip() if 0 < lineno <= len(source_lines) else ''
+        share = 100.0 * seconds / build_time if build_time else 0.0
+        report += "  line {0:>4}: {1:8.3f} s {2:5.1f}% {3:>6} hits  {4}\r\n" \
+                    .format(lineno, seconds, share, hits, text[:60])
+    return report
@@ -30,6 +30,32 @@ class SettingsDialog(QDialog):
         executeOnSave = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("executeOnSave")
         showLineNumbers = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("showLineNumbers")
         allowReload = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("allowReload")
+        cancelkeybinding = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetString("cancelKeybinding", "Shift+F9")
+        useBuildWorker = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("useBuildWorker", True)
+        workerTimeout = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("workerTimeout", 300)
+        workerMemoryLimit = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("workerMemoryLimit", 0)
+        workerMaxBuilds = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("workerMaxBuilds", 50)
+        workerRssLimit = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("workerRssLimit", 2048)
+        workerPython = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetString("workerPython")
+        useBuildCache = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("useBuildCache", True)
+        buildCacheSize = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("buildCacheSize", 256)
+        incrementalBuild = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("incrementalBuild", False)
+        buildDebounce = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("buildDebounce", 150)
+        supersedeCancelDelay = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("supersedeCancelDelay", 2000)
+        buildWhileTyping = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("buildWhileTyping", False)
+        typingIdleDelay = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("typingIdleDelay", 1000)
+        traceBuilds = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("traceBuilds", False)
+        traceExport = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("traceExport", False)
+        warmUpCadQuery = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("warmUpCadQuery", True)
+        checkUndefinedNames = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("checkUndefinedNames", True)
+        previewInterval = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("previewInterval", 250)
+        prefetchWorkers = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("prefetchWorkers", 1)
+        snapshotCacheSize = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("snapshotCacheSize", 128)
+        instanceRepeatedShapes = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("instanceRepeatedShapes", True)
+        aggregateAbove = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("aggregateAbove", 500)
+        preTessellate = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("preTessellate", True)
+        meshCacheSize = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetInt("meshCacheSize", 64)
+        undoBuilds = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).GetBool("undoBuilds", False)
         
         execute_key_binding = QLabel('Execute Key-binding')
         self.ui_execute_key_binding = QLineEdit()
@@ -43,6 +69,10 @@ class SettingsDialog(QDialog):
         self.ui_rebuild_key_binding = QLineEdit()
         self.ui_rebuild_key_binding.setText(rebuildkeybinding)
         
+        cancel_key_binding = QLabel('Cancel Build Key-binding')
+        self.ui_cancel_key_binding = QLineEdit()
+        self.ui_cancel_key_binding.setText(cancelkeybinding)
+        
         execute_on_save = QLabel('Execute on Save')
         self.execute_on_save = QCheckBox()
         self.execute_on_save.setChecked(executeOnSave)
@@ -55,6 +85,121 @@ class SettingsDialog(QDialog):
         self.allow_reload = QCheckBox()
         self.allow_reload.setChecked(allowReload)
         
+        # The Build Worker settings
+        use_build_worker = QLabel('Build in a Worker Process')
+        self.use_build_worker = QCheckBox()
+        self.use_build_worker.setChecked(useBuildWorker)
+        
+        worker_timeout = QLabel('Build Timeout (s, 0 = none)')
+        self.worker_timeout = QSpinBox()
+        self.worker_timeout.setRange(0, 86400)
+        self.worker_timeout.setValue(workerTimeout)
+        
+        worker_memory_limit = QLabel('Memory Limit (MB, 0 = none)')
+        self.worker_memory_limit = QSpinBox()
+        self.worker_memory_limit.setRange(0, 1048576)
+        self.worker_memory_limit.setValue(workerMemoryLimit)
+        
+        worker_max_builds = QLabel('Restart Worker after N Builds')
+        self.worker_max_builds = QSpinBox()
+        self.worker_max_builds.setRange(0, 100000)
+        self.worker_max_builds.setValue(workerMaxBuilds)
+        
+        worker_rss_limit = QLabel('Restart Worker above Memory (MB)')
+        self.worker_rss_limit = QSpinBox()
+        self.worker_rss_limit.setRange(0, 1048576)
+        self.worker_rss_limit.setValue(workerRssLimit)
+        
+        worker_python = QLabel('Worker Python Interpreter')
+        self.worker_python = QLineEdit()
+        self.worker_python.setPlaceholderText('auto')
+        self.worker_python.setText(workerPython)
+        
+        use_build_cache = QLabel('Cache Build Results')
+        self.use_build_cache = QCheckBox()
+        self.use_build_cache.setChecked(useBuildCache)
+        
+        build_cache_size = QLabel('Build Cache Size (MB)')
+        self.build_cache_size = QSpinBox()
+        self.build_cache_size.setRange(1, 1048576)
+        self.build_cache_size.setValue(buildCacheSize)
+        
+        incremental_build = QLabel('Incremental Build')
+        self.incremental_build = QCheckBox()
+        self.incremental_build.setChecked(incrementalBuild)
+        
+        build_debounce = QLabel('Build Requests Delay (ms)')
+        self.build_debounce = QSpinBox()
+        self.build_debounce.setRange(0, 10000)
+        self.build_debounce.setValue(buildDebounce)
+        
+        supersede_cancel_delay = QLabel('Cancel Superseded Builds after (ms)')
+        self.supersede_cancel_delay = QSpinBox()
+        self.supersede_cancel_delay.setRange(0, 600000)
+        self.supersede_cancel_delay.setValue(supersedeCancelDelay)
+        
+        build_while_typing = QLabel('Build while Typing')
+        self.build_while_typing = QCheckBox()
+        self.build_while_typing.setChecked(buildWhileTyping)
+        
+        typing_idle_delay = QLabel('Typing Idle Delay (ms)')
+        self.typing_idle_delay = QSpinBox()
+        self.typing_idle_delay.setRange(100, 60000)
+        self.typing_idle_delay.setValue(typingIdleDelay)
+        
+        trace_builds = QLabel('Trace Builds')
+        self.trace_builds = QCheckBox()
+        self.trace_builds.setChecked(traceBuilds)
+        
+        trace_export = QLabel('Save Build Traces')
+        self.trace_export = QCheckBox()
+        self.trace_export.setChecked(traceExport)
+        
+        warm_up_cadquery = QLabel('Load CadQuery at Activation')
+        self.warm_up_cadquery = QCheckBox()
+        self.warm_up_cadquery.setChecked(warmUpCadQuery)
+        
+        check_undefined_names = QLabel('Check Undefined Names')
+        self.check_undefined_names = QCheckBox()
+        self.check_undefined_names.setChecked(checkUndefinedNames)
+        
+        preview_interval = QLabel('Live Preview Interval (ms)')
+        self.preview_interval = QSpinBox()
+        self.preview_interval.setRange(0, 10000)
+        self.preview_interval.setValue(previewInterval)
+        
+        prefetch_workers = QLabel('Prefetch Workers')
+        self.prefetch_workers = QSpinBox()
+        self.prefetch_workers.setRange(0, 64)
+        self.prefetch_workers.setValue(prefetchWorkers)
+        
+        snapshot_cache_size = QLabel('Snapshot Cache Size (MB)')
+        self.snapshot_cache_size = QSpinBox()
+        self.snapshot_cache_size.setRange(0, 1048576)
+        self.snapshot_cache_size.setValue(snapshotCacheSize)
+        
+        instance_repeated_shapes = QLabel('Link Repeated Shapes')
+        self.instance_repeated_shapes = QCheckBox()
+        self.instance_repeated_shapes.setChecked(instanceRepeatedShapes)
+        
+        aggregate_above = QLabel('Merge Objects into Compounds above')
+        self.aggregate_above = QSpinBox()
+        self.aggregate_above.setRange(0, 1000000)
+        self.aggregate_above.setValue(aggregateAbove)
+        
+        pre_tessellate = QLabel('Tessellate Shapes in the Build')
+        self.pre_tessellate = QCheckBox()
+        self.pre_tessellate.setChecked(preTessellate)
+        
+        mesh_cache_size = QLabel('Mesh Cache Size (MB)')
+        self.mesh_cache_size = QSpinBox()
+        self.mesh_cache_size.setRange(0, 1048576)
+        self.mesh_cache_size.setValue(meshCacheSize)
+        
+        undo_builds = QLabel('Undo Builds')
+        self.undo_builds = QCheckBox()
+        self.undo_builds.setChecked(undoBuilds)
+        
         self.buttons = QDialogButtonBox();
         self.buttons.setOrientation(Qt.Horizontal)
         self.buttons.setStandardButtons(QDialogButtonBox.Ok|QDialogButtonBox.Cancel)
@@ -77,10 +222,68 @@ class SettingsDialog(QDialog):
         grid.addWidget(self.show_line_numbers, 4, 1)
         grid.addWidget(allow_reload, 5, 0)
         grid.addWidget(self.allow_reload, 5, 1)
+        grid.addWidget(cancel_key_binding, 6, 0)
+        grid.addWidget(self.ui_cancel_key_binding, 6, 1)
         
         gridWidget = QWidget()
         gridWidget.setLayout(grid)
         
+        # The Build Layout
+        workerBox = QGroupBox("Build")
+        grid = QGridLayout()
+        grid.setContentsMargins(10, 10, 10, 10)
+        grid.addWidget(use_build_worker, 0, 0)
+        grid.addWidget(self.use_build_worker, 0, 1)
+        grid.addWidget(worker_timeout, 1, 0)
+        grid.addWidget(self.worker_timeout, 1, 1)
+        grid.addWidget(worker_memory_limit, 2, 0)
+        grid.addWidget(self.worker_memory_limit, 2, 1)
+        grid.addWidget(worker_max_builds, 3, 0)
+        grid.addWidget(self.worker_max_builds, 3, 1)
+        grid.addWidget(worker_rss_limit, 4, 0)
+        grid.addWidget(self.worker_rss_limit, 4, 1)
+        grid.addWidget(worker_python, 5, 0)
+        grid.addWidget(self.worker_python, 5, 1)
+        grid.addWidget(use_build_cache, 6, 0)
+        grid.addWidget(self.use_build_cache, 6, 1)
+        grid.addWidget(build_cache_size, 7, 0)
+        grid.addWidget(self.build_cache_size, 7, 1)
+        grid.addWidget(incremental_build, 8, 0)
+        grid.addWidget(self.incremental_build, 8, 1)
+        grid.addWidget(build_debounce, 9, 0)
+        grid.addWidget(self.build_debounce, 9, 1)
+        grid.addWidget(supersede_cancel_delay, 10, 0)
+        grid.addWidget(self.supersede_cancel_delay, 10, 1)
+        grid.addWidget(build_while_typing, 11, 0)
+        grid.addWidget(self.build_while_typing, 11, 1)
+        grid.addWidget(typing_idle_delay, 12, 0)
+        grid.addWidget(self.typing_idle_delay, 12, 1)
+        grid.addWidget(trace_builds, 13, 0)
+        grid.addWidget(self.trace_builds, 13, 1)
+        grid.addWidget(trace_export, 14, 0)
+        grid.addWidget(self.trace_export, 14, 1)
+        grid.addWidget(warm_up_cadquery, 15, 0)
+        grid.addWidget(self.warm_up_cadquery, 15, 1)
+        grid.addWidget(check_undefined_names, 16, 0)
+        grid.addWidget(self.check_undefined_names, 16, 1)
+        grid.addWidget(preview_interval, 17, 0)
+        grid.addWidget(self.preview_interval, 17, 1)
+        grid.addWidget(prefetch_workers, 18, 0)
+        grid.addWidget(self.prefetch_workers, 18, 1)
+        grid.addWidget(snapshot_cache_size, 19, 0)
+        grid.addWidget(self.snapshot_cache_size, 19, 1)
+        grid.addWidget(instance_repeated_shapes, 20, 0)
+        grid.addWidget(self.instance_repeated_shapes, 20, 1)
+        grid.addWidget(aggregate_above, 21, 0)
+        grid.addWidget(self.aggregate_above, 21, 1)
+        grid.addWidget(pre_tessellate, 22, 0)
+        grid.addWidget(self.pre_tessellate, 22, 1)
+        grid.addWidget(mesh_cache_size, 23, 0)
+        grid.addWidget(self.mesh_cache_size, 23, 1)
+        grid.addWidget(undo_builds, 24, 0)
+        grid.addWidget(self.undo_builds, 24, 1)
+        workerBox.setLayout(grid)
+        
         # The Radio Buttons DockWidget Layout
         groupBox = QGroupBox("DockWidget Layout")
         
@@ -114,6 +317,7 @@ class SettingsDialog(QDialog):
         # Final Layout
         vbox = QVBoxLayout()
         vbox.addWidget(gridWidget)
+        vbox.addWidget(workerBox)
         vbox.addWidget(groupBox)
         vbox.addWidget(self.buttons)
         self.setLayout(vbox)
@@ -198,6 +402,32 @@ class SettingsDialog(QDialog):
         App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("executeOnSave", self.execute_on_save.checkState())
         App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("showLineNumbers", self.show_line_numbers.checkState())
         App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("allowReload", self.allow_reload.checkState())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetString("cancelKeybinding", self.ui_cancel_key_binding.text())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("useBuildWorker", self.use_build_worker.checkState())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("workerTimeout", self.worker_timeout.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("workerMemoryLimit", self.worker_memory_limit.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("workerMaxBuilds", self.worker_max_builds.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("workerRssLimit", self.worker_rss_limit.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetString("workerPython", self.worker_python.text())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("useBuildCache", self.use_build_cache.checkState())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("buildCacheSize", self.build_cache_size.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("incrementalBuild", self.incremental_build.checkState())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("buildDebounce", self.build_debounce.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("supersedeCancelDelay", self.supersede_cancel_delay.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("buildWhileTyping", self.build_while_typing.checkState())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("typingIdleDelay", self.typing_idle_delay.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("traceBuilds", self.trace_builds.checkState())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("traceExport", self.trace_export.checkState())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("warmUpCadQuery", self.warm_up_cadquery.checkState())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("checkUndefinedNames", self.check_undefined_names.checkState())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("previewInterval", self.preview_interval.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("prefetchWorkers", self.prefetch_workers.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("snapshotCacheSize", self.snapshot_cache_size.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("instanceRepeatedShapes", self.instance_repeated_shapes.checkState())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("aggregateAbove", self.aggregate_above.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("preTessellate", self.pre_tessellate.checkState())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetInt("meshCacheSize", self.mesh_cache_size.value())
+        App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME).SetBool("undoBuilds", self.undo_builds.checkState())
         
         self.radio_toggled()
         
@@ -0,0 +1,147 @@
+""" Tessellate the shapes to display before they are handed over to FreeCAD """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# Nothing in this module depends on FreeCAD or Qt, it runs in the build worker.
+#
+# FreeCAD view providers mesh a shape with BRepMesh_IncrementalMesh at a
+# linear deflection of (dx + dy + dz) / 300 * Deviation, dx, dy, dz being
+# the size of the bounding box of the placed shape. OCCT keeps the
+# triangulation already held by a shape when its deflection is not larger
+# than the requested one, and the BREP carries the triangulation, so a shape
+# meshed here at the same deviation is shown by FreeCAD without meshing it.
+import math
+from io import BytesIO
+from collections import OrderedDict
+
+from OCP.Bnd import Bnd_Box
+from OCP.BRepBndLib import BRepBndLib
+from OCP.BRepMesh import BRepMesh_IncrementalMesh
+from OCP.BRepTools import BRepTools
+from OCP.BRep import BRep_Builder
+from OCP.TopoDS import TopoDS_Shape
+from OCP.gp import gp_Trsf
+from OCP.TopLoc import TopLoc_Location
+
+# the bounding box FreeCAD measures on the triangulation is slightly smaller
+# than the one of the geometry, mesh a little finer so that it is kept
+DEFLECTION_MARGIN = 0.9
+
+# smallest deflection accepted by OCCT, Precision::Confusion()
+MIN_DEFLECTION = 1e-7
+
+
+def located(shape, loc):
+    '''
+    The shape moved by a placement matrix, the geometry is shared.
+
+    :param shape: a TopoDS_Shape
+    :param loc: 4x4 placement matrix as a 16-tuple or None
+    '''
+    if not loc:
+        return shape
+    trsf = gp_Trsf()
+    trsf.SetValues(*loc[:12])
+    return shape.Moved(TopLoc_Location(trsf))
+
+
+def linear_deflection(shape, deviation, loc=None):
+    '''
+    Linear deflection FreeCAD meshes a shape with.
+
+    :param shape: a TopoDS_Shape
+    :param deviation: the Deviation of the view, in percent
+    :param loc: placement matrix of the object as a 16-tuple or None
+    :return: the deflection in mm
+    '''
+    box = Bnd_Box()
+    BRepBndLib.AddOptimal_s(located(shape, loc), box, False, False)
+    if box.IsVoid():
+        return MIN_DEFLECTION
+    xmin, ymin, zmin, xmax, ymax, zmax = box.Get()
+    deflection = ((xmax - xmin) + (ymax - ymin) + (zmax - zmin)) / 300.0 * deviation
+    return max(MIN_DEFLECTION, deflection * DEFLECTION_MARGIN)
+
+
+def tessellated_payload(payload, fingerprint, locs, deviation, angular, cache=None):
+    '''
+    BREP of a shape holding the triangulation FreeCAD shows it with.
+
+    The shape is read back from its BREP and meshed, meshing the shape of
+    the build would change the flags of its sub-shapes, and so the BREP and
+    the fingerprint of the shapes kept by an incremental build. A shape
+    placed several times is meshed at the finest deflection of its placements.
+
+    :param payload: the BREP of the shape without triangulation, as bytes
+    :param fingerprint: the hash of the payload
+    :param locs: the placement matrices of the objects showing the shape, None if not placed
+    :param deviation: the Deviation of the view, in percent
+    :param angular: the AngularDeflection of the view, in degrees
+    :param cache: a Mesh_Cache or None
+    :return: the BREP as bytes
+    '''
+    # the deflection only depends on the shape, its placements and the deviation
+    locs = frozenset([None] + list(locs))
+    key = (fingerprint, locs, deviation, angular)
+    meshed = cache.get(key) if cache is not None else None
+    if meshed is not None:
+        return meshed
+
+    shape = TopoDS_Shape()
+    BRepTools.Read_s(shape, BytesIO(payload), BRep_Builder())
+    deflection = min(linear_deflection(shape, deviation, loc) for loc in locs)
+    # faces are meshed by several threads
+    BRepMesh_IncrementalMesh(shape, deflection, False, math.radians(angular), True)
+    stream = BytesIO()
+    BRepTools.Write_s(shape, stream)
+    meshed = stream.getvalue()
+    if cache is not None:
+        cache.put(key, meshed)
+    return meshed
+
+
+class Mesh_Cache(object):
+    '''
+    Least recently used cache of the tessellated BREP of the shapes, keyed by
+    the fingerprint of the shape, its placements, the deviation and the
+    angular deflection.
+
+    A shape unchanged by a rebuild is not meshed again, the cache evicts the
+    least recently used payloads when their total size exceeds max_bytes.
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()    # key -> payload
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        '''The tessellated payload or None.'''
+        payload = self.entries.get(key)
+        if payload is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return payload
+
+    def put(self, key, payload):
+        if key in self.entries:
+            self.bytes -= len(self.entries.pop(key))
+        if len(payload) > self.max_bytes:
+            return
+        self.entries[key] = payload
+        self.bytes += len(payload)
+        self.evict()
+
+    def evict(self):
+        '''Drop the least recently used payloads above max_bytes.'''
+        while self.bytes > self.max_bytes:
+            self.bytes -= len(self.entries.popitem(last=False)[1])
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
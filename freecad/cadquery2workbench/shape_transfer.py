@@ -0,0 +1,115 @@
+""" Transfer cadquery shapes to FreeCAD Part shapes """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# cadquery (OCP) and FreeCAD each have their own python binding of OCCT, so a
+# TopoDS_Shape can't be handed over directly from one to the other, it has to
+# be serialized. The BREP is exchanged in memory, when FreeCAD can't read it
+# we fall back to the binary BREP format through a private temporary file.
+import os
+import tempfile
+from io import BytesIO
+
+import Part
+
+
+def from_brep_string(payload):
+    '''
+    Create a FreeCAD shape from a BREP held in memory.
+
+    :param payload: the BREP as bytes
+    :return: a Part.Shape
+    '''
+    shape = Part.Shape()
+    shape.importBrepFromString(payload.decode('utf-8'))
+    return shape
+
+
+def from_binary_file(cqShape):
+    '''
+    Create a FreeCAD shape from a cadquery Shape using the binary BREP format.
+
+    Each transfer uses its own temporary file, so concurrent transfers are safe.
+
+    :param cqShape: a cadquery Shape
+    :return: a Part.Shape
+    '''
+    fd, filename = tempfile.mkstemp(suffix='.bin')
+    os.close(fd)
+    try:
+        if hasattr(cqShape, 'exportBin'):
+            cqShape.exportBin(filename)
+            shape = Part.Shape()
+            shape.importBinary(filename)
+        else:
+            # cadquery older than 2.2, use a text BREP file
+            cqShape.exportBrep(filename)
+            shape = Part.Shape()
+            shape.importBrep(filename)
+    finally:
+        os.remove(filename)
+    return shape
+
+
+def from_brep_file(cqShape):
+    '''
+    Create a FreeCAD shape from a cadquery Shape using a text BREP file.
+
+    This is the former transfer method, kept as a reference for the benchmarks.
+
+    :param cqShape: a cadquery Shape
+    :return: a Part.Shape
+    '''
+    fd, filename = tempfile.mkstemp(suffix='.brep')
+    os.close(fd)
+    try:
+        cqShape.exportBrep(filename)
+        shape = Part.Shape()
+        shape.importBrep(filename)
+    finally:
+        os.remove(filename)
+    return shape
+
+
+def from_brep_payload_file(payload):
+    '''
+    Create a FreeCAD shape from a BREP held in memory, through a temporary file.
+
+    :param payload: the BREP as bytes
+    :return: a Part.Shape
+    '''
+    fd, filename = tempfile.mkstemp(suffix='.brep')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        shape = Part.Shape()
+        shape.importBrep(filename)
+    finally:
+        os.remove(filename)
+    return shape
+
+
+def to_freecad(obj):
+    '''
+    Get the FreeCAD shape of a Display_Object.
+
+    :param obj: a cq_results.Display_Object
+    :return: a Part.Shape
+    '''
+    # BREP already serialized by the worker process
+    if obj.payload is not None:
+        try:
+            return from_brep_string(obj.payload)
+        except Exception:
+            return from_brep_payload_file(obj.payload)
+
+    # built inside FreeCAD, cadquery is loaded
+    from freecad.cadquery2workbench import cq_results
+    cqShape = cq_results.to_shape(obj.shape)
+    try:
+        stream = BytesIO()
+        cqShape.exportBrep(stream)
+        return from_brep_string(stream.getvalue())
+    except Exception:
+        return from_binary_file(cqShape)
@@ -7,15 +7,56 @@ from random import random
 import FreeCAD as App
 import FreeCADGui as Gui
 from PySide2 import QtCore
-from PySide2.QtWidgets import QMdiArea, QPlainTextEdit
+from PySide2.QtWidgets import QMdiArea, QPlainTextEdit, QTreeWidget
 from PySide2.QtGui import QIcon
 
+from freecad.cadquery2workbench import MODULENAME
+from freecad.cadquery2workbench import document_sync
 
-def clearActive3DView(view3D):
-    """Clears the currently active 3D view so that we can re-render"""
-    for obj in view3D.Objects:
-        view3D.removeObject(obj.Name)
-    view3D.recompute()
+
+def documentTrees():
+    """The tree views of the FreeCAD documents, not the other tree widgets of the main window"""
+    return [tree for tree in Gui.getMainWindow().findChildren(QTreeWidget)
+            if tree.metaObject().className() == 'Gui::TreeWidget']
+
+
+class Bulk_Document_Update(object):
+    """Update many objects of a document at once: the selection is cleared,
+       the update is a single undo transaction or isn't recorded at all
+       (undoBuilds setting) and the document tree view is not repainted
+       until the end.
+    """
+    def __init__(self, doc):
+        self.doc = doc
+        self.undo = App.ParamGet("User parameter:BaseApp/Preferences/Mod/" + MODULENAME) \
+                        .GetBool("undoBuilds", False)
+        self.bulk = None
+        self.trees = []
+    
+    def __enter__(self):
+        # removing a selected object updates the selection each time
+        Gui.Selection.clearSelection(self.doc.Name)
+        self.bulk = document_sync.bulk_update(self.doc, self.undo)
+        self.bulk.__enter__()
+        self.trees = [tree for tree in documentTrees() if tree.updatesEnabled()]
+        for tree in self.trees:
+            tree.setUpdatesEnabled(False)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        for tree in self.trees:
+            tree.setUpdatesEnabled(True)
+        self.bulk.__exit__(exc_type, exc_value, traceback)
+        return False
+
+
+def expandGroups(doc, names):
+    """Scroll the tree view to the first object of each group given by its Name"""
+    guiDoc = Gui.getDocument(doc.Name)
+    for name in names:
+        group = doc.getObject(name)
+        if group is not None and group.Group:
+            guiDoc.scrollToTreeItem(guiDoc.getObject(group.Group[0].Name))
 
 
 def getActive3DView(view3D, cqWinEd, filename):
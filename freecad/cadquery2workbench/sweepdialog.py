@@ -0,0 +1,199 @@
+""" the Parameter Sweep Dialog of cadquery2-freecad-workbench """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+import os
+import multiprocessing
+import FreeCAD as App
+
+from PySide2.QtCore import Qt, QTimer
+from PySide2.QtWidgets import QDialog, QLabel, QLineEdit, QSpinBox, QCheckBox
+from PySide2.QtWidgets import QDialogButtonBox, QGridLayout, QVBoxLayout, QHBoxLayout
+from PySide2.QtWidgets import QTableWidget, QTableWidgetItem, QPushButton, QFileDialog
+from PySide2.QtWidgets import QWidget, QHeaderView
+
+from freecad.cadquery2workbench import cadquery_model
+from freecad.cadquery2workbench import parameter_sweep
+from freecad.cadquery2workbench import build_client
+
+
+class SweepDialog(QDialog):
+    def __init__(self, parent):
+        super(SweepDialog, self).__init__(parent)
+        self.parent = parent
+        self.sweep = None
+        self.resize(700, 500)
+        self.setWindowTitle('Parameter Sweep')
+
+        # parameters found in the script
+        self.source = self.parent.editor.toPlainText()
+        self.parameters = cadquery_model.parse(self.source).metadata.parameters
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.initUI()
+
+    def initUI(self):
+        # One line per parameter, values to sweep entered as a range or a list
+        self.ranges_table = QTableWidget(len(self.parameters), 3)
+        self.ranges_table.setHorizontalHeaderLabels(['Parameter', 'Default', 'Values (start:stop:step or a, b, c)'])
+        self.ranges_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        for row, (name, parameter) in enumerate(self.parameters.items()):
+            item = QTableWidgetItem(name)
+            item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+            self.ranges_table.setItem(row, 0, item)
+            item = QTableWidgetItem(str(parameter.default_value))
+            item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+            self.ranges_table.setItem(row, 1, item)
+            self.ranges_table.setItem(row, 2, QTableWidgetItem(''))
+
+        csv_file = QLabel('Results CSV File')
+        self.csv_file = QLineEdit()
+        if self.parent.filename:
+            self.csv_file.setText(os.path.splitext(self.parent.filename)[0] + "_sweep.csv")
+        browse = QPushButton('...')
+        browse.clicked.connect(self.browse_csv)
+        csvWidget = QWidget()
+        hbox = QHBoxLayout()
+        hbox.setContentsMargins(0, 0, 0, 0)
+        hbox.addWidget(self.csv_file)
+        hbox.addWidget(browse)
+        csvWidget.setLayout(hbox)
+
+        export_step = QLabel('Export STEP')
+        self.export_step = QCheckBox()
+        export_stl = QLabel('Export STL')
+        self.export_stl = QCheckBox()
+
+        processes = QLabel('Processes')
+        self.processes = QSpinBox()
+        self.processes.setRange(1, 256)
+        self.processes.setValue(os.cpu_count() or 1)
+
+        grid = QGridLayout()
+        grid.setContentsMargins(10, 10, 10, 10)
+        grid.addWidget(csv_file, 0, 0)
+        grid.addWidget(csvWidget, 0, 1)
+        grid.addWidget(export_step, 1, 0)
+        grid.addWidget(self.export_step, 1, 1)
+        grid.addWidget(export_stl, 2, 0)
+        grid.addWidget(self.export_stl, 2, 1)
+        grid.addWidget(processes, 3, 0)
+        grid.addWidget(self.processes, 3, 1)
+        gridWidget = QWidget()
+        gridWidget.setLayout(grid)
+
+        # Results, streamed as the variants are built
+        self.results_table = QTableWidget(0, 0)
+        self.status = QLabel('')
+
+        self.buttons = QDialogButtonBox()
+        self.buttons.setOrientation(Qt.Horizontal)
+        self.runButton = self.buttons.addButton('Run', QDialogButtonBox.ActionRole)
+        self.stopButton = self.buttons.addButton('Stop', QDialogButtonBox.ActionRole)
+        self.stopButton.setEnabled(False)
+        self.buttons.addButton(QDialogButtonBox.Close)
+        self.runButton.clicked.connect(self.run)
+        self.stopButton.clicked.connect(self.stop)
+        self.buttons.rejected.connect(self.reject)
+
+        vbox = QVBoxLayout()
+        vbox.addWidget(self.ranges_table)
+        vbox.addWidget(gridWidget)
+        vbox.addWidget(self.results_table)
+        vbox.addWidget(self.status)
+        vbox.addWidget(self.buttons)
+        self.setLayout(vbox)
+
+    def browse_csv(self):
+        fileDlg = QFileDialog.getSaveFileName(self, "Sweep Results", self.csv_file.text(),
+                                              "CSV Files (*.csv)")
+        if fileDlg[0]:
+            self.csv_file.setText(fileDlg[0])
+
+    def read_ranges(self):
+        '''Values of the swept parameters, the others keep their default value.'''
+        ranges = {}
+        for row, (name, parameter) in enumerate(self.parameters.items()):
+            values = parameter_sweep.parse_values(self.ranges_table.item(row, 2).text(),
+                                                  parameter.default_value)
+            if values:
+                ranges[name] = values
+        return ranges
+
+    def run(self):
+        try:
+            ranges = self.read_ranges()
+        except ValueError as ex:
+            self.status.setText(str(ex))
+            return
+        if not ranges:
+            self.status.setText("Enter the values of at least one parameter")
+            return
+        if not self.csv_file.text():
+            self.status.setText("Choose the results CSV file")
+            return
+
+        formats = []
+        if self.export_step.isChecked():
+            formats.append('step')
+        if self.export_stl.isChecked():
+            formats.append('stl')
+
+        self.sweep = parameter_sweep.Sweep(self.source, ranges, self.csv_file.text(),
+                                           formats=formats,
+                                           processes=self.processes.value(),
+                                           python=build_client.worker_python())
+        columns = parameter_sweep.COLUMNS[:1] + self.sweep.names + parameter_sweep.COLUMNS[1:]
+        self.results_table.clear()
+        self.results_table.setColumnCount(len(columns))
+        self.results_table.setRowCount(0)
+        self.results_table.setHorizontalHeaderLabels(columns)
+        self.results_table.setSortingEnabled(False)
+
+        self.sweep.start()
+        self.runButton.setEnabled(False)
+        self.stopButton.setEnabled(True)
+        self.status.setText("0 of {0} variants built".format(len(self.sweep)))
+        self.timer.start(100)
+
+    def poll(self):
+        # take every variant built since last poll, without blocking the GUI
+        while self.sweep is not None:
+            try:
+                row = self.sweep.next_row(timeout=0)
+            except multiprocessing.TimeoutError:
+                return
+            if row is None:
+                self.done_sweep("Sweep done, results saved to " + self.csv_file.text())
+                return
+            self.add_row(row)
+
+    def add_row(self, row):
+        line = self.results_table.rowCount()
+        self.results_table.insertRow(line)
+        for col in range(self.results_table.columnCount()):
+            key = self.results_table.horizontalHeaderItem(col).text()
+            value = row.get(key)
+            text = "{0:.6g}".format(value) if isinstance(value, float) else str(value if value is not None else '')
+            self.results_table.setItem(line, col, QTableWidgetItem(text))
+        self.status.setText("{0} of {1} variants built".format(len(self.sweep.rows), len(self.sweep)))
+
+    def stop(self):
+        if self.sweep is not None:
+            self.sweep.terminate()
+            self.done_sweep("Sweep stopped, {0} of {1} variants saved to {2}" \
+                                .format(len(self.sweep.rows), len(self.sweep), self.csv_file.text()))
+
+    def done_sweep(self, message):
+        self.timer.stop()
+        self.sweep = None
+        self.runButton.setEnabled(True)
+        self.stopButton.setEnabled(False)
+        self.results_table.setSortingEnabled(True)
+        self.status.setText(message)
+        App.Console.PrintMessage(message + "\r\n")
+
+    def reject(self):
+        self.stop()
+        super(SweepDialog, self).reject()
@@ -81,21 +81,34 @@ class Toolbar_Commands(QObject):
     def cmd_validate_script(self):
         """Checks the script for the user without executing it
            and populates the variable editor, if needed"""
-        self.parent.cmd.execute(action='Validate')
+        self.parent.cmd.scheduler.request(action='Validate')
         
     def cmd_execute_script(self):
         """CadQuery's command to execute a script file"""
-        self.parent.cmd.execute(action='Execute')
-
-        # Expand Tree View if there are groups
-        self.cmd_expand_tree()
+        self.parent.cmd.scheduler.request(action='Execute')
         
     def cmd_rebuild_script(self):
         """CadQuery's command to rebuild a script file
            Execute do not rebuild the parameters editor even if script file changed
            Using Rebuild it will do it"""
-        self.parent.cmd.execute(action='Rebuild')
+        self.parent.cmd.scheduler.request(action='Rebuild')
+    
+    def cmd_cancel_build(self):
+        """CadQuery's command to cancel the build waiting or running in the worker process"""
+        self.parent.cmd.cancel()
     
+    def cmd_profile_build(self):
+        """CadQuery's command to execute the script once under cProfile"""
+        self.parent.cmd.profile_build()
+        
+    def cmd_parameter_sweep(self):
+        """Opens the parameter sweep dialog, the script is built
+           for each combination of the variables values"""
+        # the dialog parses the script, it needs cadquery
+        from freecad.cadquery2workbench import sweepdialog
+        win = sweepdialog.SweepDialog(self.parent)
+        win.show()
+        
     def cmd_clear_output(self):
         """Opens a settings dialog, allowing the user to change
            the settings for this workbench"""
@@ -135,8 +148,7 @@ class Toolbar_Commands(QObject):
         # get FreeCAD 3D view
         activeDoc = shared.getActive3DView(self.parent.view3DApp, self.parent, self.parent.filename)
         # activeDoc = App.ActiveDocument
-        for obj in activeDoc.Objects:
-            if type(obj) == App.DocumentObjectGroup:
-                # Gui.Selection.addSelection(activeDoc.Name,obj.Group[0].Name)
-                Gui.activeDocument(). \
-                    scrollToTreeItem(Gui.activeDocument().getObject(obj.Group[0].Name))
+        # the top level groups, nested ones are expanded with their parent
+        shared.expandGroups(activeDoc, [obj.Name for obj in activeDoc.Objects
+                                        if type(obj) == App.DocumentObjectGroup
+                                        and obj.getParentGroup() is None])
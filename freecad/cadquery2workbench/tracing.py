@@ -0,0 +1,105 @@
+""" Spans timing the phases of a build, exported in Chrome trace format """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+# Fork of freecad-cadquery-module made for cadquery1.0 by
+# (c) 2014-2018 Jeremy Wright Apache 2.0 License
+#
+# Nothing in this module depends on FreeCAD or Qt, so that it can be used
+# as well by the build worker process. The events follow the Chrome trace
+# event format, they can be opened by chrome://tracing, Perfetto or speedscope.
+import os
+import json
+import time
+import threading
+
+# the Tracer recording the spans, None when not tracing
+active = None
+
+
+class Tracer(object):
+    '''
+    Record the spans of a build.
+
+    Timestamps come from time.perf_counter_ns(), a system wide monotonic
+    clock, so that the spans of the worker process line up with the ones
+    of FreeCAD.
+    '''
+
+    def __init__(self):
+        self.events = []
+        self.pid = os.getpid()
+
+    def add(self, name, start, end, args=None):
+        '''
+        Add a span.
+
+        :param name: name of the phase
+        :param start: start time in ns
+        :param end: end time in ns
+        :param args: dictionary of details about the span or None
+        '''
+        event = {'name': name, 'ph': 'X', 'ts': start / 1000.0, 'dur': (end - start) / 1000.0,
+                 'pid': self.pid, 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def extend(self, events):
+        '''Add the spans recorded by another process, ie the worker.'''
+        if events:
+            self.events.extend(events)
+
+    def summary(self):
+        '''
+        One line summary, total time of each phase in the order they started.
+
+        :return: the summary as a string
+        '''
+        if not self.events:
+            return "Build trace: no span recorded"
+        totals = {}
+        order = []
+        for event in sorted(self.events, key=lambda e: e['ts']):
+            if event['name'] not in totals:
+                order.append(event['name'])
+                totals[event['name']] = 0.0
+            totals[event['name']] += event['dur']
+        start = min(e['ts'] for e in self.events)
+        end = max(e['ts'] + e['dur'] for e in self.events)
+        return "Build trace {0}: ".format(format_duration(end - start)) + \
+               ", ".join("{0} {1}".format(name, format_duration(totals[name])) for name in order)
+
+    def export(self, path):
+        '''Write the spans to a Chrome trace JSON file.'''
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+def format_duration(us):
+    '''Duration in us as ms or s.'''
+    if us >= 1e6:
+        return "{0:.2f} s".format(us / 1e6)
+    return "{0:.1f} ms".format(us / 1e3)
+
+
+class span(object):
+    '''
+    Time a phase with the active Tracer, does nothing when not tracing.
+
+        with tracing.span('build'):
+            ...
+    '''
+
+    def __init__(self, name, **args):
+        self.name = name
+        self.args = args
+        self.tracer = active
+
+    def __enter__(self):
+        if self.tracer is not None:
+            self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.tracer is not None:
+            self.tracer.add(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
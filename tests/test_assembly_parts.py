@@ -0,0 +1,54 @@
+""" Parts of nested Assemblies and their placements """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import pytest
+
+cq = pytest.importorskip('cadquery')
+
+from freecad.cadquery2workbench import cq_results
+
+
+def translation(matrix):
+    return pytest.approx((matrix[3], matrix[7], matrix[11]))
+
+
+def placements(assy):
+    objects = [cq_results.Display_Object(assy, (204, 204, 204, 0.0), "Assy", None, key=('show',))]
+    return dict((obj.key[1:], obj) for obj in cq_results.append_assembly_parts(objects))
+
+
+def nested_assembly():
+    box = cq.Workplane().box(1, 1, 1)
+    inner = cq.Assembly(box, name='inner', loc=cq.Location(cq.Vector(0, 0, 3)))
+    inner.add(box, name='bolt', loc=cq.Location(cq.Vector(4, 0, 0)))
+    sub = cq.Assembly(name='sub', loc=cq.Location(cq.Vector(1, 0, 0), cq.Vector(0, 0, 1), 90))
+    sub.add(box, name='plate')
+    sub.add(inner)
+    top = cq.Assembly(name='top', loc=cq.Location(cq.Vector(0, 0, 5)))
+    top.add(sub)
+    return top
+
+
+def test_placements_are_composed_at_any_depth():
+    top = nested_assembly()
+    parts = placements(top)
+    assert list(parts) == [('top', 'sub', 'plate'), ('top', 'sub', 'inner'),
+                           ('top', 'sub', 'inner', 'bolt')]
+    assert translation(parts[('top', 'sub', 'plate')].loc) == (1, 0, 5)
+    assert translation(parts[('top', 'sub', 'inner')].loc) == (1, 0, 8)
+    # the bolt is moved along X of inner, turned by sub around Z
+    assert translation(parts[('top', 'sub', 'inner', 'bolt')].loc) == (1, 4, 8)
+    assert parts[('top', 'sub', 'inner')].groups == ('top', 'sub', 'inner')
+    assert parts[('top', 'sub', 'inner', 'bolt')].groups == ('top', 'sub', 'inner')
+
+
+def test_placements_follow_the_locations_changed_between_builds():
+    top = nested_assembly()
+    first = placements(top)
+    assert dict((k, o.loc) for k, o in placements(top).items()) == \
+        dict((k, o.loc) for k, o in first.items())
+
+    # add() made a copy of sub
+    top.children[0].loc = cq.Location(cq.Vector(2, 0, 0))
+    moved = placements(top)
+    assert translation(moved[('top', 'sub', 'plate')].loc) == (2, 0, 5)
+    assert translation(moved[('top', 'sub', 'inner', 'bolt')].loc) == (6, 0, 8)
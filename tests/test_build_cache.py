@@ -0,0 +1,102 @@
+""" Keys and byte budget of the build cache """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import ast
+
+import pytest
+
+from freecad.cadquery2workbench import build_cache
+
+PREVIEW = (2.0, 45.0)
+FULL = (0.5, 28.5)
+
+
+def key(source, parameters=None, show_debug=False, mesh=None):
+    return build_cache.cache_key(ast.parse(source), parameters or {}, show_debug, mesh)
+
+
+def test_key_depends_on_the_tessellation():
+    source = "r = 1\nshow_object(r)\n"
+    assert key(source, mesh=PREVIEW) != key(source, mesh=FULL)
+    assert key(source, mesh=FULL) != key(source, mesh=None)
+    assert key(source, mesh=FULL) == key(source, mesh=FULL)
+
+
+def test_preview_then_execute_gets_a_fine_mesh():
+    cq = pytest.importorskip('cadquery')
+    from freecad.cadquery2workbench import cq_results
+
+    def build(mesh):
+        obj = cq_results.Display_Object(cq.Workplane().sphere(10), (204, 204, 204, 0.0),
+                                        "Sphere", None, key=('show', None, "Sphere"))
+        return cq_results.serialize_objects([obj], mesh)
+
+    source = "import cadquery as cq\nshow_object(cq.Workplane().sphere(10))\n"
+    cache = build_cache.Build_Cache(64 * 1024 * 1024)
+
+    # the slider is dragged, the preview is coarse
+    cache.put(key(source, mesh=PREVIEW), build(PREVIEW))
+    # it is released at the same values, the build isn't the preview
+    assert cache.get(key(source, mesh=FULL)) is None
+    cache.put(key(source, mesh=FULL), build(FULL))
+
+    preview = cache.get(key(source, mesh=PREVIEW))[0]
+    full = cache.get(key(source, mesh=FULL))[0]
+    assert preview.fingerprint == full.fingerprint
+    assert len(full.payload) > len(preview.payload)
+
+
+def test_key_ignores_comments_and_formatting():
+    source = "w = 2\nres = box(w, 1, 1)\nshow_object(res)\n"
+    reformatted = "w = 2   # width\nres = box( w,1,  1 )\nshow_object(res) # the box\n"
+    assert key(source) == key(reformatted)
+    assert key(source) != key(source.replace("w = 2", "w = 3"))
+
+
+def test_key_depends_on_the_lines_of_the_shown_objects():
+    source = "res = 1\nshow_object(res)\n"
+    assert key(source) != key("\n" + source)
+    assert key(source) != key(source, show_debug=True)
+
+
+def test_key_depends_on_the_parameter_types():
+    source = "w = 2\n"
+    assert key(source, {'w': 2}) == key(source, {'w': 2})
+    assert key(source, {'w': 2}) != key(source, {'w': 2.0})
+    assert key(source, {'w': 2}) != key(source, {'w': 3})
+
+
+class Payload_Object(object):
+    def __init__(self, payload):
+        self.payload = payload
+
+
+def test_least_recently_used_builds_are_evicted_above_the_budget():
+    cache = build_cache.Build_Cache(100)
+    cache.put('a', [Payload_Object(b'a' * 40)])
+    cache.put('b', [Payload_Object(b'b' * 40)])
+    assert cache.get('a') is not None
+    cache.put('c', [Payload_Object(b'c' * 40)])
+
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert cache.bytes == 80
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_shared_payloads_are_counted_once():
+    payload = b'x' * 60
+    cache = build_cache.Build_Cache(100)
+    cache.put('a', [Payload_Object(payload), Payload_Object(payload)])
+    assert cache.bytes == 60
+    cache.put('a', [Payload_Object(b'y' * 10)])
+    assert cache.bytes == 10
+
+
+def test_builds_larger_than_the_budget_are_not_kept():
+    cache = build_cache.Build_Cache(100)
+    cache.put('a', [Payload_Object(b'a' * 40)])
+    cache.put('b', [Payload_Object(b'b' * 200)])
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.bytes == 40
@@ -0,0 +1,75 @@
+""" cProfile statistics of a build, as pstats and flamegraph stacks """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import cProfile
+import pstats
+
+import pytest
+
+from freecad.cadquery2workbench import build_profile
+
+
+def function(name):
+    return ('/tmp/script.py', len(name), name)
+
+
+def test_time_of_a_shared_function_is_split_between_its_callers():
+    first, second, shared, leaf = (function(n) for n in ('first', 'second', 'shared', 'leaf'))
+    stats = {
+        first: (1, 1, 0.0, 1.0, {}),
+        second: (1, 1, 1.0, 4.0, {}),
+        # shared: 0.5 s of its own and 0.5 s in leaf from first, 1.5 and 1.5 from second
+        shared: (2, 2, 2.0, 4.0, {first: (1, 1, 0.5, 1.0), second: (1, 1, 1.5, 3.0)}),
+        leaf: (2, 2, 2.0, 2.0, {shared: (2, 2, 2.0, 2.0)}),
+    }
+    stacks = build_profile.collapsed_stacks(stats)
+    assert stacks == {
+        "first (script.py:5);shared (script.py:6)": pytest.approx(0.5e6),
+        "first (script.py:5);shared (script.py:6);leaf (script.py:4)": pytest.approx(0.5e6),
+        "second (script.py:6)": pytest.approx(1e6),
+        "second (script.py:6);shared (script.py:6)": pytest.approx(1.5e6),
+        "second (script.py:6);shared (script.py:6);leaf (script.py:4)": pytest.approx(1.5e6),
+    }
+
+
+def test_recursion_is_shown_once():
+    root, recursive = function('root'), function('recursive')
+    stats = {
+        root: (1, 1, 0.0, 1.0, {}),
+        recursive: (10, 1, 1.0, 1.0, {root: (1, 1, 0.1, 1.0), recursive: (9, 9, 0.9, 0.9)}),
+    }
+    stacks = build_profile.collapsed_stacks(stats)
+    assert list(stacks) == ["root (script.py:4);recursive (script.py:9)"]
+
+
+def test_builtins_are_named_without_file():
+    assert build_profile.function_label(('~', 0, '<built-in method math.sqrt>')) == \
+        '<built-in method math.sqrt>'
+
+
+def busy(n):
+    return sum(i * i for i in range(n))
+
+
+def build():
+    return [busy(20000) for i in range(20)]
+
+
+def test_profile_of_a_build_is_saved_as_pstats_and_stacks(tmp_path):
+    profile = cProfile.Profile()
+    profile.enable()
+    build()
+    profile.disable()
+    stats = build_profile.profile_stats(profile)
+
+    path = str(tmp_path / "build.pstats")
+    build_profile.save_stats(stats, path)
+    assert pstats.Stats(path).total_calls > 20
+    assert "busy" in build_profile.top_functions(path, 5)
+
+    collapsed = tmp_path / "build.collapsed"
+    build_profile.save_collapsed(stats, str(collapsed))
+    lines = collapsed.read_text().splitlines()
+    assert any(line.startswith("build (test_build_profile.py:") and ";busy (" in line for line in lines)
+    for line in lines:
+        stack, weight = line.rsplit(" ", 1)
+        assert int(weight) > 0
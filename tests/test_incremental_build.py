@@ -0,0 +1,152 @@
+""" Incremental builds give the same objects as full builds """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+#
+# Run with a python able to import cadquery:
+#     python -m pytest tests
+import pytest
+
+cq = pytest.importorskip('cadquery')
+
+from freecad.cadquery2workbench import cadquery_model
+
+
+def build_sizes(script, parameter_sets):
+    '''Size along X of the objects shown by successive incremental builds.'''
+    state = cadquery_model.Incremental_State()
+    sizes = []
+    for parameters in parameter_sets:
+        result = cadquery_model.CQ_Model(script).build(parameters, {'incremental': state})
+        assert result.success, result.exception
+        sizes.append([r.shape.val().BoundingBox().xlen for r in result.results])
+    return sizes
+
+
+def test_augmented_assignment_uses_its_target():
+    script = (
+        "import cadquery as cq\n"
+        "h = 10\n"
+        "h += 5\n"
+        "res = cq.Workplane().box(h, 1, 1)\n"
+        "show_object(res)\n"
+    )
+    sizes = build_sizes(script, [{}, {'h': 20}, {'h': 20}])
+    assert sizes == [[pytest.approx(15)], [pytest.approx(25)], [pytest.approx(25)]]
+
+
+def test_argument_modified_by_a_function_is_not_restored():
+    script = (
+        "import cadquery as cq\n"
+        "def add_points(points, count):\n"
+        "    for i in range(count):\n"
+        "        points.append(i)\n"
+        "n = 3\n"
+        "pts = []\n"
+        "add_points(pts, n)\n"
+        "show_object(cq.Workplane().box(len(pts), 1, 1))\n"
+    )
+    sizes = build_sizes(script, [{}, {'n': 4}, {'n': 4}, {'n': 5}])
+    assert sizes == [[pytest.approx(3)], [pytest.approx(4)], [pytest.approx(4)], [pytest.approx(5)]]
+
+
+
+def built_objects(result):
+    assert result.success, result.exception
+    return [(r.lineno, pytest.approx(r.shape.val().BoundingBox().xlen)) for r in result.results]
+
+
+def full_and_incremental(builds):
+    '''
+    Objects shown by successive builds of (script, parameters), incremental and full.
+
+    :return: the line and size along X of the objects of the incremental builds,
+             of the full builds, and the number of statements executed by the
+             incremental builds
+    '''
+    state = cadquery_model.Incremental_State()
+    incremental, full, executed = [], [], []
+    for script, parameters in builds:
+        result = cadquery_model.CQ_Model(script).build(parameters, {'incremental': state})
+        incremental.append(built_objects(result))
+        executed.append(result.incremental[0])
+        full.append(built_objects(cadquery_model.CQ_Model(script).build(parameters, {})))
+    return incremental, full, executed
+
+
+def test_redefinition_matches_full_build():
+    script = (
+        "import cadquery as cq\n"
+        "w = 2\n"
+        "first = cq.Workplane().box(w, 1, 1)\n"
+        "w = w * 3\n"
+        "second = cq.Workplane().box(w, 1, 1)\n"
+        "w = 1\n"
+        "show_object(first)\n"
+        "show_object(second)\n"
+    )
+    incremental, full, _ = full_and_incremental([(script, {}), (script, {'w': 4}), (script, {'w': 4})])
+    assert incremental == full
+
+
+def test_modified_by_method_calls_matches_full_build():
+    script = (
+        "import cadquery as cq\n"
+        "n = 3\n"
+        "sizes = [1, n]\n"
+        "last = sizes.pop()\n"
+        "sketch = cq.Workplane().rect(last, 1)\n"
+        "solid = sketch.extrude(1)\n"
+        "show_object(solid)\n"
+        "show_object(cq.Workplane().box(len(sizes), 1, 1))\n"
+    )
+    builds = [(script, {}), (script, {'n': 4}), (script, {'n': 4}), (script, {'n': 5})]
+    incremental, full, _ = full_and_incremental(builds)
+    assert incremental == full
+
+
+def test_function_reading_globals_matches_full_build():
+    script = (
+        "import cadquery as cq\n"
+        "def size():\n"
+        "    return scale * w\n"
+        "def block():\n"
+        "    return cq.Workplane().box(size(), 1, 1)\n"
+        "w = 3\n"
+        "scale = 2\n"
+        "show_object(block())\n"
+    )
+    builds = [(script, {}), (script, {'w': 4}), (script, {'w': 4}), (script, {'scale': 3})]
+    incremental, full, _ = full_and_incremental(builds)
+    assert incremental == full
+
+
+def test_inserted_lines_shift_the_output_lines():
+    script = (
+        "import cadquery as cq\n"
+        "w = 2\n"
+        "res = cq.Workplane().box(w, 1, 1)\n"
+        "show_object(res)\n"
+        "debug(res)\n"
+    )
+    edited = "# a comment\n\n" + script.replace("w = 2\n", "w = 2\nh = 1\n")
+    builds = [(script, {}), (edited, {}), (edited, {'w': 3})]
+    incremental, full, executed = full_and_incremental(builds)
+    assert incremental == full
+    assert full[1][0][0] == 7
+    assert executed[1] < 5
+
+
+def test_arguments_of_cadquery_calls_keep_incremental_builds():
+    script = (
+        "import cadquery as cq\n"
+        "w = 2\n"
+        "pts = [(0, 0), (w, 0), (w, 1)]\n"
+        "res = cq.Workplane().polyline(pts).close().extrude(1)\n"
+        "count = len(pts)\n"
+        "show_object(res)\n"
+        "h = 1\n"
+        "show_object(cq.Workplane().box(count, h, 1))\n"
+    )
+    builds = [(script, {}), (script, {}), (script, {'h': 2})]
+    incremental, full, executed = full_and_incremental(builds)
+    assert incremental == full
+    assert executed == [8, 0, 2]
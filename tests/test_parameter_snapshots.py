@@ -0,0 +1,77 @@
+""" Snapshots saved next to the scripts, and history of the values built """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import json
+
+import pytest
+
+from freecad.cadquery2workbench import parameter_snapshots
+
+
+def test_snapshots_are_saved_next_to_the_script(tmp_path):
+    script = tmp_path / "bracket.py"
+    snapshots = parameter_snapshots.Parameter_Snapshots()
+    snapshots.load(str(script))
+    snapshots.add("wide", {'w': 20, 'thick': 2.5, 'label': "W", 'hole': True})
+    snapshots.add("narrow", {'w': 5})
+    snapshots.save()
+
+    sidecar = tmp_path / "bracket.snapshots.json"
+    assert sidecar.is_file()
+    loaded = parameter_snapshots.Parameter_Snapshots()
+    loaded.load(str(script))
+    assert list(loaded.snapshots) == ["wide", "narrow"]
+    assert loaded.snapshots["wide"] == {'w': 20, 'thick': 2.5, 'label': "W", 'hole': True}
+    assert type(loaded.snapshots["wide"]['w']) is int
+
+    loaded.remove("wide")
+    loaded.remove("narrow")
+    loaded.save()
+    assert not sidecar.exists()
+
+
+def test_unsaved_script_has_no_sidecar(tmp_path):
+    snapshots = parameter_snapshots.Parameter_Snapshots()
+    snapshots.load(None)
+    snapshots.add("a", {'w': 1})
+    snapshots.save()
+    assert snapshots.path is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unreadable_sidecar_raises(tmp_path):
+    script = tmp_path / "part.py"
+    (tmp_path / "part.snapshots.json").write_text(json.dumps(["w"]))
+    with pytest.raises(ValueError):
+        parameter_snapshots.Parameter_Snapshots().load(str(script))
+    (tmp_path / "part.snapshots.json").write_text("{")
+    with pytest.raises(ValueError):
+        parameter_snapshots.Parameter_Snapshots().load(str(script))
+
+
+def test_values_of_different_types_differ():
+    assert parameter_snapshots.same_values({'w': 1}, {'w': 1})
+    assert not parameter_snapshots.same_values({'w': 1}, {'w': 1.0})
+    assert not parameter_snapshots.same_values({'w': 1}, {'w': True})
+    assert not parameter_snapshots.same_values({'w': 1}, {'w': 1, 'h': 2})
+
+    snapshots = parameter_snapshots.Parameter_Snapshots()
+    snapshots.add("int", {'w': 1})
+    assert snapshots.is_snapshot({'w': 1})
+    assert not snapshots.is_snapshot({'w': 1.0})
+
+
+def test_history_is_most_recent_first_without_duplicates():
+    snapshots = parameter_snapshots.Parameter_Snapshots()
+    for w in range(parameter_snapshots.HISTORY_SIZE + 5):
+        snapshots.record({'w': w})
+    snapshots.record({'w': 10})
+    assert len(snapshots.history) == parameter_snapshots.HISTORY_SIZE
+    assert snapshots.history[0] == {'w': 10}
+    assert snapshots.history[1] == {'w': parameter_snapshots.HISTORY_SIZE + 4}
+    assert [v['w'] for v in snapshots.history].count(10) == 1
+
+
+def test_description_is_sorted_and_shortened():
+    assert parameter_snapshots.describe({'w': 2, 'label': "a"}) == "label='a', w=2"
+    text = parameter_snapshots.describe(dict(('v%d' % i, i) for i in range(30)), max_length=20)
+    assert len(text) == 20 and text.endswith("...")
@@ -0,0 +1,110 @@
+""" Variables of the scripts as edited in the Variables Editor """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+from collections import OrderedDict
+
+import pytest
+
+from freecad.cadquery2workbench import parameter_store
+
+
+class Input_Parameter(object):
+    '''The attributes of a cqgi InputParameter read by the store.'''
+
+    def __init__(self, default_value, desc=None, minimum=None, maximum=None, step=None):
+        self.default_value = default_value
+        self.desc = desc
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+
+
+def store_of(**defaults):
+    store = parameter_store.Parameter_Store()
+    store.reset(store.entries(script_parameters(**defaults)))
+    return store
+
+
+def script_parameters(**defaults):
+    return OrderedDict((name, Input_Parameter(value)) for name, value in defaults.items())
+
+
+def apply(store, parameters):
+    '''Apply new parameters as the Qt model does, return the plan.'''
+    entries = store.entries(parameters)
+    plan = store.diff(entries)
+    if plan is None:
+        store.reset(entries)
+        return None
+    removed, inserted = plan
+    for first, last in removed:
+        store.remove(first, last)
+    for first, last in inserted:
+        store.insert(first, entries[first:last + 1])
+    store.merge(entries)
+    return plan
+
+
+def test_values_keep_the_type_written():
+    assert parameter_store.parse_value(parameter_store.NUMBER, " 3 ") == 3
+    assert isinstance(parameter_store.parse_value(parameter_store.NUMBER, "3"), int)
+    assert parameter_store.parse_value(parameter_store.NUMBER, "2.5") == 2.5
+    assert parameter_store.parse_value(parameter_store.BOOL, "Off") is False
+    assert parameter_store.parse_value(parameter_store.STRING, 4) == "4"
+    with pytest.raises(ValueError):
+        parameter_store.parse_value(parameter_store.NUMBER, "wide")
+    with pytest.raises(ValueError):
+        parameter_store.parse_value(parameter_store.BOOL, "maybe")
+
+
+def test_unknown_types_are_left_out():
+    store = store_of(w=1, flag=True, label="a", points=[1, 2])
+    assert [(p.name, p.kind) for p in store.parameters] == \
+        [('w', 'number'), ('flag', 'bool'), ('label', 'string')]
+
+
+def test_only_the_changed_rows_are_removed_and_inserted():
+    store = store_of(a=1, b=2, c=3, d=4)
+    store.set_value(store.rows['c'], "30")
+    plan = apply(store, script_parameters(a=1, c=3, e=5, f=6, d=4))
+    assert plan == ([(1, 1)], [(2, 3)])
+    assert [p.name for p in store.parameters] == ['a', 'c', 'e', 'f', 'd']
+    assert store.rows == {'a': 0, 'c': 1, 'e': 2, 'f': 3, 'd': 4}
+    assert store.build_parameters() == {'a': 1, 'c': 30, 'e': 5, 'f': 6, 'd': 4}
+
+
+def test_moved_variables_reset_the_rows_and_keep_the_values():
+    store = store_of(a=1, b=2)
+    store.set_value(store.rows['a'], "10")
+    assert apply(store, script_parameters(b=2, a=1)) is None
+    assert store.build_parameters() == {'b': 2, 'a': 10}
+
+
+def test_merge_follows_the_script_unless_edited():
+    store = store_of(a=1, b=2, c=3)
+    store.set_value(store.rows['b'], "20")
+    changed = store.merge(store.entries(script_parameters(a=5, b=6, c="3")))
+    assert changed == [0, 1, 2]
+    assert store.build_parameters() == {'a': 5, 'b': 20, 'c': "3"}
+
+
+def test_snapshot_values_are_typed_and_filtered():
+    store = store_of(w=1, flag=False)
+    changed = store.apply_values({'w': "2.5", 'flag': "maybe", 'gone': 3})
+    assert changed == [0]
+    assert store.build_parameters() == {'w': 2.5, 'flag': False}
+    assert store.reset_values() == [0]
+    assert store.build_parameters() == {'w': 1, 'flag': False}
+
+
+def test_ranged_variables_map_the_slider_positions():
+    store = parameter_store.Parameter_Store()
+    store.reset(store.entries({'n': Input_Parameter(4, minimum=0, maximum=10, step=2),
+                               'x': Input_Parameter(0.5, minimum=0.0, maximum=1.0)}))
+    n, x = store.parameters
+    assert n.ranged and n.integer
+    assert n.steps() == 5
+    assert [n.value_at(p) for p in range(6)] == [0, 2, 4, 6, 8, 10]
+    assert n.position_of(7) == 4 and n.position_of(50) == 5
+    assert not x.integer and x.steps() == 100
+    assert x.value_at(25) == pytest.approx(0.25)
+    assert not parameter_store.Store_Parameter('z', parameter_store.NUMBER, 1, minimum=1, maximum=1).ranged
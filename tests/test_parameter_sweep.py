@@ -0,0 +1,25 @@
+""" Values of the swept parameters and export of the variants """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import pytest
+
+cq = pytest.importorskip('cadquery')
+
+from freecad.cadquery2workbench import parameter_sweep
+
+
+def test_ranges_keep_the_type_of_the_parameter():
+    assert parameter_sweep.parse_values("2:6:2", 1) == [2, 4, 6]
+    assert parameter_sweep.parse_values("0:1:0.25", 1) == [0, 0.25, 0.5, 0.75, 1]
+    assert parameter_sweep.parse_values("1, 2, 2, 3.5", 1.0) == [1.0, 2.0, 3.5]
+    with pytest.raises(ValueError):
+        parameter_sweep.parse_values("6:2:1", 1)
+
+
+def test_variants_are_exported_into_a_new_directory(tmp_path):
+    export_dir = tmp_path / "variants" / "box"
+    source = "import cadquery as cq\nw = 2\nshow_object(cq.Workplane().box(w, 1, 1))\n"
+    row = parameter_sweep.build_variant((3, source, {'w': 5}, str(export_dir), "box", ('step', 'stl')))
+    assert row['success'], row['exception']
+    assert row['xlen'] == pytest.approx(5)
+    assert sorted(p.name for p in export_dir.iterdir()) == ["box_3_w=5.step", "box_3_w=5.stl"]
+    assert (export_dir / "box_3_w=5.step").read_text().startswith("ISO-10303-21")
@@ -0,0 +1,45 @@
+""" Scripts are parsed and compiled once for any parameter values """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import pytest
+
+cq = pytest.importorskip('cadquery')
+
+from freecad.cadquery2workbench import cadquery_model
+
+SCRIPT = (
+    "import cadquery as cq\n"
+    "w = 2\n"
+    "show_object(cq.Workplane().box(w, 1, 1))\n"
+)
+
+
+def size(result):
+    assert result.success, result.exception
+    return result.results[0].shape.val().BoundingBox().xlen
+
+
+def test_same_source_gives_the_same_model():
+    model = cadquery_model.parse(SCRIPT)
+    assert cadquery_model.parse(SCRIPT.encode('utf-8')) is model
+    assert cadquery_model.parse(SCRIPT.replace("w = 2", "w = 3")) is not model
+
+
+def test_parsed_scripts_are_bounded():
+    first = cadquery_model.parse("a = 0\n")
+    for i in range(cadquery_model.PARSE_CACHE_SIZE):
+        cadquery_model.parse("a = {0}\n".format(i + 1))
+    assert cadquery_model.parse("a = 0\n") is not first
+
+
+def test_parameters_of_a_build_dont_change_the_model():
+    model = cadquery_model.parse(SCRIPT)
+    code = model.compiled()
+    assert size(model.build({'w': 5})) == pytest.approx(5)
+    assert size(model.build({})) == pytest.approx(2)
+    assert model.compiled() is code
+    assert model.metadata.parameters['w'].default_value == 2
+
+
+def test_invalid_parameter_fails_the_build():
+    result = cadquery_model.parse(SCRIPT).build({'depth': 1})
+    assert not result.success
@@ -0,0 +1,71 @@
+""" Static checks of the scripts, made without cadquery """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import ast
+import subprocess
+import sys
+
+from freecad.cadquery2workbench import script_checks
+
+
+def test_syntax_error_is_reported_with_its_line():
+    check = script_checks.check_script("w = 2\nres = (w\n")
+    assert check.syntax_error is not None
+    assert check.tree is None and check.outputs == []
+    assert script_checks.format_syntax_error(check.syntax_error).startswith("Syntax error line 2")
+
+
+def test_errors_raised_by_the_compiler_are_syntax_errors():
+    check = script_checks.check_script("return 1\n")
+    assert check.syntax_error is not None
+
+
+def test_output_calls_are_found_at_any_depth():
+    source = (
+        "import cadquery as cq\n"
+        "def show(shape):\n"
+        "    show_object(shape)\n"
+        "show(cq.Workplane())\n"
+        "debug(cq.Workplane())\n"
+    )
+    assert script_checks.check_script(source.encode('utf-8')).outputs == [3, 5]
+
+
+def test_undefined_names_are_reported_once_at_their_first_use():
+    source = (
+        "import cadquery as cq\n"
+        "def block(w):\n"
+        "    return cq.Workplane().box(w, depth, 1)\n"
+        "res = block(width)\n"
+        "res = block(width + 1)\n"
+        "total = len([res])\n"
+        "show_object(res)\n"
+    )
+    check = script_checks.check_script(source)
+    assert check.undefined == [(3, 'depth'), (4, 'width')]
+    assert script_checks.check_script(source, undefined=False).undefined == []
+
+
+def test_names_defined_after_their_use_or_by_a_star_import_are_not_reported():
+    assert script_checks.check_script("def f():\n    return w\nw = 1\nshow_object(f())\n").undefined == []
+    assert script_checks.check_script("def f():\n    global w\n    w = 1\nshow_object(w)\n").undefined == []
+    assert script_checks.check_script("from math import *\nshow_object(pi + w)\n").undefined == []
+
+
+def test_scripts_without_variables_dont_need_cqgi():
+    assert not script_checks.may_have_parameters(ast.parse("show_object(make(1))\n"))
+    assert not script_checks.may_have_parameters(ast.parse("res = make(1)\nshow_object(res)\n"))
+    assert script_checks.may_have_parameters(ast.parse("w = 1\n"))
+    assert script_checks.may_have_parameters(ast.parse("w, h = 1, 2\n"))
+    assert script_checks.may_have_parameters(ast.parse("w = cqvar(1, 'width')\n"))
+
+
+def test_checks_dont_import_cadquery():
+    code = (
+        "import sys\n"
+        "from freecad.cadquery2workbench import script_checks\n"
+        "check = script_checks.check_script('import cadquery as cq\\nshow_object(cq.Workplane())\\n')\n"
+        "assert check.outputs == [2]\n"
+        "print('cadquery' in sys.modules)\n"
+    )
+    output = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+    assert output.strip() == 'False'
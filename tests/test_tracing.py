@@ -0,0 +1,57 @@
+""" Spans of the builds, exported in Chrome trace format """
+# (c) 2021-2021 Jean-Paul (jpmlt) Apache 2.0 License
+import json
+import time
+
+from freecad.cadquery2workbench import tracing
+
+
+def test_spans_are_recorded_only_when_tracing(monkeypatch):
+    monkeypatch.setattr(tracing, 'active', None)
+    with tracing.span('build'):
+        pass
+
+    tracer = tracing.Tracer()
+    monkeypatch.setattr(tracing, 'active', tracer)
+    with tracing.span('build', action='Execute'):
+        with tracing.span('script'):
+            time.sleep(0.002)
+    assert [e['name'] for e in tracer.events] == ['script', 'build']
+    script, build = tracer.events
+    assert build['ts'] <= script['ts']
+    assert build['ts'] + build['dur'] >= script['ts'] + script['dur']
+    assert script['dur'] >= 2000
+    assert build['args'] == {'action': 'Execute'} and 'args' not in script
+    assert build['ph'] == 'X'
+
+
+def test_span_is_recorded_when_an_exception_is_raised(monkeypatch):
+    tracer = tracing.Tracer()
+    monkeypatch.setattr(tracing, 'active', tracer)
+    try:
+        with tracing.span('script'):
+            raise ValueError()
+    except ValueError:
+        pass
+    assert [e['name'] for e in tracer.events] == ['script']
+
+
+def test_summary_totals_the_phases_in_their_order():
+    tracer = tracing.Tracer()
+    tracer.add('script', 1000000, 3000000)
+    tracer.add('transfer', 3000000, 3500000)
+    tracer.extend([{'name': 'script', 'ph': 'X', 'ts': 4000.0, 'dur': 1000.0, 'pid': 1, 'tid': 1}])
+    tracer.extend(None)
+    assert tracer.summary() == "Build trace 4.0 ms: script 3.0 ms, transfer 0.5 ms"
+    assert tracing.Tracer().summary() == "Build trace: no span recorded"
+    assert tracing.format_duration(2.5e6) == "2.50 s"
+
+
+def test_export_writes_a_chrome_trace(tmp_path):
+    tracer = tracing.Tracer()
+    tracer.add('build', 0, 1000, {'action': 'Preview'})
+    path = tmp_path / "build.json"
+    tracer.export(str(path))
+    data = json.loads(path.read_text())
+    assert data['displayTimeUnit'] == 'ms'
+    assert data['traceEvents'] == tracer.events